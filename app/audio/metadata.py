@@ -0,0 +1,312 @@
+import struct
+from dataclasses import dataclass, asdict
+
+# Сколько байт начала (после ID3v2-тега) и конца файла хватает для разбора заголовков
+HEAD_SIZE = 256 * 1024
+TAIL_SIZE = 64 * 1024
+
+WAV_CODECS = {1: "pcm", 3: "pcm_float", 6: "alaw", 7: "mulaw", 0xFFFE: "pcm"}
+
+# Битрейты MPEG-аудио в кбит/с по (версия MPEG-1 или 2/2.5, слой) и индексу из заголовка кадра
+MPEG_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Частоты дискретизации по биту версии MPEG: 3 — MPEG-1, 2 — MPEG-2, 0 — MPEG-2.5
+MPEG_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+ADTS_SAMPLE_RATES = (
+    96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350
+)
+
+
+@dataclass
+class AudioMetadata:
+    """Параметры аудиофайла, прочитанные из заголовков контейнера"""
+
+    codec: str | None = None
+    duration: float | None = None
+    sample_rate: int | None = None
+    channels: int | None = None
+    # средний битрейт, бит/с
+    bitrate: int | None = None
+    size: int | None = None
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class MetadataCollector:
+    """
+    Накопитель заголовков для разбора метаданных во время потоковой загрузки.
+    Хранит только начало файла (после ID3v2-тега) и его хвост, поэтому расход памяти
+    и время не зависят от размера файла; декодирование аудио не выполняется.
+    """
+
+    def __init__(self):
+        self.head = bytearray()
+        self.tail = b""
+        self.position = 0
+        # смещение начала аудиоданных: ненулевое, если файл начинается с ID3v2-тега
+        self.audio_offset = 0
+        # начало файла, пока не прочитано 10 байт для проверки ID3v2-тега
+        self._prefix: bytes | None = b""
+
+    def feed(self, chunk: bytes) -> None:
+        data_start = self.position
+        self.position += len(chunk)
+        self.tail = chunk[-TAIL_SIZE:] if len(chunk) >= TAIL_SIZE else (self.tail + chunk)[-TAIL_SIZE:]
+
+        if self._prefix is not None:
+            chunk = self._prefix + chunk
+            if len(chunk) < 10:
+                self._prefix = chunk
+                return
+            self._prefix = None
+            data_start = 0
+            if chunk[:3] == b"ID3":
+                size = (
+                    (chunk[6] & 0x7F) << 21
+                    | (chunk[7] & 0x7F) << 14
+                    | (chunk[8] & 0x7F) << 7
+                    | (chunk[9] & 0x7F)
+                )
+                # флаг наличия футера у ID3v2.4
+                self.audio_offset = 10 + size + (10 if chunk[5] & 0x10 else 0)
+
+        start = max(self.audio_offset, data_start)
+        end = min(self.audio_offset + HEAD_SIZE, self.position)
+        if start < end:
+            self.head += chunk[start - data_start : end - data_start]
+
+    def result(self, size: int) -> AudioMetadata:
+        """Метаданные по накопленным заголовкам; неизвестный формат даёт только размер"""
+        head = bytes(self.head)
+        try:
+            metadata = parse_headers(head, self.tail, size, self.audio_offset)
+        except (struct.error, IndexError, ZeroDivisionError, ValueError):
+            metadata = None
+        if metadata is None:
+            metadata = AudioMetadata()
+        metadata.size = size
+        if metadata.bitrate is None and metadata.duration:
+            metadata.bitrate = round((size - self.audio_offset) * 8 / metadata.duration)
+        return metadata
+
+
+def parse_headers(head: bytes, tail: bytes, size: int, audio_offset: int = 0) -> AudioMetadata | None:
+    """Определение формата по сигнатуре и разбор его заголовков"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return parse_wav(head, size)
+    if head[:4] == b"fLaC":
+        return parse_flac(head)
+    if head[:4] == b"OggS":
+        return parse_ogg(head, tail)
+    sync = find_frame_sync(head)
+    if sync is None:
+        return None
+    if (head[sync + 1] >> 1) & 3 == 0:
+        return parse_adts(head, sync, size - audio_offset)
+    audio_size = size - audio_offset
+    # ID3v1-тег в конце файла не относится к аудиоданным
+    if len(tail) >= 128 and tail[-128:-125] == b"TAG":
+        audio_size -= 128
+    return parse_mpeg(head, sync, audio_size)
+
+
+def parse_wav(head: bytes, size: int) -> AudioMetadata | None:
+    """WAV: параметры из чанка fmt, длительность — по размеру чанка data"""
+    metadata = None
+    byte_rate = 0
+    offset = 12
+    while offset + 8 <= len(head):
+        chunk_id, chunk_size = struct.unpack_from("<4sI", head, offset)
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            audio_format, channels, sample_rate, byte_rate = struct.unpack_from("<HHII", head, body)
+            metadata = AudioMetadata(
+                codec=WAV_CODECS.get(audio_format, f"wav_{audio_format:#x}"),
+                sample_rate=sample_rate,
+                channels=channels,
+                bitrate=byte_rate * 8,
+            )
+        elif chunk_id == b"data":
+            if metadata is not None and byte_rate:
+                # при потоковой записи размер data бывает не заполнен
+                data_size = chunk_size if 0 < chunk_size < 0xFFFFFFFF else size - body
+                metadata.duration = min(data_size, size - body) / byte_rate
+            break
+        offset = body + chunk_size + (chunk_size & 1)
+    return metadata
+
+
+def parse_flac(head: bytes) -> AudioMetadata | None:
+    """FLAC: блок STREAMINFO — частота, каналы и общее число сэмплов"""
+    offset = 4
+    while offset + 4 <= len(head):
+        block_header = head[offset]
+        length = int.from_bytes(head[offset + 1 : offset + 4], "big")
+        if block_header & 0x7F == 0:
+            (packed,) = struct.unpack_from(">Q", head, offset + 4 + 10)
+            sample_rate = packed >> 44
+            total_samples = packed & ((1 << 36) - 1)
+            return AudioMetadata(
+                codec="flac",
+                sample_rate=sample_rate,
+                channels=((packed >> 41) & 7) + 1,
+                duration=total_samples / sample_rate if sample_rate and total_samples else None,
+            )
+        if block_header & 0x80:
+            break
+        offset += 4 + length
+    return None
+
+
+def parse_ogg(head: bytes, tail: bytes) -> AudioMetadata | None:
+    """Ogg: заголовок Vorbis или Opus из первой страницы, длительность — по granule последней страницы"""
+    segments = head[26]
+    packet = head[27 + segments :]
+    (serial,) = struct.unpack_from("<I", head, 14)
+    if packet[:7] == b"\x01vorbis":
+        channels, sample_rate = struct.unpack_from("<BI", packet, 11)
+        metadata = AudioMetadata(codec="vorbis", sample_rate=sample_rate, channels=channels)
+        clock_rate, pre_skip = sample_rate, 0
+    elif packet[:8] == b"OpusHead":
+        channels, pre_skip, input_rate = struct.unpack_from("<BHI", packet, 9)
+        # Opus всегда декодируется в 48 кГц, input_rate — частота исходника
+        metadata = AudioMetadata(codec="opus", sample_rate=input_rate or 48000, channels=channels)
+        clock_rate = 48000
+    elif packet[:5] == b"\x7fFLAC":
+        return parse_flac(packet[9:]) or AudioMetadata(codec="flac")
+    else:
+        return None
+
+    granule = last_ogg_granule(tail, serial)
+    if granule is not None and clock_rate:
+        metadata.duration = max(granule - pre_skip, 0) / clock_rate
+    return metadata
+
+
+def last_ogg_granule(tail: bytes, serial: int) -> int | None:
+    position = len(tail)
+    while (position := tail.rfind(b"OggS", 0, position)) != -1:
+        if position + 18 <= len(tail):
+            granule, page_serial = struct.unpack_from("<qI", tail, position + 6)
+            if page_serial == serial and granule >= 0:
+                return granule
+    return None
+
+
+def find_frame_sync(head: bytes, start: int = 0) -> int | None:
+    """Смещение первого кадра MPEG-аудио или ADTS, за которым следует ещё один корректный кадр"""
+    position = start
+    while (position := head.find(b"\xff", position)) != -1 and position + 4 <= len(head):
+        if head[position + 1] & 0xE0 == 0xE0:
+            length = frame_length(head, position)
+            if length:
+                following = position + length
+                if following + 2 > len(head) or (
+                    head[following] == 0xFF and head[following + 1] & 0xE0 == 0xE0
+                ):
+                    return position
+        position += 1
+    return None
+
+
+def frame_length(head: bytes, position: int) -> int | None:
+    """Длина кадра по заголовку или None, если заголовок некорректен"""
+    b1, b2 = head[position + 1], head[position + 2]
+    layer_bits = (b1 >> 1) & 3
+    if layer_bits == 0:
+        # ADTS: синхрослово 12 бит и поле layer, равное 0
+        if b1 & 0xF0 != 0xF0 or position + 6 > len(head):
+            return None
+        if (b2 >> 2) & 0xF >= len(ADTS_SAMPLE_RATES):
+            return None
+        length = ((head[position + 3] & 3) << 11) | (head[position + 4] << 3) | (head[position + 5] >> 5)
+        return length if length > 7 else None
+    header = parse_mpeg_header(head, position)
+    return header[4] if header else None
+
+
+def parse_mpeg_header(head: bytes, position: int) -> tuple[int, int, int, int, int, int] | None:
+    """Заголовок кадра MPEG-аудио: (слой, битрейт бит/с, частота, каналы, длина кадра, сэмплов в кадре)"""
+    b1, b2, b3 = head[position + 1], head[position + 2], head[position + 3]
+    version_bits = (b1 >> 3) & 3
+    layer = 4 - ((b1 >> 1) & 3)
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 3
+    if version_bits == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    mpeg1 = version_bits == 3
+    bitrate = MPEG_BITRATES[(1 if mpeg1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = MPEG_SAMPLE_RATES[version_bits][sample_rate_index]
+    padding = (b2 >> 1) & 1
+    channels = 1 if b3 >> 6 == 3 else 2
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if mpeg1 or layer == 2 else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return layer, bitrate, sample_rate, channels, length, samples
+
+
+def parse_mpeg(head: bytes, position: int, audio_size: int) -> AudioMetadata | None:
+    """MP3 и другие слои MPEG: заголовок первого кадра и VBR-заголовок Xing/Info или VBRI"""
+    header = parse_mpeg_header(head, position)
+    if header is None:
+        return None
+    layer, bitrate, sample_rate, channels, _, samples = header
+    metadata = AudioMetadata(
+        codec=f"mp{layer}", sample_rate=sample_rate, channels=channels, bitrate=bitrate
+    )
+
+    mpeg1 = (head[position + 1] >> 3) & 3 == 3
+    side_info = (32 if channels == 2 else 17) if mpeg1 else (17 if channels == 2 else 9)
+    frames = None
+    xing = position + 4 + side_info
+    if head[xing : xing + 4] in (b"Xing", b"Info"):
+        (flags,) = struct.unpack_from(">I", head, xing + 4)
+        if flags & 1:
+            (frames,) = struct.unpack_from(">I", head, xing + 8)
+    elif head[position + 36 : position + 40] == b"VBRI":
+        (frames,) = struct.unpack_from(">I", head, position + 36 + 14)
+
+    if frames:
+        metadata.duration = frames * samples / sample_rate
+        metadata.bitrate = round((audio_size - position) * 8 / metadata.duration)
+    else:
+        # без VBR-заголовка считаем поток CBR
+        metadata.duration = (audio_size - position) * 8 / bitrate
+    return metadata
+
+
+def parse_adts(head: bytes, position: int, audio_size: int) -> AudioMetadata | None:
+    """AAC в ADTS: параметры первого кадра, длительность — по среднему размеру кадров в начале файла"""
+    profile = head[position + 2] >> 6
+    sample_rate = ADTS_SAMPLE_RATES[(head[position + 2] >> 2) & 0xF]
+    channels = ((head[position + 2] & 1) << 2) | (head[position + 3] >> 6)
+    metadata = AudioMetadata(
+        codec="aac" if profile == 1 else f"aac_profile_{profile}",
+        sample_rate=sample_rate,
+        channels=channels or None,
+    )
+
+    frames, frames_bytes, offset = 0, 0, position
+    while offset + 7 <= len(head) and head[offset] == 0xFF and head[offset + 1] & 0xF6 == 0xF0:
+        length = frame_length(head, offset)
+        if not length or offset + length > len(head):
+            break
+        frames += 1
+        frames_bytes += length
+        offset += length
+    if frames:
+        # каждый кадр AAC содержит 1024 сэмпла
+        seconds_per_frame = 1024 / sample_rate
+        metadata.bitrate = round(frames_bytes / frames * 8 / seconds_per_frame)
+        metadata.duration = (audio_size - position) / (frames_bytes / frames) * seconds_per_frame
+    return metadata
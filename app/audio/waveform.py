@@ -0,0 +1,154 @@
+import importlib.util
+import math
+import struct
+import wave
+from typing import Iterator
+
+# NumPy не обязателен (без него сводки не строятся) и импортируется при первом расчёте сводки
+# в процессе пула, а не при старте приложения
+np = None
+
+# Формат сводки: заголовок, затем для каждого уровня детализации
+# (число точек, кадров на точку) и пары (min, max) в int8 на каждую точку
+PEAKS_MAGIC = b"WFPK"
+PEAKS_VERSION = 1
+PEAKS_HEADER = struct.Struct("<4sBBHI")
+PEAKS_LEVEL = struct.Struct("<II")
+# Во сколько раз каждый следующий уровень грубее предыдущего
+LEVEL_FACTOR = 4
+# Сколько кадров аудио читается за раз
+READ_FRAMES = 1 << 20
+
+
+def load_numpy() -> bool:
+    """Импорт NumPy при первом обращении; False, если он не установлен"""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        np = numpy
+    return True
+
+
+def can_decode(extension: str | None) -> bool:
+    """Есть ли чем построить сводку для файла с таким расширением"""
+    if importlib.util.find_spec("numpy") is None:
+        return False
+    if extension == "wav":
+        return True
+    return importlib.util.find_spec("soundfile") is not None
+
+
+def iter_wav_blocks(path: str, block_frames: int) -> tuple[int, int, Iterator] | None:
+    """PCM из WAV: (число кадров, частота, блоки float32 формы (кадры, каналы))"""
+    try:
+        wav = wave.open(path, "rb")
+    except (wave.Error, EOFError):
+        return None
+    channels, width = wav.getnchannels(), wav.getsampwidth()
+
+    def blocks():
+        with wav:
+            while frames := wav.readframes(block_frames):
+                if width == 1:
+                    samples = np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128
+                elif width == 3:
+                    raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+                    samples = (raw[:, 0] | raw[:, 1] << 8 | raw[:, 2] << 16).astype(np.float32)
+                    samples[samples >= 1 << 23] -= 1 << 24
+                else:
+                    samples = np.frombuffer(frames, dtype=f"<i{width}").astype(np.float32)
+                yield samples.reshape(-1, channels) / float(1 << (8 * width - 1))
+
+    return wav.getnframes(), wav.getframerate(), blocks()
+
+
+def iter_soundfile_blocks(path: str, block_frames: int) -> tuple[int, int, Iterator] | None:
+    """Остальные форматы через soundfile (libsndfile), если он установлен"""
+    try:
+        import soundfile
+    except ImportError:
+        return None
+    try:
+        info = soundfile.info(path)
+    except RuntimeError:
+        return None
+    blocks = soundfile.blocks(path, blocksize=block_frames, dtype="float32", always_2d=True)
+    return info.frames, info.samplerate, blocks
+
+
+def compute_peaks(path: str, points: int, levels: int) -> bytes | None:
+    """
+    Сводка пиков аудиофайла для отрисовки волны. Самый подробный уровень содержит
+    до points точек, каждый следующий в LEVEL_FACTOR раз грубее. Файл читается блоками,
+    min/max считаются векторно по кадрам всех каналов сразу.
+    Выполняется в отдельном процессе; None, если NumPy или декодер недоступны.
+    """
+    if not load_numpy():
+        return None
+    source = iter_wav_blocks(path, READ_FRAMES) or iter_soundfile_blocks(path, READ_FRAMES)
+    if source is None:
+        return None
+    total_frames, sample_rate, blocks = source
+    if total_frames <= 0:
+        return None
+
+    frames_per_point = max(1, math.ceil(total_frames / points))
+    # читаем целым числом точек, чтобы точки не разрывались между блоками
+    mins, maxs = [], []
+    pending = np.empty((0, 1), dtype=np.float32)
+    for block in blocks:
+        if pending.shape[1] != block.shape[1]:
+            pending = np.empty((0, block.shape[1]), dtype=np.float32)
+        block = np.concatenate((pending, block)) if len(pending) else block
+        whole = len(block) // frames_per_point * frames_per_point
+        if whole:
+            grouped = block[:whole].reshape(-1, frames_per_point * block.shape[1])
+            mins.append(grouped.min(axis=1))
+            maxs.append(grouped.max(axis=1))
+        pending = block[whole:]
+    if len(pending):
+        mins.append(np.array([pending.min()]))
+        maxs.append(np.array([pending.max()]))
+    if not mins:
+        return None
+
+    level_mins, level_maxs = np.concatenate(mins), np.concatenate(maxs)
+    parts = []
+    for _ in range(levels):
+        parts.append((level_mins, level_maxs, frames_per_point))
+        if len(level_mins) <= 1:
+            break
+        padded = math.ceil(len(level_mins) / LEVEL_FACTOR) * LEVEL_FACTOR
+        level_mins = np.pad(level_mins, (0, padded - len(level_mins)), mode="edge")
+        level_maxs = np.pad(level_maxs, (0, padded - len(level_maxs)), mode="edge")
+        level_mins = level_mins.reshape(-1, LEVEL_FACTOR).min(axis=1)
+        level_maxs = level_maxs.reshape(-1, LEVEL_FACTOR).max(axis=1)
+        frames_per_point *= LEVEL_FACTOR
+
+    result = [PEAKS_HEADER.pack(PEAKS_MAGIC, PEAKS_VERSION, len(parts), 0, sample_rate)]
+    for level_mins, level_maxs, level_frames in parts:
+        pairs = np.empty(len(level_mins) * 2, dtype=np.int8)
+        pairs[0::2] = np.clip(np.round(level_mins * 127), -127, 127)
+        pairs[1::2] = np.clip(np.round(level_maxs * 127), -127, 127)
+        result.append(PEAKS_LEVEL.pack(len(level_mins), level_frames))
+        result.append(pairs.tobytes())
+    return b"".join(result)
+
+
+def parse_peaks(data: bytes) -> tuple[int, list[tuple[int, list[tuple[int, int]]]]]:
+    """Разбор сводки: (частота, [(кадров на точку, [(min, max), ...]), ...])"""
+    magic, version, levels, _, sample_rate = PEAKS_HEADER.unpack_from(data)
+    if magic != PEAKS_MAGIC or version != PEAKS_VERSION:
+        raise ValueError("Unknown peaks format")
+    offset = PEAKS_HEADER.size
+    result = []
+    for _ in range(levels):
+        points, frames_per_point = PEAKS_LEVEL.unpack_from(data, offset)
+        offset += PEAKS_LEVEL.size
+        values = struct.unpack_from(f"<{points * 2}b", data, offset)
+        offset += points * 2
+        result.append((frames_per_point, list(zip(values[0::2], values[1::2]))))
+    return sample_rate, result
@@ -0,0 +1,50 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+
+class RateLimitStore(ABC):
+    """
+    Хранилище корзин маркеров (token bucket) для ограничения частоты запросов.
+    По умолчанию состояние хранится в памяти процесса (MemoryRateLimitStore), и у каждого
+    воркера свой лимит. Общий для всех воркеров лимит — реализация поверх общего хранилища
+    (например, Redis со скриптом, выполняющим take атомарно), подключаемая через set_store.
+    """
+
+    @abstractmethod
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """
+        Взять один маркер из корзины key, которая пополняется на rate маркеров в секунду
+        и вмещает не больше burst. Возвращает 0, если маркер взят, иначе — через сколько
+        секунд он появится
+        """
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """
+    Корзины маркеров в памяти процесса. Число корзин ограничено maxsize: при переполнении
+    вытесняется корзина, к которой дольше всех не обращались (она, скорее всего, уже полна).
+    Рассчитано на использование из одного event loop, блокировки не нужны.
+    """
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        # ключ -> (маркеров в корзине, момент последнего пополнения по time.monotonic())
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - updated_at) * rate)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self) -> None:
+        self._buckets.clear()
@@ -0,0 +1,76 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class TTLCache:
+    """
+    LRU-кэш ограниченного размера, у каждой записи свой срок жизни.
+    Рассчитан на использование из одного event loop, блокировки не нужны.
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # ключ -> (момент истечения по time.time(), значение)
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable) -> Any | None:
+        """Значение по ключу или None, если записи нет или срок её жизни истёк"""
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires_at, value = item
+        if expires_at <= time.time():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, expires_at: float | None = None) -> None:
+        """Сохранение значения до expires_at (по умолчанию — на ttl секунд)"""
+        if self.maxsize <= 0:
+            return
+        if expires_at is None:
+            expires_at = time.time() + self.ttl
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        # Вытесняем давно не использованные записи
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+# Описание метрик кэшей: ключ stats() -> (имя метрики, описание, тип)
+CACHE_METRICS = {
+    "size": ("cache_entries", "Число записей в кэше", "gauge"),
+    "hits": ("cache_hits_total", "Число попаданий в кэш", "counter"),
+    "misses": ("cache_misses_total", "Число промахов кэша", "counter"),
+}
+
+
+def collect_cache_metrics(caches: dict):
+    """
+    Статистика кэшей (имя -> объект со stats()) с меткой cache=<имя>,
+    снимается в момент запроса /metrics
+    """
+    stats = {name: cache.stats() for name, cache in caches.items()}
+    for key, (name, documentation, metric_type) in CACHE_METRICS.items():
+        samples = [({"cache": cache}, values[key]) for cache, values in stats.items()]
+        yield name, documentation, metric_type, samples
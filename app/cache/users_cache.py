@@ -0,0 +1,86 @@
+import inspect
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache.ttl_cache import TTLCache
+from app.config.app_config import settings
+from app.models.users import UserORM
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """Снимок пользователя, достаточный для горячих эндпоинтов"""
+
+    id: uuid.UUID
+    yandex_id: str
+    username: str | None
+    email: str | None
+    superuser: bool
+
+
+InvalidationHook = Callable[[str], Awaitable[None] | None]
+
+
+class UsersCache:
+    """
+    Кэш пользователей процесса по yandex_id с TTL и ограничением размера.
+    Изменения пользователя в этом процессе сбрасывают запись через invalidate,
+    а invalidation_hook позволяет разослать сброс другим воркерам (например, через pub/sub);
+    получив такое сообщение, воркер вызывает invalidate(yandex_id, broadcast=False).
+    Без такой рассылки другие воркеры видят изменения через USER_CACHE_TTL, поэтому снимку
+    доверяют только чтения: права суперпользователя проверяются по БД, а запись файлов
+    и сессий загрузки начинается с блокировки строки пользователя (UserDB.lock_user).
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.invalidation_hook: InvalidationHook | None = None
+
+    async def get_user(self, yandex_id: str, session: AsyncSession) -> CachedUser | None:
+        """Пользователь из кэша, при промахе — из БД с сохранением в кэш"""
+        user = self._cache.get(yandex_id)
+        if user is not None:
+            return user
+        query = select(
+            UserORM.id,
+            UserORM.yandex_id,
+            UserORM.username,
+            UserORM.email,
+            UserORM.superuser,
+        ).where(UserORM.yandex_id == yandex_id)
+        row = (await session.execute(query)).one_or_none()
+        if row is None:
+            return None
+        user = CachedUser(
+            id=row.id,
+            yandex_id=row.yandex_id,
+            username=row.username,
+            email=row.email,
+            superuser=bool(row.superuser),
+        )
+        self._cache.set(yandex_id, user)
+        return user
+
+    def set_invalidation_hook(self, hook: InvalidationHook | None) -> None:
+        self.invalidation_hook = hook
+
+    async def invalidate(self, yandex_id: str, broadcast: bool = True) -> None:
+        """Сброс записи пользователя; при broadcast=True сброс рассылается другим воркерам"""
+        self._cache.pop(yandex_id)
+        if broadcast and self.invalidation_hook is not None:
+            result = self.invalidation_hook(yandex_id)
+            if inspect.isawaitable(result):
+                await result
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+users_cache = UsersCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
@@ -0,0 +1,110 @@
+import asyncio
+from typing import TYPE_CHECKING, Any
+
+from app.config.app_config import settings
+from app.config.logger import get_logger
+
+if TYPE_CHECKING:
+    import aiohttp
+
+logger = get_logger()
+
+# Ответы, при которых запрос имеет смысл повторить
+RETRY_STATUSES = {502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class HTTPClient:
+    """
+    Общий HTTP-клиент приложения поверх одной aiohttp.ClientSession.
+    Соединения переиспользуются (keep-alive), число соединений ограничено всего и на хост,
+    у запросов есть таймауты на подключение и чтение, а неудачные запросы повторяются
+    с экспоненциальной задержкой. aiohttp импортируется, а сессия создаётся при первом запросе:
+    он нужен только эндпоинтам авторизации и не должен замедлять старт процесса.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        limit_per_host: int,
+        keepalive_timeout: float,
+        connect_timeout: float,
+        read_timeout: float,
+        retries: int,
+        retry_backoff: float,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self._session: "aiohttp.ClientSession | None" = None
+
+    def get_session(self) -> "aiohttp.ClientSession":
+        """Общая сессия клиента, создаётся при первом обращении"""
+        if self._session is None or self._session.closed:
+            import aiohttp
+
+            timeout = aiohttp.ClientTimeout(
+                total=None, connect=self.connect_timeout, sock_read=self.read_timeout
+            )
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=timeout, raise_for_status=False
+            )
+        return self._session
+
+    async def start(self) -> None:
+        self.get_session()
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def request_json(self, method: str, url: str, **kwargs) -> Any:
+        """
+        Запрос с разбором JSON-ответа; ошибочный статус поднимает aiohttp.ClientResponseError.
+        Неидемпотентные запросы повторяются, только если соединение не было установлено:
+        иначе сервер мог уже обработать запрос (например, погасить код авторизации).
+        """
+        import aiohttp
+
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                async with self.get_session().request(method, url, **kwargs) as response:
+                    if response.status in RETRY_STATUSES and idempotent and attempt < self.retries:
+                        logger.warning("Ответ {} от {}, повтор запроса", response.status, url)
+                    else:
+                        response.raise_for_status()
+                        return await response.json(content_type=None)
+            except aiohttp.ClientConnectorError as e:
+                if attempt >= self.retries:
+                    raise
+                logger.warning("Не удалось подключиться к {}: {}, повтор запроса", url, e)
+            except (asyncio.TimeoutError, aiohttp.ServerDisconnectedError) as e:
+                if not idempotent or attempt >= self.retries:
+                    raise
+                logger.warning("Сбой запроса к {}: {!r}, повтор запроса", url, e)
+            await asyncio.sleep(self.retry_backoff * 2**attempt)
+            attempt += 1
+
+
+http_client = HTTPClient(
+    limit=settings.HTTP_POOL_LIMIT,
+    limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+    keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+    connect_timeout=settings.HTTP_CONNECT_TIMEOUT,
+    read_timeout=settings.HTTP_READ_TIMEOUT,
+    retries=settings.HTTP_RETRIES,
+    retry_backoff=settings.HTTP_RETRY_BACKOFF,
+)
@@ -1,10 +1,23 @@
+import os
+import tempfile
+from typing import Literal
+
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 from pydantic import ConfigDict
 
 ALLOWED_AUDIO = {"mp3", "wav", "ogg", "flac", "aac"}
 AUDIO_STORAGE_PATH = "audio_storage"
+AUDIO_MEDIA_TYPES = {
+    "mp3": "audio/mpeg",
+    "wav": "audio/wav",
+    "ogg": "audio/ogg",
+    "flac": "audio/flac",
+    "aac": "audio/aac",
+}
 VALID_FILENAME_PATTERN = r"^[a-zA-Z0-9_\-\.]+$"
+# Размер блока, которым файл читается из запроса и пишется на диск
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 load_dotenv()
 
@@ -15,6 +28,106 @@ class Settings(BaseSettings):
     YANDEX_CLIENT_SECRET: str
     TOKEN_EXPIRE_HOURS: int
     REFRESH_TOKEN_EXPIRE_DAYS: int
+    # Уровни логирования в консоль и в файл
+    LOG_LEVEL: str = "INFO"
+    LOG_FILE_LEVEL: str = "INFO"
+    # Запись логов в фоновом потоке вместо потока event loop
+    LOG_ENQUEUE: bool = True
+    # Вывод логов JSON-строками с идентификатором запроса
+    LOG_JSON: bool = False
+    # Доля записываемых отладочных сообщений (от 0 до 1)
+    LOG_DEBUG_SAMPLE_RATE: float = 1.0
+    # Максимум сообщений ниже WARNING за один запрос (0 — без ограничения)
+    LOG_REQUEST_BUDGET: int = 0
+    # Пул соединений с БД (для SQLite не используется): постоянные соединения, дополнительные
+    # при пиковой нагрузке, ожидание свободного соединения (сек), пересоздание соединений (сек)
+    # и проверка соединения перед выдачей (защищает от обрывов после перезапуска Postgres)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Размер кэша подготовленных запросов asyncpg на соединение (0 — кэш отключён)
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # Адреса OAuth-сервера и API информации о пользователе Яндекса
+    YANDEX_OAUTH_URL: str = "https://oauth.yandex.ru"
+    YANDEX_LOGIN_URL: str = "https://login.yandex.ru"
+    # Общий HTTP-клиент для внешних сервисов: число соединений всего и на хост,
+    # время жизни простаивающего соединения, таймауты подключения и чтения (сек),
+    # число повторов неудачного запроса и начальная задержка между ними (сек)
+    HTTP_POOL_LIMIT: int = 100
+    HTTP_POOL_LIMIT_PER_HOST: int = 20
+    HTTP_KEEPALIVE_TIMEOUT: float = 30
+    HTTP_CONNECT_TIMEOUT: float = 5
+    HTTP_READ_TIMEOUT: float = 10
+    HTTP_RETRIES: int = 2
+    HTTP_RETRY_BACKOFF: float = 0.2
+    # Число проверенных access-токенов в кэше (0 — кэш отключён)
+    TOKEN_CACHE_SIZE: int = 10000
+    # Кэш пользователей процесса: число записей (0 — кэш отключён) и время жизни записи в секундах
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL: int = 60
+    # Максимальный размер загружаемого файла в байтах
+    MAX_UPLOAD_SIZE: int = 500 * 1024 * 1024
+    # Квота места на пользователя в байтах (сумма размеров его файлов, 0 — без ограничения)
+    USER_STORAGE_QUOTA: int = 0
+    # Допуск пишущих запросов (загрузки): не больше UPLOAD_MAX_WRITERS одновременно на процесс
+    # (0 — без ограничения) и не чаще UPLOAD_RATE_LIMIT запросов в секунду на пользователя
+    # с запасом UPLOAD_RATE_BURST запросов подряд (0 — без ограничения)
+    UPLOAD_MAX_WRITERS: int = 32
+    UPLOAD_RATE_LIMIT: float = 2
+    UPLOAD_RATE_BURST: int = 20
+    # Пакетная загрузка: максимум файлов в одном запросе и число файлов, одновременно публикуемых в хранилище
+    BATCH_UPLOAD_MAX_FILES: int = 200
+    BATCH_UPLOAD_CONCURRENCY: int = 4
+    # Возобновляемая загрузка: время жизни сессии без активности в секундах
+    UPLOAD_SESSION_TTL: int = 24 * 60 * 60
+    # Принятые куски возобновляемой загрузки лежат во временной директории хранилища на узле:
+    # при STORAGE_BACKEND=s3 за несколькими узлами она должна быть общей (или запросы сессии
+    # должны попадать на один узел); без подтверждения этого сессии в режиме s3 не создаются
+    UPLOAD_SPOOL_SHARED: bool = False
+    # Внутренний location nginx (например, /protected-audio/), через который отдаются файлы
+    # локального хранилища по заголовку X-Accel-Redirect; пусто — файл отдаёт приложение
+    DOWNLOAD_ACCEL_REDIRECT: str = ""
+    # Хранилище аудиофайлов: local (директория AUDIO_STORAGE_PATH) или s3
+    STORAGE_BACKEND: Literal["local", "s3"] = "local"
+    S3_BUCKET: str = "audio"
+    S3_ENDPOINT_URL: str | None = None
+    S3_REGION: str | None = None
+    S3_ACCESS_KEY_ID: str | None = None
+    S3_SECRET_ACCESS_KEY: str | None = None
+    S3_PREFIX: str = ""
+    # Размер части multipart-загрузки и число частей, загружаемых параллельно
+    S3_PART_SIZE: int = 8 * 1024 * 1024
+    S3_MAX_CONCURRENCY: int = 8
+    # Сводка пиков для отрисовки волны (нужен NumPy): число точек самого подробного уровня,
+    # число уровней детализации и число процессов, в которых считаются сводки
+    WAVEFORM_POINTS: int = 2048
+    WAVEFORM_LEVELS: int = 3
+    WAVEFORM_WORKERS: int = 2
+    # Период (в секундах), с которым фоновая очистка хранилища проверяет отложенные удаления,
+    # и число записей, обрабатываемых за один проход
+    PURGE_INTERVAL: float = 60
+    PURGE_BATCH_SIZE: int = 100
+    # Время (в секундах), на которое загрузка защищает файл от фоновой очистки:
+    # с запасом больше самой долгой публикации файла в хранилище
+    BLOB_LEASE_TTL: int = 60 * 60
+    # Продакшн-запуск (python -m app.server): адрес, число воркеров (0 — по числу ядер),
+    # очередь входящих соединений, время жизни keep-alive соединения (больше idle-таймаута
+    # балансировщика) и время на завершение запросов в обработке после SIGTERM, в секундах
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0
+    SERVER_BACKLOG: int = 2048
+    SERVER_KEEPALIVE_TIMEOUT: int = 65
+    SERVER_GRACEFUL_TIMEOUT: int = 60
+    # Общая директория снимков метрик воркеров: /metrics любого воркера суммирует метрики всех
+    # (python -m app.server при нескольких воркерах создаёт её сам; пусто — метрики своего процесса)
+    # и период (в секундах), с которым воркер записывает туда свой снимок
+    METRICS_DIR: str = ""
+    METRICS_FLUSH_INTERVAL: float = 1
+    # Файл межпроцессной блокировки, под которой создаются таблицы БД и директория хранилища
+    INIT_LOCK_FILE: str = os.path.join(tempfile.gettempdir(), "fastapi_audio_server.init.lock")
 
     model_config = ConfigDict(env_file=".env", env_file_encoding="utf-8")
 
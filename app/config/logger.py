@@ -1,30 +1,165 @@
-from loguru import logger
-import sys
+import json
 import os
+import random
+import sys
+from contextvars import ContextVar
 
-# Создаём папку для логов, если её нет
-LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
+from loguru import logger
+
+from app.config.app_config import settings
 
+LOG_DIR = "logs"
 # Полный путь до файла логов
 LOG_FILE = os.path.join(LOG_DIR, "app.log")
 
+LOG_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level} | {extra[request_id]} | {message}"
+
+# Идентификатор текущего запроса и число сообщений, записанных в его рамках
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+request_log_count_var: ContextVar[list[int] | None] = ContextVar(
+    "request_log_count", default=None
+)
+# Сообщение уже прошло выборку отладочных сообщений в RequestLogger
+_sampled_var: ContextVar[bool] = ContextVar("log_sampled", default=False)
+
+
+def sample_debug() -> bool:
+    """Выборка отладочных сообщений: True с вероятностью LOG_DEBUG_SAMPLE_RATE"""
+    return random.random() < settings.LOG_DEBUG_SAMPLE_RATE
+
+
+def over_request_budget() -> bool:
+    """Бюджет сообщений ниже WARNING в текущем запросе уже исчерпан"""
+    if settings.LOG_REQUEST_BUDGET <= 0:
+        return False
+    counter = request_log_count_var.get()
+    return counter is not None and counter[0] >= settings.LOG_REQUEST_BUDGET
+
+
+def log_filter(record: dict) -> bool:
+    """
+    Отбор сообщений перед записью в sink'и:
+    отладочные сообщения пропускаются с вероятностью LOG_DEBUG_SAMPLE_RATE,
+    а в рамках одного запроса пишется не больше LOG_REQUEST_BUDGET сообщений
+    уровнем ниже WARNING. Решение принимается один раз на сообщение
+    и переиспользуется всеми sink'ами. loguru вызывает фильтр уже после форматирования,
+    поэтому для DEBUG и INFO те же условия заранее проверяет RequestLogger.
+    """
+    extra = record["extra"]
+    decision = extra.get("_accepted")
+    if decision is not None:
+        return decision
+    extra["request_id"] = request_id_var.get()
+    level = record["level"].no
+    if level < 20 and not _sampled_var.get() and not sample_debug():
+        decision = False
+    elif level < 30 and settings.LOG_REQUEST_BUDGET > 0:
+        counter = request_log_count_var.get()
+        if counter is None:
+            decision = True
+        else:
+            counter[0] += 1
+            decision = counter[0] <= settings.LOG_REQUEST_BUDGET
+    else:
+        decision = True
+    extra["_accepted"] = decision
+    return decision
+
+
+def json_format(record: dict) -> str:
+    """Сообщение одной JSON-строкой: время, уровень, запрос, место в коде и поля extra"""
+    payload = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "request_id": record["extra"].get("request_id"),
+        "message": record["message"],
+        "module": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+    }
+    for key, value in record["extra"].items():
+        if not key.startswith("_") and key != "request_id":
+            payload[key] = value
+    if record["exception"] is not None:
+        payload["exception"] = repr(record["exception"].value)
+    record["extra"]["_json"] = json.dumps(payload, ensure_ascii=False, default=str)
+    return "{extra[_json]}\n"
+
+
 # Удаляем стандартный обработчик
 logger.remove()
+logger.configure(extra={"request_id": "-"})
 
-# Логирование в консоль
-logger.add(sys.stdout, format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}", level="INFO")
+log_format = json_format if settings.LOG_JSON else LOG_FORMAT
 
-# Логирование в файл с ротацией и сжатием старых логов
+# Логирование в консоль; при LOG_ENQUEUE запись выполняется
+# в фоновом потоке, а не в потоке event loop
 logger.add(
-    LOG_FILE,
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}",
-    level="DEBUG",
-    rotation="10 MB",
-    retention="5 days",
-    compression="zip",
-    encoding="utf-8"
+    sys.stdout,
+    format=log_format,
+    level=settings.LOG_LEVEL,
+    filter=log_filter,
+    enqueue=settings.LOG_ENQUEUE,
 )
 
-def get_logger():
-    return logger
\ No newline at end of file
+_file_sink_id: int | None = None
+
+
+def setup_file_logging() -> None:
+    """
+    Логирование в файл с ротацией и сжатием старых логов. Подключается при старте приложения
+    (lifespan, app.server), а не при импорте: импорт остаётся быстрым, а тесты и утилиты
+    не создают файлов логов. Повторный вызов ничего не делает.
+    """
+    global _file_sink_id
+    if _file_sink_id is not None:
+        return
+    os.makedirs(LOG_DIR, exist_ok=True)
+    _file_sink_id = logger.add(
+        LOG_FILE,
+        format=log_format,
+        level=settings.LOG_FILE_LEVEL,
+        filter=log_filter,
+        enqueue=settings.LOG_ENQUEUE,
+        rotation="10 MB",
+        retention="5 days",
+        compression="zip",
+        encoding="utf-8"
+    )
+
+
+class RequestLogger:
+    """
+    Обёртка над loguru для сообщений уровней DEBUG и INFO. loguru вызывает фильтр sink'а
+    уже после разбора стека и форматирования сообщения, поэтому выборка отладочных сообщений
+    и бюджет запроса проверяются здесь заранее: отброшенное сообщение не форматируется.
+    Счётчик бюджета по-прежнему увеличивает log_filter, один раз на записанное сообщение.
+    Остальные методы и уровни передаются loguru без изменений.
+    """
+
+    def __init__(self, base):
+        self._logger = base
+
+    def __getattr__(self, name: str):
+        return getattr(self._logger, name)
+
+    def debug(self, message: str, *args, **kwargs) -> None:
+        if not sample_debug() or over_request_budget():
+            return
+        token = _sampled_var.set(True)
+        try:
+            self._logger.opt(depth=1).debug(message, *args, **kwargs)
+        finally:
+            _sampled_var.reset(token)
+
+    def info(self, message: str, *args, **kwargs) -> None:
+        if over_request_budget():
+            return
+        self._logger.opt(depth=1).info(message, *args, **kwargs)
+
+
+_request_logger = RequestLogger(logger)
+
+
+def get_logger() -> RequestLogger:
+    return _request_logger
@@ -1,15 +1,138 @@
+import hashlib
+import time
 from typing import AsyncGenerator
 
+from sqlalchemy import MetaData, select, delete, insert, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, make_url
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker, AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.schema import CreateColumn
 
 from app.config.app_config import settings
+from app.metrics.metrics import registry, instrument_engine
 from app.models.base_model import Base
+from app.models.schema_version import SchemaVersionORM
 from app.config.logger import get_logger
 
 logger = get_logger()
 
+# INSERT с поддержкой ON CONFLICT для используемых диалектов
+INSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, учитывающий время ожидания свободного соединения"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_count += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+
+def get_engine_options(database_url: str) -> dict:
+    """Параметры пула и драйвера для create_async_engine"""
+    url = make_url(database_url)
+    # SQLite работает с одним файлом или памятью процесса, пул ему не нужен
+    if url.get_backend_name() == "sqlite":
+        return {}
+    options = {
+        "poolclass": TimedAsyncQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE
+        }
+    return options
+
+
+def schema_fingerprint(metadata: MetaData) -> str:
+    """
+    Отпечаток схемы моделей: таблицы, столбцы (тип, nullable, ключи) и индексы.
+    Меняется при любом изменении моделей, поэтому номер версии не нужно вести вручную.
+    """
+    parts = []
+    for table in sorted(metadata.tables.values(), key=lambda table: table.name):
+        parts.append(f"table {table.name}")
+        for column in table.columns:
+            foreign_keys = ",".join(sorted(fk.target_fullname for fk in column.foreign_keys))
+            parts.append(
+                f"column {column.name} {column.type!r} {column.nullable} {column.primary_key} {foreign_keys}"
+            )
+        for index in sorted(table.indexes, key=lambda index: index.name or ""):
+            columns = ",".join(str(expression) for expression in index.expressions)
+            parts.append(f"index {index.name} {index.unique} {columns} {sorted(index.dialect_kwargs.items())}")
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def sync_schema(connection: Connection) -> None:
+    """
+    Приведение схемы БД к моделям без потери данных: create_all создаёт недостающие таблицы,
+    в существующие таблицы добавляются недостающие столбцы и индексы.
+    Добавленные столбцы с запросом в info["backfill"] заполняются этим запросом
+    после добавления всех столбцов. Перед созданием индекса с функцией в info["before_create"]
+    она вызывается с соединением (например, чтобы исправить данные под уникальный индекс).
+    Изменение типов и удаление столбцов не выполняется.
+    """
+    backfills = []
+    Base.metadata.create_all(connection)
+    inspector = inspect(connection)
+    preparer = connection.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                column_ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.execute(
+                    text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {column_ddl}")
+                )
+                logger.info("В таблицу {} добавлен столбец {}", table.name, column.name)
+                if "backfill" in column.info:
+                    backfills.append(column)
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            # индексы, объявленные только для другой СУБД (Index.ddl_if)
+            ddl_if = index._ddl_if
+            if ddl_if is not None and ddl_if.dialect not in (None, connection.dialect.name):
+                continue
+            if index.name not in existing_indexes:
+                if "before_create" in index.info:
+                    fixed = index.info["before_create"](connection)
+                    if fixed:
+                        logger.warning("Перед созданием индекса {} исправлено записей: {}", index.name, fixed)
+                index.create(connection)
+                logger.info("В таблице {} создан индекс {}", table.name, index.name)
+    for column in backfills:
+        connection.execute(column.info["backfill"])
+        logger.info("Заполнен столбец {}.{}", column.table.name, column.name)
+
+
 # Создаем асинхронный движок
-async_engine = create_async_engine(settings.DATABASE_URL)
+async_engine = create_async_engine(
+    settings.DATABASE_URL, **get_engine_options(settings.DATABASE_URL)
+)
+instrument_engine(async_engine)
 
 
 # Сессия для асинхронных запросов
@@ -29,6 +152,31 @@ class DBHelper:
             await conn.run_sync(Base.metadata.create_all)
             logger.info("Таблицы в базе данных созданы")
 
+    async def ensure_schema(self) -> bool:
+        """
+        Проверка версии схемы одной выборкой вместо create_all, который инспектирует каждую таблицу.
+        DDL (sync_schema) выполняется, только если сохранённая версия не совпадает
+        с отпечатком моделей или её ещё нет. Возвращает True, если схема обновлялась.
+        """
+        version = schema_fingerprint(Base.metadata)
+        try:
+            async with self.async_engine.connect() as conn:
+                stored = await conn.scalar(
+                    select(SchemaVersionORM.version).where(SchemaVersionORM.id == 1)
+                )
+        except DBAPIError:
+            # таблицы версии ещё нет
+            stored = None
+        if stored == version:
+            logger.info("Схема БД актуальна (версия {}), DDL пропущен", version[:12])
+            return False
+        async with self.async_engine.begin() as conn:
+            await conn.run_sync(sync_schema)
+            await conn.execute(delete(SchemaVersionORM))
+            await conn.execute(insert(SchemaVersionORM).values(id=1, version=version))
+        logger.info("Схема БД обновлена до версии {}", version[:12])
+        return True
+
     async def drop_all(self) -> None:
         """Удаление всех таблиц из базы данных"""
         async with self.async_engine.begin() as conn:
@@ -38,8 +186,57 @@ class DBHelper:
     async def get_session(self) -> AsyncGenerator[AsyncSession, None]:
         """Получение асинхронной сессии для работы с базой данных"""
         async with self.async_session_maker() as session:
-            logger.info("Сессия базы данных получена")
+            logger.debug("Сессия базы данных получена")
             yield session
 
+    def pool_stats(self) -> dict:
+        """
+        Текущее состояние пула соединений: занятые и свободные соединения,
+        переполнение сверх pool_size и время ожидания свободного соединения.
+        Если занятые соединения держатся у pool_size + max_overflow, а ожидание растёт,
+        пул исчерпан раньше, чем запросы начнут падать по pool_timeout.
+        """
+        pool = self.async_engine.pool
+        stats = {"pool": type(pool).__name__}
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            stats.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+            )
+        if isinstance(pool, TimedAsyncQueuePool):
+            stats.update(
+                wait_count=pool.wait_count,
+                wait_total=pool.wait_total,
+                wait_max=pool.wait_max,
+                timeouts=pool.timeouts,
+            )
+        return stats
+
 
 db_helper = DBHelper(async_engine, AsyncSessionLocal)
+
+
+# Описание метрик пула: ключ pool_stats() -> (имя метрики, описание, тип)
+POOL_METRICS = {
+    "size": ("db_pool_size", "Число постоянных соединений пула", "gauge"),
+    "checked_in": ("db_pool_checked_in", "Число свободных соединений пула", "gauge"),
+    "checked_out": ("db_pool_checked_out", "Число занятых соединений пула", "gauge"),
+    "overflow": ("db_pool_overflow", "Число соединений сверх pool_size", "gauge"),
+    "wait_count": ("db_pool_acquire_total", "Число выдач соединений из пула", "counter"),
+    "wait_total": ("db_pool_wait_seconds_total", "Суммарное время ожидания соединения", "counter"),
+    "wait_max": ("db_pool_wait_seconds_max", "Максимальное время ожидания соединения", "gauge"),
+    "timeouts": ("db_pool_timeouts_total", "Число отказов по pool_timeout", "counter"),
+}
+
+
+def collect_pool_metrics():
+    """Состояние пула соединений, снимается в момент запроса /metrics"""
+    stats = db_helper.pool_stats()
+    for key, (name, documentation, metric_type) in POOL_METRICS.items():
+        if key in stats:
+            yield name, documentation, metric_type, [({}, stats[key])]
+
+
+registry.add_collector(collect_pool_metrics)
@@ -1,45 +1,77 @@
-import os
+# отметка начала импорта для отчёта о времени старта, импортируется первой
+from app.metrics.startup import startup_report
+
 from contextlib import asynccontextmanager
+from functools import partial
 
-import uvicorn
 from fastapi import FastAPI
 
-from app.config.app_config import AUDIO_STORAGE_PATH
-from app.database.database_helper import db_helper
-from app.config.logger import get_logger
+from app.server import initialize_once, serve
+from app.config.app_config import settings
+from app.metrics.metrics import registry
+from app.metrics.multiprocess import metrics_flusher
+from app.cache.ttl_cache import collect_cache_metrics
+from app.cache.users_cache import users_cache
+from app.repositories.auth_router_repo import token_cache
+from app.storage.storage_helper import storage
+from app.repositories.purge_repo import purge_worker
+from app.clients.http_client import http_client
+from app.repositories.waveform_repo import WaveformRepo
+from app.config.logger import get_logger, setup_file_logging
+from app.middleware.request_context import RequestContextMiddleware
+from app.middleware.startup_report import StartupReportMiddleware
+from app.middleware.upload_admission import UploadAdmissionMiddleware, upload_admission
 
 # импорт маршрутов
 from app.routers.audio_router import audio_router
 from app.routers.auth_router import auth_router
 from app.routers.users_router import users_router
 from app.routers.admin_router import admin_router
+from app.routers.metrics_router import metrics_router
 
 logger = get_logger()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Убедимся, что директория для сохранения аудио файлов существует
-    logger.info("Проверка директории для сохранения аудио файлов")
-    if not os.path.exists(AUDIO_STORAGE_PATH):
-        try:
-            os.makedirs(AUDIO_STORAGE_PATH)
-            logger.info("Директория успешно создана")
-        except Exception as e:
-            logger.error(f"Ошибка при создании директории для аудио: {e}")
-            raise Exception(f"Ошибка при создании директории для аудио: {e}")
-    await db_helper.create_all()
-    logger.info("База данных создана")
+    startup_report.mark("server")
+    setup_file_logging()
+    # Директория хранилища и схема БД: один раз на сервер, а не в каждом воркере
+    await initialize_once()
+    startup_report.mark("initialization")
+    # фоновая очистка хранилища; при старте дочищает прерванные удаления.
+    # HTTP-клиент для запросов к Яндексу создаётся при первом запросе
+    purge_worker.start()
+    # снимок метрик для /metrics других воркеров
+    if settings.METRICS_DIR:
+        metrics_flusher.start()
+    startup_report.mark("background")
     logger.info("Запуск приложения")
     yield
+    await http_client.close()
+    WaveformRepo.shutdown()
+    await purge_worker.stop()
+    await metrics_flusher.stop()
+    await storage.close()
 
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(UploadAdmissionMiddleware, admission=upload_admission)
+# отчёт о старте пишется внутри контекста запроса, с его X-Request-ID
+app.add_middleware(StartupReportMiddleware, report=startup_report)
+app.add_middleware(RequestContextMiddleware)
 
 app.include_router(auth_router)
 app.include_router(audio_router)
 app.include_router(users_router)
 app.include_router(admin_router)
+app.include_router(metrics_router)
+
+registry.add_collector(startup_report.collect)
+registry.add_collector(
+    partial(collect_cache_metrics, {"token": token_cache, "users": users_cache})
+)
+startup_report.mark("imports")
 
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000)
+    serve()
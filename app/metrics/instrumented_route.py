@@ -0,0 +1,40 @@
+import time
+
+from fastapi.routing import APIRoute
+from starlette.types import Message, Receive, Scope, Send
+
+from app.metrics.metrics import (
+    http_requests_total,
+    http_request_duration_seconds,
+    http_requests_in_progress,
+)
+
+
+class InstrumentedRoute(APIRoute):
+    """
+    Маршрут FastAPI, учитывающий число, длительность и статусы запросов,
+    а также запросы в обработке. Метки — шаблон пути маршрута, а не фактический путь,
+    поэтому число рядов метрик не зависит от id в URL.
+    """
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = http_requests_in_progress.labels(method, self.path)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await super().handle(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            http_request_duration_seconds.labels(method, self.path).observe(
+                time.perf_counter() - started
+            )
+            http_requests_total.labels(method, self.path, str(status)).inc()
@@ -0,0 +1,85 @@
+import time
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.metrics.registry import Registry
+
+MB = 1024 * 1024
+QUERY_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+registry = Registry()
+
+http_requests_total = registry.counter(
+    "http_requests_total", "Число обработанных HTTP-запросов", ("method", "route", "status")
+)
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса", ("method", "route")
+)
+http_requests_in_progress = registry.gauge(
+    "http_requests_in_progress", "Число HTTP-запросов в обработке", ("method", "route")
+)
+
+audio_upload_bytes_total = registry.counter(
+    "audio_upload_bytes_total", "Объём принятых аудиофайлов в байтах"
+)
+audio_upload_size_bytes = registry.histogram(
+    "audio_upload_size_bytes",
+    "Размер загруженного аудиофайла в байтах",
+    buckets=(0.1 * MB, MB, 5 * MB, 10 * MB, 25 * MB, 50 * MB, 100 * MB, 250 * MB, 500 * MB),
+)
+audio_upload_throughput_bytes_per_second = registry.histogram(
+    "audio_upload_throughput_bytes_per_second",
+    "Скорость потоковой записи загруженного аудиофайла в хранилище в байтах в секунду",
+    buckets=(0.1 * MB, 0.5 * MB, MB, 5 * MB, 10 * MB, 25 * MB, 50 * MB, 100 * MB, 250 * MB),
+)
+upload_rejected_total = registry.counter(
+    "upload_rejected_total",
+    "Число пишущих запросов, отклонённых с 429: writers — занят лимит одновременных записей, "
+    "rate — превышен лимит частоты пользователя",
+    ("reason",),
+)
+
+db_queries_total = registry.counter(
+    "db_queries_total", "Число выполненных запросов к БД", ("operation",)
+)
+db_query_duration_seconds = registry.histogram(
+    "db_query_duration_seconds", "Время выполнения запроса к БД", ("operation",)
+)
+
+yandex_request_duration_seconds = registry.histogram(
+    "yandex_request_duration_seconds",
+    "Время запроса к API Яндекса",
+    ("endpoint", "status"),
+)
+
+
+def observe_upload(size: int, duration: float) -> None:
+    """Учёт принятого файла: объём, размер и скорость приёма"""
+    audio_upload_bytes_total.inc(size)
+    audio_upload_size_bytes.observe(size)
+    if duration > 0:
+        audio_upload_throughput_bytes_per_second.observe(size / duration)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Учёт числа и длительности запросов к БД через события движка SQLAlchemy"""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_started"].pop()
+        operation = statement.lstrip()[:6].upper()
+        if operation not in QUERY_OPERATIONS:
+            operation = "WITH" if operation.startswith("WITH") else "OTHER"
+        db_queries_total.labels(operation).inc()
+        db_query_duration_seconds.labels(operation).observe(duration)
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection else None
+        if started:
+            started.pop()
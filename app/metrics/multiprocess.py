@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import time
+
+from app.config.app_config import settings
+from app.config.logger import get_logger
+from app.metrics.metrics import registry
+from app.metrics.registry import CollectedMetric, Registry
+
+logger = get_logger()
+
+SNAPSHOT_SUFFIX = ".json"
+# Через сколько периодов записи без обновления снимка процесс считается завершившимся
+STALE_INTERVALS = 10
+
+
+def snapshot_path(directory: str) -> str:
+    return os.path.join(directory, f"{os.getpid()}{SNAPSHOT_SUFFIX}")
+
+
+def write_snapshot(snapshot: dict, directory: str, live: bool = True) -> None:
+    """Запись снимка метрик процесса в общую директорию; файл заменяется атомарно"""
+    os.makedirs(directory, exist_ok=True)
+    path = snapshot_path(directory)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump({**snapshot, "pid": os.getpid(), "time": time.time(), "live": live}, file)
+    os.replace(tmp_path, path)
+
+
+def read_snapshots(directory: str) -> list[dict]:
+    """Снимки метрик всех процессов, когда-либо писавших в директорию"""
+    snapshots = []
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return snapshots
+    for name in sorted(names):
+        if not name.endswith(SNAPSHOT_SUFFIX):
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as file:
+                snapshots.append(json.load(file))
+        except (OSError, ValueError):
+            # файл удалён или записан не полностью: процесс будет учтён в следующем запросе
+            continue
+    return snapshots
+
+
+def clear_snapshots(directory: str) -> None:
+    """Удаление снимков предыдущего запуска сервера"""
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith(SNAPSHOT_SUFFIX) or name.endswith(f"{SNAPSHOT_SUFFIX}.tmp"):
+            os.remove(os.path.join(directory, name))
+
+
+def render_snapshots(snapshots: list[dict], stale_after: float) -> str:
+    """
+    Метрики всех воркеров в текстовом формате Prometheus. Счётчики и гистограммы суммируются
+    по всем процессам, в том числе завершившимся, поэтому не убывают между запросами;
+    gauge суммируются по живым процессам. Процесс живой, если он не завершился штатно
+    и обновлял снимок не дольше stale_after секунд назад. Метрики коллекторов (пул соединений,
+    кэши, отчёт о старте) описывают отдельный процесс и выводятся с меткой worker=<pid>.
+    """
+    merged = Registry()
+    collected: dict[str, CollectedMetric] = {}
+    now = time.time()
+    for snapshot in snapshots:
+        live = snapshot["live"] and now - snapshot["time"] <= stale_after
+        items = merged.merge(snapshot, live)
+        if not live:
+            continue
+        worker = str(snapshot["pid"])
+        for name, documentation, metric_type, samples in items:
+            _, _, _, merged_samples = collected.setdefault(name, (name, documentation, metric_type, []))
+            merged_samples.extend(({**labels, "worker": worker}, value) for labels, value in samples)
+    merged.add_collector(collected.values)
+    return merged.render()
+
+
+def render_multiprocess(snapshot: dict, directory: str) -> str:
+    """Свежий снимок текущего процесса записывается в директорию, затем объединяются снимки всех процессов"""
+    write_snapshot(snapshot, directory)
+    stale_after = settings.METRICS_FLUSH_INTERVAL * STALE_INTERVALS
+    return render_snapshots(read_snapshots(directory), stale_after)
+
+
+class MetricsFlusher:
+    """
+    Фоновая задача воркера: раз в interval секунд записывает снимок метрик процесса
+    в общую директорию, откуда их читает воркер, обслуживающий /metrics.
+    При остановке записывает последний снимок с пометкой о штатном завершении.
+    """
+
+    def __init__(self, registry: Registry, directory: str, interval: float):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush(live=False)
+
+    async def flush(self, live: bool = True) -> None:
+        # снимок снимается в потоке event loop, где метрики изменяются, а пишется в пуле потоков
+        await asyncio.to_thread(write_snapshot, self.registry.snapshot(), self.directory, live)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Ошибка при записи метрик процесса: {}", e)
+            await asyncio.sleep(self.interval)
+
+
+metrics_flusher = MetricsFlusher(registry, settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL)
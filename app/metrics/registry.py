@@ -0,0 +1,269 @@
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+# Границы бакетов гистограмм по умолчанию, в секундах
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Сэмпл метрики, которую собирает коллектор в момент запроса /metrics:
+# (имя, описание, тип, [(метки, значение), ...])
+CollectedMetric = tuple[str, str, str, list[tuple[dict[str, str], float]]]
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class GaugeChild(CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        # последний элемент — значения больше всех границ (+Inf)
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Metric:
+    """
+    Метрика с метками. Значения хранятся в памяти процесса и обновляются
+    из одного event loop без блокировок; текст для Prometheus формируется
+    только при запросе /metrics.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Значение метрики для набора меток; часто используемые наборы стоит сохранять"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"Метрика {self.name} ожидает метки {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def _child_state(self, child):
+        raise NotImplementedError
+
+    def _merge_child(self, child, state) -> None:
+        raise NotImplementedError
+
+    def snapshot(self) -> dict:
+        """Значения метрики в виде, пригодном для JSON (см. app.metrics.multiprocess)"""
+        return {
+            "name": self.name,
+            "documentation": self.documentation,
+            "type": self.type,
+            "labelnames": list(self.labelnames),
+            "children": [[list(values), self._child_state(child)] for values, child in self._children.items()],
+        }
+
+    def merge(self, snapshot: dict) -> None:
+        """Прибавление значений из снимка той же метрики другого процесса"""
+        for values, state in snapshot["children"]:
+            self._merge_child(self.labels(*values), state)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def _child_state(self, child: CounterChild) -> float:
+        return child.value
+
+    def _merge_child(self, child: CounterChild, state: float) -> None:
+        child.inc(state)
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{format_labels(dict(zip(self.labelnames, values)))} {format_value(child.value)}"
+            for values, child in self._children.items()
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def _new_child(self) -> GaugeChild:
+        return GaugeChild()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.bounds)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def snapshot(self) -> dict:
+        return {**super().snapshot(), "buckets": list(self.bounds)}
+
+    def _child_state(self, child: HistogramChild) -> list:
+        return [list(child.counts), child.sum]
+
+    def _merge_child(self, child: HistogramChild, state: list) -> None:
+        counts, total = state
+        child.counts = [own + other for own, other in zip(child.counts, counts)]
+        child.sum += total
+
+    def _samples(self) -> list[str]:
+        lines = []
+        for values, child in self._children.items():
+            labels = dict(zip(self.labelnames, values))
+            cumulative = 0
+            for bound, count in zip((*self.bounds, float("inf")), child.counts):
+                cumulative += count
+                bucket_labels = format_labels({**labels, "le": format_value(bound)})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {format_value(child.sum)}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {cumulative}")
+        return lines
+
+
+# Классы метрик по типу Prometheus, для восстановления метрик из снимков
+METRIC_TYPES: dict[str, type[Metric]] = {
+    "counter": Counter,
+    "gauge": Gauge,
+    "histogram": Histogram,
+}
+
+
+class Registry:
+    """Набор метрик процесса и коллекторов, вычисляемых в момент запроса /metrics"""
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._collectors: list[Callable[[], Iterable[CollectedMetric]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[CollectedMetric]]) -> None:
+        self._collectors.append(collector)
+
+    def snapshot(self) -> dict:
+        """Значения метрик и коллекторов на текущий момент в виде, пригодном для JSON"""
+        return {
+            "metrics": [metric.snapshot() for metric in self._metrics.values()],
+            "collected": [list(item) for collector in self._collectors for item in collector()],
+        }
+
+    def merge(self, snapshot: dict, live: bool) -> list[CollectedMetric]:
+        """
+        Прибавление снимка метрик другого процесса: счётчики и гистограммы суммируются,
+        gauge — только у живых процессов (live). Возвращает метрики коллекторов снимка,
+        их объединяет вызывающий код.
+        """
+        for data in snapshot["metrics"]:
+            if data["type"] == "gauge" and not live:
+                continue
+            metric = self._metrics.get(data["name"])
+            if metric is None:
+                metric_class = METRIC_TYPES[data["type"]]
+                options = {"buckets": data["buckets"]} if "buckets" in data else {}
+                metric = self.register(
+                    metric_class(data["name"], data["documentation"], data["labelnames"], **options)
+                )
+            metric.merge(data)
+        return [tuple(item) for item in snapshot["collected"]]
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        blocks = [metric.render() for metric in self._metrics.values()]
+        for collector in self._collectors:
+            for name, documentation, metric_type, samples in collector():
+                lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+                lines.extend(
+                    f"{name}{format_labels(labels)} {format_value(value)}" for labels, value in samples
+                )
+                blocks.append("\n".join(lines))
+        return "\n".join(blocks) + "\n"
@@ -0,0 +1,60 @@
+import os
+import time
+
+# Модуль импортируется первым в app.main, поэтому это момент начала импорта приложения
+IMPORT_STARTED = time.perf_counter()
+
+
+def process_age() -> float | None:
+    """Сколько секунд прошло с запуска процесса (по /proc, только Linux); None, если неизвестно"""
+    try:
+        with open("/proc/self/stat") as stat:
+            # поле starttime — 22-е, считаем после имени процесса в скобках
+            start_ticks = int(stat.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as uptime:
+            system_uptime = float(uptime.read().split()[0])
+        return max(0.0, system_uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupReport:
+    """
+    Разбивка времени старта процесса по фазам: запуск интерпретатора до импорта приложения,
+    импорт модулей, шаги lifespan и обработка первого запроса (холодные соединения и ленивые импорты).
+    Фазы отмечаются по порядку через mark; отчёт пишется в лог после первого запроса
+    и отдаётся в /metrics как app_startup_phase_seconds.
+    """
+
+    def __init__(self, started: float, interpreter: float | None):
+        self._last = started
+        self.phases: dict[str, float] = {}
+        if interpreter is not None:
+            self.phases["interpreter"] = interpreter
+        self.first_request_done = False
+
+    def mark(self, phase: str) -> None:
+        """Завершение фазы: время с конца предыдущей фазы"""
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def restart(self) -> None:
+        """Начало новой фазы после паузы, которая в отчёт не входит (ожидание первого запроса)"""
+        self._last = time.perf_counter()
+
+    def format(self) -> str:
+        total = sum(self.phases.values())
+        phases = ", ".join(f"{phase} {seconds * 1000:.0f} мс" for phase, seconds in self.phases.items())
+        return f"{total * 1000:.0f} мс: {phases}"
+
+    def collect(self):
+        yield (
+            "app_startup_phase_seconds",
+            "Длительность фаз старта процесса",
+            "gauge",
+            [({"phase": phase}, seconds) for phase, seconds in self.phases.items()],
+        )
+
+
+startup_report = StartupReport(IMPORT_STARTED, process_age())
@@ -0,0 +1,49 @@
+import re
+import uuid
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config.logger import request_id_var, request_log_count_var
+
+REQUEST_ID_HEADER = b"x-request-id"
+# Идентификатор из заголовка клиента принимается, только если он короткий и без спецсимволов
+VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._\-]{1,64}$")
+
+
+class RequestContextMiddleware:
+    """
+    ASGI-middleware, задающее контекст логирования запроса: идентификатор запроса
+    (из заголовка X-Request-ID или новый) и счётчик сообщений для LOG_REQUEST_BUDGET.
+    Идентификатор возвращается клиенту в заголовке X-Request-ID.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")
+                break
+        if request_id is None or not VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        async def send_with_request_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((REQUEST_ID_HEADER, request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        request_id_token = request_id_var.set(request_id)
+        log_count_token = request_log_count_var.set([0])
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_log_count_var.reset(log_count_token)
+            request_id_var.reset(request_id_token)
@@ -0,0 +1,29 @@
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.metrics.startup import StartupReport
+from app.config.logger import get_logger
+
+logger = get_logger()
+
+
+class StartupReportMiddleware:
+    """
+    ASGI-middleware, замеряющее первый HTTP-запрос процесса и записывающее в лог
+    отчёт о времени старта. Дальше запросы передаются без замеров.
+    """
+
+    def __init__(self, app: ASGIApp, report: StartupReport):
+        self.app = app
+        self.report = report
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.report.first_request_done or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.report.first_request_done = True
+        self.report.restart()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.report.mark("first_request")
+            logger.info("Старт процесса: {}", self.report.format())
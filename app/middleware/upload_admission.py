@@ -0,0 +1,126 @@
+import math
+import re
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.cache.rate_limit import RateLimitStore, MemoryRateLimitStore
+from app.config.app_config import settings
+from app.metrics.metrics import upload_rejected_total
+from app.repositories.auth_router_repo import AuthRepo
+from app.config.logger import get_logger
+
+logger = get_logger()
+
+# Запросы, которые пишут на диск: загрузка файла, пакета, куска возобновляемой загрузки
+# и завершение возобновляемой загрузки (чтение файла целиком для подсчёта SHA-256)
+WRITE_ROUTES = (
+    ("POST", re.compile(r"^/audio/upload(_batch)?/$")),
+    ("PATCH", re.compile(r"^/audio/uploads/[^/]+$")),
+    ("POST", re.compile(r"^/audio/uploads/[^/]+/finalize$")),
+)
+AUTHORIZATION_HEADER = b"authorization"
+
+
+class UploadAdmission:
+    """
+    Допуск пишущих запросов: не больше UPLOAD_MAX_WRITERS одновременно на процесс
+    и не чаще UPLOAD_RATE_LIMIT запросов в секунду (с запасом UPLOAD_RATE_BURST) на пользователя.
+    Состояние лимита частоты хранится в store, его можно заменить общим хранилищем через set_store.
+    """
+
+    def __init__(self, store: RateLimitStore):
+        self.store = store
+        self.writers = 0
+
+    def set_store(self, store: RateLimitStore) -> None:
+        self.store = store
+
+    async def acquire(self, yandex_id: str) -> tuple[str, float] | None:
+        """
+        Занять место пишущего запроса. None, если запрос допущен (место освобождается через
+        release), иначе (причина, через сколько секунд повторить)
+        """
+        if 0 < settings.UPLOAD_MAX_WRITERS <= self.writers:
+            return "writers", 1.0
+        if settings.UPLOAD_RATE_LIMIT > 0:
+            try:
+                wait = await self.store.take(
+                    yandex_id, settings.UPLOAD_RATE_LIMIT, settings.UPLOAD_RATE_BURST
+                )
+            except Exception as e:
+                # недоступность общего хранилища не должна останавливать загрузки
+                logger.error("Ошибка хранилища лимитов, запрос допущен без проверки: {}", e)
+                wait = 0.0
+            if wait > 0:
+                return "rate", wait
+        self.writers += 1
+        return None
+
+    def release(self) -> None:
+        self.writers -= 1
+
+
+class UploadAdmissionMiddleware:
+    """
+    ASGI-middleware, отклоняющее пишущие запросы сверх лимитов UploadAdmission ответом 429
+    с заголовком Retry-After до чтения тела запроса, поэтому отклонённая загрузка не занимает
+    ни диск, ни соединение с БД. Пользователь определяется по access-токену (проверка
+    кэшируется); запросы без действительного токена пропускаются, их отклонит эндпоинт.
+    """
+
+    def __init__(self, app: ASGIApp, admission: UploadAdmission):
+        self.app = app
+        self.admission = admission
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        yandex_id = None
+        if scope["type"] == "http" and self.is_write(scope):
+            yandex_id = self.get_yandex_id(scope)
+        if yandex_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        rejected = await self.admission.acquire(yandex_id)
+        if rejected is not None:
+            reason, retry_after = rejected
+            upload_rejected_total.labels(reason).inc()
+            logger.warning(
+                "Запрос {} {} пользователя с yandex_id {} отклонён: {}",
+                scope["method"], scope["path"], yandex_id, reason,
+            )
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Too many requests"},
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release()
+
+    @staticmethod
+    def is_write(scope: Scope) -> bool:
+        return any(
+            scope["method"] == method and pattern.match(scope["path"])
+            for method, pattern in WRITE_ROUTES
+        )
+
+    @staticmethod
+    def get_yandex_id(scope: Scope) -> str | None:
+        for name, value in scope["headers"]:
+            if name == AUTHORIZATION_HEADER:
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() != "bearer" or not token:
+                    return None
+                try:
+                    return AuthRepo.check_current_user(token).get("yandex_id")
+                except HTTPException:
+                    return None
+        return None
+
+
+upload_admission = UploadAdmission(MemoryRateLimitStore())
@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import Integer, String, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base_model import Base
+
+
+class PurgeTombstoneORM(Base):
+    """
+    Отложенное удаление данных из хранилища.
+    Запись создаётся в той же транзакции, что и удаление строк в БД,
+    и удаляется только после очистки хранилища, поэтому прерванная очистка
+    продолжается после перезапуска.
+    """
+
+    __tablename__ = "purge_tombstones"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    # blob — файл по SHA-256 (удаляется, только если на него больше нет ссылок),
+    # prefix — все ключи с указанным префиксом
+    kind: Mapped[str] = mapped_column(String(16))
+    key: Mapped[str] = mapped_column(String)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+    )
+
+
+class BlobLeaseORM(Base):
+    """
+    Защита файла хранилища от фоновой очистки на время загрузки.
+    Загрузка берёт аренду до проверки, есть ли файл в хранилище, и снимает её после записи
+    в БД; очистка блокирует ту же строку и не удаляет файл под действующей арендой,
+    поэтому запись не может сослаться на файл, который удаляется параллельно.
+    """
+
+    __tablename__ = "blob_leases"
+
+    blob_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # Число загрузок этого файла в процессе
+    leases: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    # Аренда, не снятая к этому времени (процесс упал посреди загрузки), не мешает очистке
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
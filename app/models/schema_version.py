@@ -0,0 +1,22 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import Integer, String, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base_model import Base
+
+
+class SchemaVersionORM(Base):
+    """
+    Версия схемы БД, с которой было выполнено последнее приведение схемы к моделям.
+    При старте сверяется одной выборкой: если версия совпадает, DDL не выполняется.
+    """
+
+    __tablename__ = "schema_version"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # отпечаток таблиц, столбцов и индексов моделей, см. schema_fingerprint
+    version: Mapped[str] = mapped_column(String(64))
+    applied_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
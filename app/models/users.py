@@ -1,6 +1,24 @@
 import uuid
+from datetime import datetime, timezone
 
-from sqlalchemy import String, ForeignKey, UUID, Boolean
+from sqlalchemy import (
+    DDL,
+    String,
+    ForeignKey,
+    UUID,
+    Boolean,
+    DateTime,
+    Float,
+    Integer,
+    BigInteger,
+    Index,
+    and_,
+    event,
+    func,
+    select,
+    update,
+)
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
 from app.models.base_model import Base
@@ -18,9 +36,17 @@ class UserORM(Base):
     username: Mapped[str] = mapped_column(String, index=True, nullable=True)
     email: Mapped[str] = mapped_column(String, unique=True, index=True, nullable=True)
     superuser: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Сумма размеров файлов пользователя; меняется в транзакциях создания и удаления записей
+    used_bytes: Mapped[int] = mapped_column(
+        BigInteger, default=0, server_default="0", nullable=False
+    )
+    # Версия данных пользователя и списка его файлов для ETag; растёт при каждом изменении
+    version: Mapped[int] = mapped_column(
+        BigInteger, default=0, server_default="0", nullable=False
+    )
 
     audio_files: Mapped[list["AudioFileORM"]] = relationship(
-        "AudioFileORM", back_populates="owner"
+        "AudioFileORM", back_populates="owner", passive_deletes=True
     )
 
 
@@ -32,8 +58,131 @@ class AudioFileORM(Base):
     )
     filename: Mapped[str] = mapped_column(String, index=True)
     file_path: Mapped[str] = mapped_column(String)
+    extension: Mapped[str] = mapped_column(String, nullable=True)
+    # SHA-256 содержимого: одинаковые файлы хранятся один раз,
+    # число ссылок на файл — число записей с этим хэшем
+    blob_hash: Mapped[str] = mapped_column(String(64), index=True, nullable=True)
+    # Параметры из заголовков файла, разобранных при загрузке (None, если формат не распознан)
+    codec: Mapped[str] = mapped_column(String(32), nullable=True)
+    duration: Mapped[float] = mapped_column(Float, nullable=True)
+    sample_rate: Mapped[int] = mapped_column(Integer, nullable=True)
+    channels: Mapped[int] = mapped_column(Integer, nullable=True)
+    bitrate: Mapped[int] = mapped_column(Integer, nullable=True)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=True)
+    # Каскад есть только в БД, созданных с ним: sync_schema не меняет существующие внешние ключи,
+    # поэтому UserDB.delete_user удаляет записи пользователя явно
     user_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("users.id"), nullable=False
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
     )
 
     owner: Mapped["UserORM"] = relationship("UserORM", back_populates="audio_files")
+
+    __table_args__ = (
+        # Имя файла уникально в пределах пользователя; по этому индексу разрешаются
+        # конфликты имён (INSERT ... ON CONFLICT) и ищутся файлы пользователя по имени
+        Index("ix_audio_files_user_id_filename", "user_id", "filename", unique=True),
+        # Список файлов пользователя по дате: пагинация по ключу (created_at, id) идёт по индексу
+        Index("ix_audio_files_user_id_created_at", "user_id", "created_at", "id"),
+    )
+
+
+# Индексы поиска по имени файла без учёта регистра (см. AudioFileDB.search_audios).
+# Префиксный поиск — диапазон по (user_id, имя в нижнем регистре) с побайтовым сравнением,
+# поиск подстроки в PostgreSQL — по триграммному индексу pg_trgm, в SQLite — просмотром
+# записей пользователя по тому же индексу
+Index(
+    "ix_audio_files_user_id_filename_lower",
+    AudioFileORM.user_id,
+    func.lower(AudioFileORM.filename).collate("C"),
+).ddl_if(dialect="postgresql")
+Index(
+    "ix_audio_files_filename_trgm",
+    func.lower(AudioFileORM.filename).label("filename_lower"),
+    postgresql_using="gin",
+    postgresql_ops={"filename_lower": "gin_trgm_ops"},
+).ddl_if(dialect="postgresql")
+Index(
+    "ix_audio_files_user_id_filename_nocase",
+    AudioFileORM.user_id,
+    AudioFileORM.filename.collate("NOCASE"),
+).ddl_if(dialect="sqlite")
+
+# При добавлении столбца в существующую БД счётчик заполняется по уже загруженным файлам
+UserORM.__table__.c.used_bytes.info["backfill"] = update(UserORM).values(
+    used_bytes=select(func.coalesce(func.sum(AudioFileORM.size), 0))
+    .where(AudioFileORM.user_id == UserORM.id)
+    .scalar_subquery()
+)
+
+
+def rename_duplicate_filenames(connection: Connection) -> int:
+    """
+    Переименование повторяющихся имён файлов пользователя перед созданием уникального индекса
+    (user_id, filename) в существующей БД: самая ранняя запись сохраняет имя, остальные получают
+    первое свободное имя вида filename_N, как при загрузке с on_conflict=rename.
+    Версия затронутых пользователей увеличивается. Возвращает число переименованных записей.
+    """
+    duplicates = (
+        select(AudioFileORM.user_id, AudioFileORM.filename)
+        .group_by(AudioFileORM.user_id, AudioFileORM.filename)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    rows = connection.execute(
+        select(AudioFileORM.id, AudioFileORM.user_id, AudioFileORM.filename)
+        .join(
+            duplicates,
+            and_(
+                AudioFileORM.user_id == duplicates.c.user_id,
+                AudioFileORM.filename == duplicates.c.filename,
+            ),
+        )
+        .order_by(
+            AudioFileORM.user_id, AudioFileORM.filename, AudioFileORM.created_at, AudioFileORM.id
+        )
+    ).all()
+    # имена файлов пользователей с повторами: новое имя не должно совпасть ни с одним из них
+    taken: dict[uuid.UUID, set[str]] = {}
+    previous = None
+    renamed = 0
+    for row in rows:
+        if (row.user_id, row.filename) != previous:
+            previous = (row.user_id, row.filename)
+            continue
+        if row.user_id not in taken:
+            taken[row.user_id] = set(
+                connection.scalars(
+                    select(AudioFileORM.filename).where(AudioFileORM.user_id == row.user_id)
+                )
+            )
+        number = 1
+        while f"{row.filename}_{number}" in taken[row.user_id]:
+            number += 1
+        filename = f"{row.filename}_{number}"
+        taken[row.user_id].add(filename)
+        connection.execute(
+            update(AudioFileORM).where(AudioFileORM.id == row.id).values(filename=filename)
+        )
+        renamed += 1
+    if taken:
+        connection.execute(
+            update(UserORM).where(UserORM.id.in_(taken)).values(version=UserORM.version + 1)
+        )
+    return renamed
+
+
+# Уникальный индекс имён создаётся в существующей БД только после исправления повторов
+for index in AudioFileORM.__table__.indexes:
+    if index.name == "ix_audio_files_user_id_filename":
+        index.info["before_create"] = rename_duplicate_filenames
+
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
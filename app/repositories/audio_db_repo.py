@@ -1,38 +1,450 @@
+import base64
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import Literal
+
 from fastapi import HTTPException
-from sqlalchemy import select
+from sqlalchemy import select, delete, literal, and_, not_, exists, func, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.audio.metadata import AudioMetadata
+from app.database.database_helper import INSERT_DIALECTS
 from app.models.users import UserORM, AudioFileORM
-from app.schemas.schemas import SchAudioFileResponse
+from app.schemas.schemas import (
+    ConflictMode,
+    SchAudioFileResponse,
+    SchAudioFileDeleteResponse,
+    SchAudioFilesPage,
+    SchBatchUploadItem,
+    SchGetAudioFile,
+)
+from app.repositories.purge_repo import PurgeRepo, purge_worker, BLOB
+from app.repositories.upload_audio_repo import QUOTA_EXCEEDED
+from app.repositories.users_db_repo import UserDB
 from app.config.logger import get_logger
 
 logger = get_logger()
 
+# Столбцы, которые заменяются при перезаписи файла с тем же именем
+OVERWRITE_COLUMNS = [
+    column.name
+    for column in AudioFileORM.__table__.columns
+    if column.name not in ("id", "user_id", "filename")
+]
+# Сколько имён name_N проверяется одним запросом при переименовании
+RENAME_PROBE = 16
+# Сколько раз повторяется вставка под новым именем, если его успел занять параллельный запрос
+RENAME_ATTEMPTS = 5
+FILE_EXISTS = "File with this name already exists"
+# Верхняя граница диапазона имён с заданным префиксом: больше любого ASCII-символа
+SEARCH_UPPER_BOUND = "\uffff"
+
+
 class AudioFileDB:
 
+    @classmethod
+    def get_insert(cls, session: AsyncSession, on_conflict: ConflictMode):
+        """
+        INSERT в audio_files с разрешением конфликта по индексу (user_id, filename):
+        при перезаписи существующая строка обновляется, иначе новая строка не вставляется
+        """
+        query = INSERT_DIALECTS[session.get_bind().dialect.name](AudioFileORM)
+        target = [AudioFileORM.user_id, AudioFileORM.filename]
+        if on_conflict == ConflictMode.OVERWRITE:
+            return query.on_conflict_do_update(
+                index_elements=target,
+                set_={name: query.excluded[name] for name in OVERWRITE_COLUMNS},
+            )
+        return query.on_conflict_do_nothing(index_elements=target)
+
+    @classmethod
+    async def get_free_name(
+        cls, user_id: uuid.UUID, filename: str, taken: set[str], session: AsyncSession
+    ) -> str:
+        """
+        Первое свободное имя вида filename_N. Кандидаты проверяются пачками по RENAME_PROBE
+        точечными запросами по индексу (user_id, filename); taken — имена, уже занятые в запросе.
+        """
+        start = 1
+        while True:
+            candidates = [f"{filename}_{number}" for number in range(start, start + RENAME_PROBE)]
+            query = select(AudioFileORM.filename).where(
+                AudioFileORM.user_id == user_id, AudioFileORM.filename.in_(candidates)
+            )
+            existing = set((await session.scalars(query)).all()) | taken
+            for candidate in candidates:
+                if candidate not in existing:
+                    return candidate
+            start += RENAME_PROBE
+
+    @classmethod
+    async def insert_audio(
+        cls, yandex_id: str, values: dict, on_conflict: ConflictMode, session: AsyncSession
+    ) -> uuid.UUID | None:
+        """INSERT ... SELECT записи для пользователя; None, если строка не вставлена и не обновлена"""
+        columns = AudioFileORM.__table__.c
+        query = (
+            cls.get_insert(session, on_conflict)
+            .from_select(
+                [*values, "user_id"],
+                select(
+                    *(literal(value, columns[name].type) for name, value in values.items()),
+                    UserORM.id,
+                ).where(UserORM.yandex_id == yandex_id),
+            )
+            .returning(AudioFileORM.id)
+        )
+        return (await session.execute(query)).scalar_one_or_none()
+
     @classmethod
     async def create_audio(
-        cls, yandex_id: str, filename: str, file_path: str, session: AsyncSession
+        cls,
+        yandex_id: str,
+        filename: str,
+        file_path: str,
+        session: AsyncSession,
+        extension: str | None = None,
+        blob_hash: str | None = None,
+        metadata: AudioMetadata | None = None,
+        on_conflict: ConflictMode = ConflictMode.ERROR,
     ) -> SchAudioFileResponse:
-        """Метод для записи данных об аудиофайле в БД"""
-        logger.info(f"Попытка создания аудиофайла: {filename} для пользователя с yandex_id: {yandex_id}")
-        query = select(UserORM).where(UserORM.yandex_id == yandex_id)
-        user = await session.execute(query)
-        user = user.scalar_one_or_none()
-
-        if user is None:
-            logger.error(f"Пользователь с yandex_id {yandex_id} не найден при создании аудиофайла {filename}")
-            raise HTTPException(status_code=404, detail="User not found")
-
-        new_audio = AudioFileORM(
-            user_id=user.id, filename=filename, file_path=file_path
-        )
-        session.add(new_audio)
+        """
+        Метод для записи данных об аудиофайле в БД.
+        Пользователь находится внутри того же INSERT ... SELECT, поэтому отдельного поиска
+        пользователя нет; если пользователя нет, запрос не вставляет строк.
+        Имя файла уникально в пределах пользователя, совпадение имени разрешается
+        в том же INSERT ... ON CONFLICT согласно on_conflict: ошибка 409, перезапись записи,
+        пропуск или сохранение под свободным именем filename_N.
+        Версия и счётчик занятого места пользователя меняются в той же транзакции; если запись
+        не укладывается в USER_STORAGE_QUOTA, возвращается 413. При перезаписи размер старого
+        файла читается под блокировкой строки пользователя (UserDB.lock_user).
+        """
+        logger.info("Попытка создания аудиофайла: {} для пользователя с yandex_id: {}", filename, yandex_id)
+        values = {
+            "id": uuid.uuid4(),
+            "filename": filename,
+            "file_path": file_path,
+            "extension": extension,
+            "blob_hash": blob_hash,
+            "created_at": datetime.now(timezone.utc),
+        }
+        if metadata is not None:
+            values.update(metadata.as_dict())
         try:
+            old_hash, old_size = None, 0
+            if on_conflict == ConflictMode.OVERWRITE:
+                await UserDB.lock_user(UserORM.yandex_id == yandex_id, session)
+                old = (
+                    await session.execute(
+                        select(AudioFileORM.blob_hash, AudioFileORM.size)
+                        .join(UserORM, AudioFileORM.user_id == UserORM.id)
+                        .where(UserORM.yandex_id == yandex_id, AudioFileORM.filename == filename)
+                    )
+                ).one_or_none()
+                if old is not None:
+                    old_hash, old_size = old.blob_hash, old.size or 0
+            audio_id = await cls.insert_audio(yandex_id, values, on_conflict, session)
+            if audio_id is None:
+                query = (
+                    select(UserORM.id, AudioFileORM.id)
+                    .select_from(UserORM)
+                    .outerjoin(
+                        AudioFileORM,
+                        and_(AudioFileORM.user_id == UserORM.id, AudioFileORM.filename == filename),
+                    )
+                    .where(UserORM.yandex_id == yandex_id)
+                )
+                row = (await session.execute(query)).one_or_none()
+                if row is None:
+                    await session.rollback()
+                    logger.error("Пользователь с yandex_id {} не найден при создании аудиофайла {}", yandex_id, filename)
+                    raise HTTPException(status_code=404, detail="User not found")
+                user_id, existing_id = row
+                if on_conflict == ConflictMode.SKIP:
+                    await session.rollback()
+                    logger.info("Аудиофайл {} уже есть у пользователя с yandex_id {}, загрузка пропущена", filename, yandex_id)
+                    return SchAudioFileResponse(
+                        message="Audio file already exists, upload skipped",
+                        id=existing_id,
+                        filename=filename,
+                    )
+                if on_conflict == ConflictMode.RENAME:
+                    for _ in range(RENAME_ATTEMPTS):
+                        values["filename"] = await cls.get_free_name(user_id, filename, set(), session)
+                        audio_id = await cls.insert_audio(yandex_id, values, on_conflict, session)
+                        if audio_id is not None:
+                            break
+                if audio_id is None:
+                    await session.rollback()
+                    logger.error("Аудиофайл {} уже есть у пользователя с yandex_id {}", filename, yandex_id)
+                    raise HTTPException(status_code=409, detail=FILE_EXISTS)
+            delta = (values.get("size") or 0) - old_size
+            if not await UserDB.bump_version(UserORM.yandex_id == yandex_id, session, delta):
+                await session.rollback()
+                logger.error("Аудиофайл {} не укладывается в квоту пользователя с yandex_id {}", filename, yandex_id)
+                raise HTTPException(status_code=413, detail=QUOTA_EXCEEDED)
+            # Перезаписанная запись больше не ссылается на старый файл
+            if old_hash is not None and old_hash != blob_hash:
+                PurgeRepo.add_tombstone(BLOB, old_hash, session)
             await session.commit()
-            logger.info(f"Аудиофайл {filename} успешно создан для пользователя с yandex_id {yandex_id}")
-            return SchAudioFileResponse(message="Audio file created successfully")
+            if old_hash is not None:
+                purge_worker.wake()
+            logger.info("Аудиофайл {} успешно создан для пользователя с yandex_id {}", values["filename"], yandex_id)
+            return SchAudioFileResponse(
+                message="Audio file created successfully", id=audio_id, filename=values["filename"]
+            )
+        except HTTPException:
+            raise
         except Exception as e:
             await session.rollback()
-            logger.error(f"Ошибка при создании аудиофайла {filename} для пользователя с yandex_id {yandex_id}: {str(e)}")
+            logger.error("Ошибка при создании аудиофайла {} для пользователя с yandex_id {}: {}", filename, yandex_id, e)
             raise HTTPException(status_code=500, detail=f"Failed to create audio file: {str(e)}")
+
+    @classmethod
+    async def create_audios(
+        cls,
+        user_id: uuid.UUID,
+        audios: list[dict],
+        session: AsyncSession,
+        on_conflict: ConflictMode = ConflictMode.ERROR,
+    ) -> list[SchBatchUploadItem]:
+        """
+        Метод для записи нескольких аудиофайлов одного пользователя одним INSERT и одним коммитом.
+        Каждый элемент audios содержит filename, file_path, extension, blob_hash и поля метаданных.
+        Занятые имена выбираются одним запросом по индексу (user_id, filename) и разрешаются
+        согласно on_conflict, повтор имени внутри пакета считается таким же конфликтом.
+        Версия и счётчик занятого места меняются в той же транзакции; если пакет не укладывается
+        в USER_STORAGE_QUOTA, записи не создаются и возвращается 413. Транзакция начинается
+        с блокировки строки пользователя (UserDB.lock_user): user_id берётся из кэша процесса,
+        и пользователь, удалённый другим воркером, получает 404, а не записи без владельца;
+        при перезаписи под этой блокировкой читаются размеры заменяемых файлов.
+        Результат — по элементу на каждый файл в порядке audios.
+        """
+        if not audios:
+            return []
+        logger.info("Создание {} аудиофайлов для пользователя с id: {}", len(audios), user_id)
+        created_at = datetime.now(timezone.utc)
+        try:
+            if await UserDB.lock_user(UserORM.id == user_id, session) is None:
+                await session.rollback()
+                logger.error("Пользователь с id {} не найден при создании аудиофайлов", user_id)
+                raise HTTPException(status_code=404, detail="User not found")
+            query = select(
+                AudioFileORM.id, AudioFileORM.filename, AudioFileORM.blob_hash, AudioFileORM.size
+            ).where(
+                AudioFileORM.user_id == user_id,
+                AudioFileORM.filename.in_({audio["filename"] for audio in audios}),
+            )
+            existing = {row.filename: row for row in (await session.execute(query)).all()}
+            # имя -> строка для вставки; для перезаписи более поздний файл пакета заменяет ранний
+            rows: dict[str, dict] = {}
+            items = []
+            old_hashes = set()
+            for audio in audios:
+                filename = audio["filename"]
+                taken = filename in existing or filename in rows
+                if taken and on_conflict == ConflictMode.RENAME:
+                    filename = await cls.get_free_name(user_id, filename, set(rows), session)
+                elif taken and on_conflict != ConflictMode.OVERWRITE:
+                    taken_id = rows[filename]["id"] if filename in rows else existing[filename].id
+                    detail = FILE_EXISTS if on_conflict == ConflictMode.ERROR else f"{FILE_EXISTS}, skipped"
+                    items.append(
+                        SchBatchUploadItem(
+                            filename=filename,
+                            success=False,
+                            id=taken_id if on_conflict == ConflictMode.SKIP else None,
+                            detail=detail,
+                        )
+                    )
+                    continue
+                if filename in rows:
+                    audio_id = rows[filename]["id"]
+                elif filename in existing:
+                    audio_id = existing[filename].id
+                    if existing[filename].blob_hash is not None:
+                        old_hashes.add(existing[filename].blob_hash)
+                else:
+                    audio_id = uuid.uuid4()
+                rows[filename] = {
+                    **audio,
+                    "id": audio_id,
+                    "user_id": user_id,
+                    "filename": filename,
+                    "created_at": created_at,
+                }
+                items.append(SchBatchUploadItem(filename=filename, success=True, id=audio_id))
+
+            if rows:
+                query = cls.get_insert(session, on_conflict).returning(
+                    AudioFileORM.id, AudioFileORM.filename
+                )
+                result = await session.execute(query, list(rows.values()))
+                stored = {row.filename: row.id for row in result.all()}
+                # имя мог занять параллельный запрос: такая строка не вставлена
+                for item in items:
+                    if item.success and item.filename not in stored:
+                        item.success, item.id, item.detail = False, None, FILE_EXISTS
+                    elif item.success:
+                        item.id = stored[item.filename]
+                delta = sum(rows[name].get("size") or 0 for name in stored) - sum(
+                    existing[name].size or 0 for name in stored if name in existing
+                )
+                if not await UserDB.bump_version(UserORM.id == user_id, session, delta):
+                    await session.rollback()
+                    logger.error("Пакет не укладывается в квоту пользователя с id {}", user_id)
+                    raise HTTPException(status_code=413, detail=QUOTA_EXCEEDED)
+                for blob_hash in old_hashes - {row.get("blob_hash") for row in rows.values()}:
+                    PurgeRepo.add_tombstone(BLOB, blob_hash, session)
+            await session.commit()
+        except HTTPException:
+            raise
+        except Exception as e:
+            await session.rollback()
+            logger.error("Ошибка при создании аудиофайлов для пользователя с id {}: {}", user_id, e)
+            raise HTTPException(status_code=500, detail="Failed to create audio files")
+        if old_hashes:
+            purge_worker.wake()
+        return items
+
+    @classmethod
+    def get_search_keys(cls, session: AsyncSession):
+        """
+        Выражения имени файла без учёта регистра, совпадающие с индексами поиска:
+        ключ для префиксного диапазона и сортировки, ключ для поиска подстроки (LIKE)
+        """
+        if session.get_bind().dialect.name == "postgresql":
+            lower = func.lower(AudioFileORM.filename)
+            return lower.collate("C"), lower
+        # в SQLite LIKE не учитывает регистр ASCII-символов
+        return AudioFileORM.filename.collate("NOCASE"), AudioFileORM.filename
+
+    @classmethod
+    async def search_audios(
+        cls,
+        user_id: uuid.UUID,
+        query: str,
+        session: AsyncSession,
+        mode: Literal["prefix", "contains"] = "contains",
+        limit: int = 20,
+        cursor: str | None = None,
+    ) -> SchAudioFilesPage:
+        """
+        Поиск файлов пользователя по имени без учёта регистра.
+        Сначала идут имена, начинающиеся с query (точное совпадение — первым), затем при
+        mode="contains" имена, содержащие query в середине; внутри групп — по алфавиту.
+        Каждая группа выбирается отдельным запросом по индексу в порядке выдачи, поэтому
+        запрос читает не больше limit + 1 строк; пагинация по ключу (группа, имя).
+        """
+        logger.info("Поиск аудиофайлов пользователя с id {} по запросу '{}'", user_id, query)
+        term = query.lower()
+        range_key, like_key = cls.get_search_keys(session)
+        prefix = and_(range_key >= term, range_key < term + SEARCH_UPPER_BOUND)
+        groups = [(1, prefix)]
+        if mode == "contains":
+            pattern = "%" + term.replace("/", "//").replace("%", "/%").replace("_", "/_") + "%"
+            groups.append((2, and_(like_key.like(pattern, escape="/"), not_(prefix))))
+        start_group, last_filename = 1, None
+        if cursor is not None:
+            start_group, last_filename = cls._decode_search_cursor(cursor)
+
+        found = []
+        for group, condition in groups:
+            if group < start_group:
+                continue
+            statement = (
+                select(*(getattr(AudioFileORM, name) for name in SchGetAudioFile.model_fields))
+                .where(AudioFileORM.user_id == user_id, condition)
+                .order_by(range_key, AudioFileORM.filename)
+                .limit(limit + 1 - len(found))
+            )
+            if group == start_group and last_filename is not None:
+                statement = statement.where(
+                    tuple_(range_key, AudioFileORM.filename) > tuple_(last_filename.lower(), last_filename)
+                )
+            found += [(group, row) for row in (await session.execute(statement)).all()]
+            if len(found) > limit:
+                break
+
+        next_cursor = None
+        if len(found) > limit:
+            found = found[:limit]
+            group, row = found[-1]
+            next_cursor = cls._encode_search_cursor(group, row.filename)
+        items = [SchGetAudioFile.model_construct(**row._mapping) for _, row in found]
+        return SchAudioFilesPage(items=items, next_cursor=next_cursor)
+
+    @staticmethod
+    def _encode_search_cursor(group: int, filename: str) -> str:
+        raw = json.dumps([group, filename]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def _decode_search_cursor(cursor: str) -> tuple[int, str]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            group, filename = json.loads(raw)
+            return int(group), str(filename)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    @classmethod
+    async def is_name_taken(cls, user_id: uuid.UUID, filename: str, session: AsyncSession) -> bool:
+        """Есть ли у пользователя файл с таким именем (точечный запрос по индексу (user_id, filename))"""
+        query = select(
+            exists().where(AudioFileORM.user_id == user_id, AudioFileORM.filename == filename)
+        )
+        return bool(await session.scalar(query))
+
+    @classmethod
+    async def get_audio_with_owner(
+        cls, audio_id: uuid.UUID, session: AsyncSession
+    ) -> tuple[AudioFileORM, str] | None:
+        """Метод для получения аудиофайла и yandex_id его владельца одним запросом"""
+        logger.info("Получение аудиофайла с id: {}", audio_id)
+        query = (
+            select(AudioFileORM, UserORM.yandex_id)
+            .join(UserORM, AudioFileORM.user_id == UserORM.id)
+            .where(AudioFileORM.id == audio_id)
+        )
+        result = await session.execute(query)
+        row = result.one_or_none()
+        if row is None:
+            return None
+        return row[0], row[1]
+
+    @classmethod
+    async def get_owned_audio(
+        cls, audio_id: uuid.UUID, yandex_id: str, session: AsyncSession
+    ) -> AudioFileORM:
+        """Метод для получения аудиофайла с проверкой, что он принадлежит пользователю"""
+        audio_with_owner = await cls.get_audio_with_owner(audio_id, session)
+        if audio_with_owner is None:
+            logger.error("Аудиофайл с id {} не найден", audio_id)
+            raise HTTPException(status_code=404, detail="Audio file not found")
+
+        audio, owner_yandex_id = audio_with_owner
+        if owner_yandex_id != yandex_id:
+            logger.error(
+                "Пользователь с yandex_id {} не является владельцем аудиофайла {}", yandex_id, audio_id
+            )
+            raise HTTPException(status_code=403, detail="Access denied")
+        return audio
+
+    @classmethod
+    async def delete_audio(
+        cls, audio: AudioFileORM, session: AsyncSession
+    ) -> SchAudioFileDeleteResponse:
+        """
+        Метод для удаления записи об аудиофайле.
+        Файл удаляется фоновой очисткой, если на него больше нет ссылок
+        """
+        logger.info("Удаление аудиофайла с id: {}", audio.id)
+        await session.execute(delete(AudioFileORM).where(AudioFileORM.id == audio.id))
+        await UserDB.bump_version(UserORM.id == audio.user_id, session, -(audio.size or 0))
+        if audio.blob_hash is not None:
+            PurgeRepo.add_tombstone(BLOB, audio.blob_hash, session)
+        await session.commit()
+        purge_worker.wake()
+        logger.info("Аудиофайл с id {} успешно удален", audio.id)
+        return SchAudioFileDeleteResponse(message="Audio file deleted successfully")
@@ -1,76 +1,95 @@
+import asyncio
+import hashlib
+import time
 from datetime import datetime, timedelta
+from urllib.parse import urlsplit
 
-import aiohttp
 import jwt
 from fastapi import HTTPException
 from fastapi.security import OAuth2PasswordBearer
 
+from app.cache.ttl_cache import TTLCache
+from app.clients.http_client import http_client
+from app.metrics.metrics import yandex_request_duration_seconds
 from app.config.logger import get_logger
 from app.config.app_config import settings
 
 logger = get_logger()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Кэш проверенных access-токенов: ключ — SHA-256 токена, запись живёт до exp токена
+token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_SIZE)
+
 
 class AuthRepo:
 
     @classmethod
     async def get_yandex_token(cls, code):
-        logger.info(f"Получение токена Яндекса для кода: {code}")
-        url = "https://oauth.yandex.ru/token"
+        logger.info("Получение токена Яндекса для кода: {}", code)
         data = {
             "grant_type": "authorization_code",
             "code": code,
             "client_id": settings.YANDEX_CLIENT_ID,
             "client_secret": settings.YANDEX_CLIENT_SECRET,
         }
-
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(url, data=data) as response:
-                    response.raise_for_status()
-                    json_data = await response.json()
-                    if not json_data:
-                        logger.error("Пустой ответ от Яндекса при получении токена")
-                        raise HTTPException(
-                            status_code=404, detail="Пустой ответ от Яндекса"
-                        )
-                    logger.info(f"Успешное получение токена Яндекса для кода: {code}")
-                    return json_data
-            except aiohttp.ClientResponseError as e:
-                logger.error(f"Ошибка Яндекса: {e.message} для кода: {code}")
-                raise HTTPException(
-                    status_code=e.status, detail=f"Ошибка Яндекса: {e.message}"
-                )
+        json_data = await cls.request_yandex(
+            "POST", f"{settings.YANDEX_OAUTH_URL}/token", data=data
+        )
+        if not json_data:
+            logger.error("Пустой ответ от Яндекса при получении токена")
+            raise HTTPException(status_code=404, detail="Пустой ответ от Яндекса")
+        logger.info("Успешное получение токена Яндекса для кода: {}", code)
+        return json_data
 
     @classmethod
     async def get_user_info(cls, access_token):
-        logger.info(f"Получение информации о пользователе с токеном")
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(
-                    "https://login.yandex.ru/info",
-                    headers={"Authorization": f"OAuth {access_token}"},
-                ) as response:
-                    response.raise_for_status()
-                    json_data = await response.json()
-                    if not json_data:
-                        logger.error("Пустой ответ от Яндекса при получении информации о пользователе")
-                        raise HTTPException(
-                            status_code=404, detail="Пустой ответ от Яндекса"
-                        )
-                    logger.info(f"Успешное получение информации о пользователе с токеном")
-                    return json_data
-            except aiohttp.ClientResponseError as e:
-                logger.error(f"Ошибка Яндекса: {e.message} при получении информации о пользователе с токеном")
-                raise HTTPException(
-                    status_code=e.status, detail=f"Ошибка Яндекса: {e.message}"
-                )
+        logger.info("Получение информации о пользователе с токеном")
+        json_data = await cls.request_yandex(
+            "GET",
+            f"{settings.YANDEX_LOGIN_URL}/info",
+            headers={"Authorization": f"OAuth {access_token}"},
+        )
+        if not json_data:
+            logger.error("Пустой ответ от Яндекса при получении информации о пользователе")
+            raise HTTPException(status_code=404, detail="Пустой ответ от Яндекса")
+        logger.info("Успешное получение информации о пользователе с токеном")
+        return json_data
+
+    @classmethod
+    async def request_yandex(cls, method: str, url: str, **kwargs):
+        """Запрос к Яндексу через общий HTTP-клиент с переводом ошибок в HTTPException"""
+        # aiohttp нужен только здесь, поэтому не импортируется при старте приложения
+        import aiohttp
+
+        endpoint = urlsplit(url).path
+        status = "error"
+        started = time.perf_counter()
+        try:
+            json_data = await http_client.request_json(method, url, **kwargs)
+            status = "ok"
+            return json_data
+        except aiohttp.ClientResponseError as e:
+            status = str(e.status)
+            logger.error("Ошибка Яндекса: {} при запросе {}", e.message, url)
+            raise HTTPException(
+                status_code=e.status, detail=f"Ошибка Яндекса: {e.message}"
+            )
+        except asyncio.TimeoutError:
+            status = "timeout"
+            logger.error("Яндекс не ответил вовремя на запрос {}", url)
+            raise HTTPException(status_code=504, detail="Яндекс не ответил вовремя")
+        except aiohttp.ClientError as e:
+            logger.error("Ошибка соединения с Яндексом: {} при запросе {}", e, url)
+            raise HTTPException(status_code=502, detail="Ошибка соединения с Яндексом")
+        finally:
+            yandex_request_duration_seconds.labels(endpoint, status).observe(
+                time.perf_counter() - started
+            )
 
     @classmethod
     def create_jwt_tokens(cls, user_data: dict) -> tuple[str, str]:
         """Создаёт access_token и refresh_token"""
-        logger.info(f"Создание JWT токенов для пользователя: {user_data.get('username')}")
+        logger.info("Создание JWT токенов для пользователя: {}", user_data.get("username"))
         access_expiration = datetime.utcnow() + timedelta(
             hours=settings.TOKEN_EXPIRE_HOURS
         )
@@ -95,24 +114,35 @@ class AuthRepo:
         refresh_token = jwt.encode(
             refresh_payload, settings.SECRET_KEY, algorithm="HS256"
         )
-        logger.info(f"Успешное создание JWT токенов для пользователя: {user_data.get('username')}")
+        logger.info("Успешное создание JWT токенов для пользователя: {}", user_data.get("username"))
         return access_token, refresh_token
 
     @classmethod
     def check_current_user(cls, access_token: str) -> dict:
+        """
+        Проверка access-токена.
+        Повторные проверки того же токена берутся из token_cache без повторной проверки подписи.
+        """
+        token_digest = hashlib.sha256(access_token.encode()).digest()
+        payload = token_cache.get(token_digest)
+        if payload is not None:
+            return payload
+
         try:
             payload = jwt.decode(
                 access_token, settings.SECRET_KEY, algorithms=["HS256"]
             )
 
             if payload.get("type") != "access":
-                logger.error(f"Неверный тип токена: {payload.get('type')} для токена: {access_token}")
+                logger.error("Неверный тип токена: {}", payload.get("type"))
                 raise HTTPException(status_code=401, detail="Invalid token")
-            logger.info(f"Успешная проверка текущего пользователя для токена")
+            logger.debug("Успешная проверка текущего пользователя для токена")
+            if isinstance(payload.get("exp"), (int, float)):
+                token_cache.set(token_digest, payload, expires_at=payload["exp"])
             return payload
         except jwt.ExpiredSignatureError:
-            logger.error(f"Токен просрочен: {access_token}")
+            logger.error("Токен просрочен")
             raise HTTPException(status_code=401, detail="Token has expired")
         except jwt.InvalidTokenError:
-            logger.error(f"Неверный токен: {access_token}")
+            logger.error("Неверный токен")
             raise HTTPException(status_code=401, detail="Invalid token")
@@ -0,0 +1,176 @@
+import asyncio
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+
+from fastapi import HTTPException, Request
+from starlette.responses import FileResponse, Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.config.app_config import ALLOWED_AUDIO, AUDIO_MEDIA_TYPES, AUDIO_STORAGE_PATH, settings
+from app.models.users import AudioFileORM
+from app.repositories.upload_audio_repo import UARepo
+from app.storage.base_storage import StorageStat
+from app.storage.storage_helper import storage
+
+
+class AudioFileResponse(FileResponse):
+    """
+    FileResponse с ответом 304 на условные запросы (If-None-Match / If-Modified-Since).
+    Файл и его диапазоны отдаются блоками по chunk_size средствами Starlette.
+    """
+
+    chunk_size = 256 * 1024
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.stat_result is not None and self._is_not_modified(scope):
+            headers = {
+                "etag": self.headers["etag"],
+                "last-modified": self.headers["last-modified"],
+                "accept-ranges": "bytes",
+            }
+            await Response(status_code=304, headers=headers)(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+    def _is_not_modified(self, scope: Scope) -> bool:
+        request_headers = dict(scope["headers"])
+        if_none_match = request_headers.get(b"if-none-match")
+        if if_none_match is not None:
+            etags = {tag.strip() for tag in if_none_match.decode("latin-1").split(",")}
+            return "*" in etags or self.headers["etag"] in etags
+        if_modified_since = request_headers.get(b"if-modified-since")
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since.decode("latin-1"))
+            except (TypeError, ValueError):
+                return False
+            return int(self.stat_result.st_mtime) <= since.timestamp()
+        return False
+
+
+class DARepo:
+
+    @classmethod
+    async def get_storage_key(cls, audio: AudioFileORM) -> str | None:
+        """
+        Ключ файла в хранилище.
+        Старые записи хранят в file_path путь внутри AUDIO_STORAGE_PATH, а самые ранние —
+        только директорию пользователя; для них файл ищется по имени среди допустимых расширений.
+        """
+        if audio.blob_hash is not None:
+            return UARepo.get_blob_key(audio.blob_hash)
+        key = audio.file_path.removeprefix(f"{AUDIO_STORAGE_PATH}/")
+        if not key.endswith("/"):
+            return key
+        for extension in ALLOWED_AUDIO:
+            if await storage.stat(f"{key}{audio.filename}.{extension}") is not None:
+                return f"{key}{audio.filename}.{extension}"
+        return None
+
+    @classmethod
+    async def get_file_response(
+        cls, audio: AudioFileORM, request: Request
+    ) -> Response:
+        """Формирование ответа с файлом, поддерживающего Range, ETag и Last-Modified"""
+        key = await cls.get_storage_key(audio)
+        stat = await storage.stat(key) if key is not None else None
+        if stat is None:
+            raise HTTPException(status_code=404, detail="Audio file not found")
+
+        file_extension = audio.extension or key.rsplit(".", 1)[-1].lower()
+        media_type = AUDIO_MEDIA_TYPES.get(file_extension, "application/octet-stream")
+        filename = f"{audio.filename}.{file_extension}"
+
+        local_path = storage.local_path(key)
+        if local_path is not None and settings.DOWNLOAD_ACCEL_REDIRECT:
+            return cls.get_accel_response(key, media_type, filename)
+        if local_path is not None:
+            return AudioFileResponse(
+                local_path,
+                media_type=media_type,
+                filename=filename,
+                stat_result=await asyncio.to_thread(os.stat, local_path),
+            )
+        return cls.get_stream_response(request, key, stat, media_type, filename)
+
+    @classmethod
+    def get_accel_response(cls, key: str, media_type: str, filename: str) -> Response:
+        """
+        Пустой ответ с заголовком X-Accel-Redirect: файл локального хранилища по внутреннему
+        location DOWNLOAD_ACCEL_REDIRECT отдаёт nginx (sendfile, Range и условные запросы),
+        тело не проходит через процесс приложения
+        """
+        prefix = settings.DOWNLOAD_ACCEL_REDIRECT.rstrip("/")
+        headers = {
+            "x-accel-redirect": f"{prefix}/{quote(key)}",
+            "content-disposition": f'attachment; filename="{filename}"',
+        }
+        return Response(headers=headers, media_type=media_type)
+
+    @classmethod
+    def get_stream_response(
+        cls,
+        request: Request,
+        key: str,
+        stat: StorageStat,
+        media_type: str,
+        filename: str,
+    ) -> Response:
+        """Ответ для удалённого хранилища: диапазон байтов запрашивается у хранилища и передаётся потоком"""
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": stat.etag,
+            "last-modified": formatdate(stat.last_modified, usegmt=True),
+            "content-disposition": f'attachment; filename="{filename}"',
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None and (
+            if_none_match.strip() == "*"
+            or stat.etag in {tag.strip() for tag in if_none_match.split(",")}
+        ):
+            return Response(status_code=304, headers=headers)
+
+        status_code = 200
+        start, end = 0, stat.size
+        http_range = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if http_range is not None and (if_range is None or if_range in (stat.etag, headers["last-modified"])):
+            byte_range = cls.parse_range(http_range, stat.size)
+            if byte_range is None:
+                return Response(status_code=416, headers={"content-range": f"bytes */{stat.size}"})
+            start, end = byte_range
+            status_code = 206
+            headers["content-range"] = f"bytes {start}-{end - 1}/{stat.size}"
+        headers["content-length"] = str(end - start)
+
+        if request.method == "HEAD":
+            return Response(status_code=status_code, headers=headers, media_type=media_type)
+        return StreamingResponse(
+            storage.get_stream(key, start, end),
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+        )
+
+    @staticmethod
+    def parse_range(http_range: str, size: int) -> tuple[int, int] | None:
+        """
+        Разбор заголовка Range с одним диапазоном, возвращает [start, end) или None,
+        если диапазон не удовлетворим. Несколько диапазонов не поддерживаются — отдаётся первый.
+        """
+        units, _, ranges = http_range.partition("=")
+        if units.strip().lower() != "bytes" or not ranges:
+            return None
+        first, _, last = ranges.split(",")[0].strip().partition("-")
+        try:
+            if first:
+                start = int(first)
+                end = min(int(last) + 1, size) if last else size
+            else:
+                start, end = max(size - int(last), 0), size
+        except ValueError:
+            return None
+        if start >= end:
+            return None
+        return start, end
@@ -0,0 +1,144 @@
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.datastructures import Headers
+
+# Наибольший размер текстового поля формы
+FORM_FIELD_MAX_SIZE = 64 * 1024
+# Наибольшее число частей формы в одном запросе
+FORM_MAX_PARTS = 1000
+
+
+@dataclass
+class FormPart:
+    """Часть multipart-формы: имя поля и имя файла (None у текстовых полей)"""
+
+    name: str
+    filename: str | None
+
+
+def decode_header(value: bytes) -> str:
+    try:
+        return value.decode("utf-8")
+    except UnicodeDecodeError:
+        return value.decode("latin-1")
+
+
+class MultipartStream:
+    """
+    Потоковый разбор тела multipart/form-data по мере его получения из request.stream().
+    В отличие от request.form() файлы не копятся во временных файлах Starlette: содержимое
+    файловой части читается через iter_data() блоками прямо из сети, поэтому запрос можно
+    отклонить, не дожидаясь всего тела, а данные пишутся на диск один раз.
+    Части читаются по порядку; next_part() пропускает непрочитанный остаток текущей части.
+    """
+
+    def __init__(self, headers: Headers, stream: AsyncIterator[bytes]):
+        content_type, params = parse_options_header(headers.get("content-type"))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise HTTPException(status_code=400, detail="Expected multipart/form-data body")
+        self._stream = stream.__aiter__()
+        # события парсера: ("part", (имя, имя файла)), ("data", байты), ("end", None), ("done", None)
+        self._events: deque[tuple[str, object]] = deque()
+        self._headers: dict[bytes, bytes] = {}
+        self._header_name = b""
+        self._header_value = b""
+        self._in_part = False
+        self._parts = 0
+        self._parser = MultipartParser(
+            params[b"boundary"],
+            callbacks={
+                "on_part_begin": self._on_part_begin,
+                "on_header_field": self._on_header_field,
+                "on_header_value": self._on_header_value,
+                "on_header_end": self._on_header_end,
+                "on_headers_finished": self._on_headers_finished,
+                "on_part_data": self._on_part_data,
+                "on_part_end": self._on_part_end,
+                "on_end": self._on_end,
+            },
+        )
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition"))
+        if b"name" not in options:
+            raise MultipartParseError('Content-Disposition without "name"')
+        filename = options.get(b"filename")
+        part = FormPart(
+            name=decode_header(options[b"name"]),
+            filename=decode_header(filename) if filename is not None else None,
+        )
+        self._events.append(("part", part))
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if end > start:
+            self._events.append(("data", data[start:end]))
+
+    def _on_part_end(self) -> None:
+        self._events.append(("end", None))
+
+    def _on_end(self) -> None:
+        self._events.append(("done", None))
+
+    async def _next_event(self) -> tuple[str, object]:
+        """Следующее событие разбора; очередной блок тела читается, только когда события кончились"""
+        while not self._events:
+            try:
+                chunk = await self._stream.__anext__()
+            except StopAsyncIteration:
+                raise HTTPException(status_code=400, detail="Incomplete multipart body")
+            try:
+                self._parser.write(chunk)
+            except MultipartParseError:
+                raise HTTPException(status_code=400, detail="Malformed multipart body")
+        return self._events.popleft()
+
+    async def next_part(self) -> FormPart | None:
+        """Следующая часть формы (остаток текущей пропускается) или None в конце тела"""
+        while True:
+            kind, value = await self._next_event()
+            if kind == "part":
+                self._parts += 1
+                if self._parts > FORM_MAX_PARTS:
+                    raise HTTPException(status_code=400, detail="Too many form parts")
+                self._in_part = True
+                return value
+            if kind == "end":
+                self._in_part = False
+            elif kind == "done":
+                return None
+
+    async def iter_data(self) -> AsyncIterator[bytes]:
+        """Содержимое текущей части блоками по мере получения"""
+        while self._in_part:
+            kind, value = await self._next_event()
+            if kind == "data":
+                yield value
+            elif kind == "end":
+                self._in_part = False
+
+    async def read_text(self) -> str:
+        """Значение текстового поля, не длиннее FORM_FIELD_MAX_SIZE байтов"""
+        value = bytearray()
+        async for chunk in self.iter_data():
+            value += chunk
+            if len(value) > FORM_FIELD_MAX_SIZE:
+                raise HTTPException(status_code=413, detail="Form field is too large")
+        return decode_header(bytes(value))
@@ -0,0 +1,224 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, delete, insert, update, literal, exists, and_, case
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config.app_config import settings
+from app.database.database_helper import db_helper, INSERT_DIALECTS
+from app.models.purge import PurgeTombstoneORM, BlobLeaseORM
+from app.models.users import AudioFileORM
+from app.repositories.upload_audio_repo import UARepo
+from app.repositories.resumable_upload_repo import UploadSessionRepo
+from app.storage.storage_helper import storage
+from app.config.logger import get_logger
+
+logger = get_logger()
+
+BLOB = "blob"
+PREFIX = "prefix"
+
+
+class PurgeRepo:
+
+    @classmethod
+    def add_tombstone(cls, kind: str, key: str, session: AsyncSession) -> None:
+        """Отложенное удаление из хранилища; фиксируется вместе с текущей транзакцией"""
+        session.add(PurgeTombstoneORM(kind=kind, key=key))
+
+    @classmethod
+    async def add_user_blob_tombstones(cls, user_id, session: AsyncSession) -> None:
+        """
+        Отложенное удаление всех файлов пользователя одним INSERT ... SELECT,
+        без загрузки его записей в приложение
+        """
+        query = insert(PurgeTombstoneORM).from_select(
+            ["kind", "key"],
+            select(literal(BLOB), AudioFileORM.blob_hash)
+            .where(
+                AudioFileORM.user_id == user_id,
+                AudioFileORM.blob_hash.is_not(None),
+            )
+            .distinct(),
+        )
+        await session.execute(query)
+
+    @classmethod
+    async def lease_blobs(cls, hashes: set[str], session: AsyncSession) -> None:
+        """
+        Защита файлов от фоновой очистки на время загрузки, до проверки их наличия в хранилище.
+        Аренда фиксируется сразу: если очистка уже удаляет файл, запрос ждёт её коммита
+        и затем видит, что файла нет. Истёкшая аренда (упавший процесс) не учитывается.
+        """
+        if not hashes:
+            return
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=settings.BLOB_LEASE_TTL)
+        query = INSERT_DIALECTS[session.get_bind().dialect.name](BlobLeaseORM).values(
+            # строки блокируются в одном порядке, чтобы параллельные пакеты не ждали друг друга по кругу
+            [{"blob_hash": blob_hash, "leases": 1, "expires_at": expires_at} for blob_hash in sorted(hashes)]
+        )
+        query = query.on_conflict_do_update(
+            index_elements=[BlobLeaseORM.blob_hash],
+            set_={
+                "leases": case(
+                    (BlobLeaseORM.expires_at > now, BlobLeaseORM.leases + 1), else_=1
+                ),
+                "expires_at": query.excluded.expires_at,
+            },
+        )
+        await session.execute(query)
+        await session.commit()
+
+    @classmethod
+    async def release_blobs(
+        cls, hashes: set[str], session: AsyncSession, discarded: set[str] = frozenset()
+    ) -> None:
+        """
+        Снятие аренды после записи в БД или отказа в ней.
+        discarded — файлы, созданные запросом, на которые он мог не сослаться (ошибка, пропуск):
+        для них создаётся отложенное удаление, и очистка удалит файл, если ссылок на него нет.
+        """
+        if hashes:
+            await session.execute(
+                delete(BlobLeaseORM).where(
+                    BlobLeaseORM.blob_hash.in_(hashes), BlobLeaseORM.leases <= 1
+                )
+            )
+            await session.execute(
+                update(BlobLeaseORM)
+                .where(BlobLeaseORM.blob_hash.in_(hashes))
+                .values(leases=BlobLeaseORM.leases - 1)
+            )
+        for blob_hash in discarded:
+            cls.add_tombstone(BLOB, blob_hash, session)
+        await session.commit()
+        if discarded:
+            purge_worker.wake()
+
+    @classmethod
+    async def lock_blob(cls, blob_hash: str, session: AsyncSession) -> bool:
+        """
+        Блокировка строки аренды файла до конца транзакции очистки (строка создаётся, если её нет).
+        Возвращает True, если файл защищён действующей арендой загрузки.
+        """
+        now = datetime.now(timezone.utc)
+        query = INSERT_DIALECTS[session.get_bind().dialect.name](BlobLeaseORM).values(
+            blob_hash=blob_hash, leases=0, expires_at=now
+        )
+        query = query.on_conflict_do_update(
+            index_elements=[BlobLeaseORM.blob_hash],
+            set_={"leases": BlobLeaseORM.leases},
+        ).returning(and_(BlobLeaseORM.leases > 0, BlobLeaseORM.expires_at > now))
+        return bool((await session.execute(query)).scalar_one())
+
+    @classmethod
+    async def purge_pending(
+        cls, session: AsyncSession, after_id: int = 0, batch_size: int = settings.PURGE_BATCH_SIZE
+    ) -> int | None:
+        """
+        Очистка хранилища по одной пачке отложенных удалений с id больше after_id.
+        Возвращает id последней просмотренной записи (с него продолжается следующая пачка)
+        или None, если записей больше нет.
+        Файл удаляется под блокировкой строки аренды (lock_blob) и только если на него
+        не ссылается ни одна запись и его не защищает загрузка в процессе: загрузка, которая
+        нашла файл в хранилище, держит аренду до записи в БД. Удаление под арендой
+        откладывается до следующего прохода.
+        Запись об удалении удаляется после очистки хранилища, поэтому после сбоя
+        очистка повторяется; удаление из хранилища идемпотентно.
+        """
+        query = (
+            select(PurgeTombstoneORM)
+            .where(PurgeTombstoneORM.id > after_id)
+            .order_by(PurgeTombstoneORM.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        tombstones = (await session.execute(query)).scalars().all()
+        done = []
+        for tombstone in tombstones:
+            if tombstone.kind == BLOB:
+                if await cls.lock_blob(tombstone.key, session):
+                    continue
+                referenced = await session.scalar(
+                    select(exists().where(AudioFileORM.blob_hash == tombstone.key))
+                )
+                if not referenced:
+                    await UARepo.remove_blobs({tombstone.key})
+                await session.execute(
+                    delete(BlobLeaseORM).where(BlobLeaseORM.blob_hash == tombstone.key)
+                )
+            elif tombstone.kind == PREFIX:
+                await storage.delete_prefix(tombstone.key)
+            else:
+                logger.error("Неизвестный тип отложенного удаления: {}", tombstone.kind)
+            done.append(tombstone.id)
+        if done:
+            await session.execute(
+                delete(PurgeTombstoneORM).where(PurgeTombstoneORM.id.in_(done))
+            )
+        await session.commit()
+        return tombstones[-1].id if tombstones else None
+
+
+class PurgeWorker:
+    """
+    Фоновая задача, очищающая хранилище по отложенным удалениям.
+    При запуске дочищает то, что не успело удалиться до остановки процесса,
+    затем просыпается по wake() или раз в PURGE_INTERVAL секунд.
+    Заодно удаляет истёкшие сессии возобновляемой загрузки.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker, interval: float):
+        self.session_maker = session_maker
+        self.interval = interval
+        self._event = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def wake(self) -> None:
+        """Запустить очистку, не дожидаясь очередного периода"""
+        self._event.set()
+
+    async def purge_all(self) -> None:
+        """Обработка всех накопленных отложенных удалений (удаления под арендой ждут следующего прохода)"""
+        after_id = 0
+        async with self.session_maker() as session:
+            while (after_id := await PurgeRepo.purge_pending(session, after_id)) is not None:
+                pass
+
+    async def expire_uploads(self) -> int:
+        """Удаление брошенных сессий возобновляемой загрузки вместе с их файлами"""
+        async with self.session_maker() as session:
+            return await UploadSessionRepo.expire_sessions(session)
+
+    async def _run(self) -> None:
+        while True:
+            self._event.clear()
+            try:
+                await self.purge_all()
+                await self.expire_uploads()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Ошибка при очистке хранилища: {}", e)
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+purge_worker = PurgeWorker(db_helper.async_session_maker, settings.PURGE_INTERVAL)
@@ -0,0 +1,299 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import ClientDisconnect
+
+from app.audio.metadata import MetadataCollector
+from app.config.app_config import UPLOAD_CHUNK_SIZE, settings
+from app.models.uploads import UploadSessionORM
+from app.models.users import UserORM
+from app.repositories.upload_audio_repo import SavedAudio
+from app.storage.file_lock import lock_file
+from app.storage.storage_helper import storage
+from app.config.logger import get_logger
+
+logger = get_logger()
+
+
+class UploadSessionRepo:
+    """
+    Возобновляемая загрузка: сессия создаётся с заявленным размером файла,
+    данные дописываются кусками по смещению (PATCH), текущее смещение можно узнать
+    после обрыва связи, а готовый файл публикуется как обычная загрузка.
+    """
+
+    @classmethod
+    def get_upload_dir(cls) -> str:
+        return os.path.join(storage.spool_dir, "uploads")
+
+    @classmethod
+    def get_upload_path(cls, upload_id: uuid.UUID) -> str:
+        """Временный файл сессии; лежит на диске, пока загрузка не завершена или не истекла"""
+        return os.path.join(cls.get_upload_dir(), f"{upload_id}.upload")
+
+    @classmethod
+    def get_expires_at(cls) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+
+    @classmethod
+    async def create_session(
+        cls,
+        user_id: uuid.UUID,
+        filename: str,
+        extension: str,
+        size: int,
+        session: AsyncSession,
+    ) -> UploadSessionORM:
+        """
+        Создание сессии загрузки и пустого временного файла под неё.
+        Файл сессии и блокировка записи в него локальны для узла, поэтому с S3 без общей
+        временной директории (UPLOAD_SPOOL_SHARED) сессии не создаются: PATCH на другом узле
+        не нашёл бы файла
+        """
+        if settings.STORAGE_BACKEND == "s3" and not settings.UPLOAD_SPOOL_SHARED:
+            raise HTTPException(
+                status_code=501,
+                detail="Resumable uploads require a shared spool directory (UPLOAD_SPOOL_SHARED)",
+            )
+        if size > settings.MAX_UPLOAD_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File is too large. Maximum size is {settings.MAX_UPLOAD_SIZE} bytes.",
+            )
+        upload = UploadSessionORM(
+            id=uuid.uuid4(),
+            user_id=user_id,
+            filename=filename,
+            extension=extension,
+            size=size,
+            offset=0,
+            expires_at=cls.get_expires_at(),
+        )
+        # user_id берётся из кэша процесса: пользователь мог быть удалён другим воркером,
+        # поэтому строка пользователя проверяется под блокировкой, как в UserDB.lock_user
+        query = select(UserORM.id).where(UserORM.id == user_id).with_for_update()
+        if await session.scalar(query) is None:
+            await session.rollback()
+            raise HTTPException(status_code=404, detail="User not found")
+        path = cls.get_upload_path(upload.id)
+        await asyncio.to_thread(cls._create_file, path)
+        session.add(upload)
+        try:
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            await asyncio.to_thread(cls._remove_file, path)
+            logger.error("Ошибка при создании сессии загрузки: {}", e)
+            raise HTTPException(status_code=500, detail="Failed to create upload session")
+        logger.info("Создана сессия загрузки {} на {} байт", upload.id, size)
+        return upload
+
+    @classmethod
+    async def get_session(
+        cls, upload_id: uuid.UUID, user_id: uuid.UUID, session: AsyncSession
+    ) -> UploadSessionORM:
+        """Действующая сессия загрузки пользователя; истёкшие сессии считаются удалёнными"""
+        query = select(UploadSessionORM).where(
+            UploadSessionORM.id == upload_id,
+            UploadSessionORM.user_id == user_id,
+            UploadSessionORM.expires_at > datetime.now(timezone.utc),
+        )
+        upload = await session.scalar(query)
+        if upload is None:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        return upload
+
+    @classmethod
+    async def write_chunk(
+        cls,
+        upload: UploadSessionORM,
+        offset: int,
+        chunks: AsyncIterator[bytes],
+        session: AsyncSession,
+    ) -> int:
+        """
+        Дозапись данных с указанного смещения, возвращает новое смещение.
+        Смещение должно совпадать с уже принятым объёмом. Данные копятся до UPLOAD_CHUNK_SIZE
+        и пишутся в пуле потоков; при обрыве соединения сохраняется всё, что успело прийти.
+        Файл на время записи блокируется, поэтому параллельная запись в одну сессию отклоняется.
+        На время приёма данных соединение с БД возвращается в пул, новое смещение
+        записывается отдельной короткой транзакцией.
+        """
+        if offset != upload.offset:
+            raise HTTPException(status_code=409, detail="Upload offset mismatch")
+        await session.close()
+        path = cls.get_upload_path(upload.id)
+        try:
+            buffer = await asyncio.to_thread(cls._open_at, path, offset)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        except BlockingIOError:
+            raise HTTPException(status_code=423, detail="Upload is in progress")
+
+        received = 0
+        pending = bytearray()
+        try:
+            try:
+                async for chunk in chunks:
+                    received += len(chunk)
+                    # Лишнее за заявленным размером отбрасывается при следующей записи
+                    if offset + received > upload.size:
+                        raise HTTPException(
+                            status_code=413, detail="Upload exceeds the declared size"
+                        )
+                    pending += chunk
+                    if len(pending) >= UPLOAD_CHUNK_SIZE:
+                        data, pending = pending, bytearray()
+                        await asyncio.to_thread(buffer.write, data)
+            except ClientDisconnect:
+                logger.info("Обрыв соединения при загрузке {}, принято {} байт", upload.id, received)
+            await asyncio.to_thread(buffer.write, pending)
+        finally:
+            await asyncio.to_thread(buffer.close)
+
+        new_offset = offset + received
+        result = await session.execute(
+            update(UploadSessionORM)
+            .where(UploadSessionORM.id == upload.id, UploadSessionORM.offset == offset)
+            .values(offset=new_offset, expires_at=cls.get_expires_at())
+        )
+        if result.rowcount == 0:
+            await session.rollback()
+            raise HTTPException(status_code=409, detail="Upload offset mismatch")
+        await session.commit()
+        return new_offset
+
+    @classmethod
+    async def finalize(cls, upload: UploadSessionORM) -> SavedAudio:
+        """
+        Подсчёт SHA-256 и разбор заголовков полностью принятого файла.
+        Для публикации через UARepo.publish_audio создаётся жёсткая ссылка на файл сессии:
+        публикация забирает ссылку, а данные сессии остаются до её удаления, поэтому после
+        отказа завершение можно повторить. Принятые данные не меняются (запись идёт только
+        после подтверждённого смещения), так что общий с опубликованным файлом inode безопасен.
+        """
+        if upload.offset != upload.size:
+            raise HTTPException(status_code=409, detail="Upload is incomplete")
+        path = cls.get_upload_path(upload.id)
+        tmp_location = os.path.join(storage.spool_dir, f"{uuid.uuid4().hex}.part")
+        try:
+            sha256, metadata = await asyncio.to_thread(cls._digest, path, upload.size)
+            await asyncio.to_thread(cls._link, path, tmp_location)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        return SavedAudio(
+            tmp_location=tmp_location, sha256=sha256, size=upload.size, metadata=metadata
+        )
+
+    @classmethod
+    async def delete_session(cls, upload_id: uuid.UUID, session: AsyncSession) -> None:
+        """Удаление сессии и её временного файла (если он ещё не опубликован)"""
+        await session.execute(delete(UploadSessionORM).where(UploadSessionORM.id == upload_id))
+        await session.commit()
+        await asyncio.to_thread(cls._remove_file, cls.get_upload_path(upload_id))
+
+    @classmethod
+    async def expire_sessions(cls, session: AsyncSession) -> int:
+        """
+        Удаление сессий без активности дольше UPLOAD_SESSION_TTL и их файлов.
+        Заодно удаляются давно не изменявшиеся файлы без сессии
+        (например, оставшиеся после удаления пользователя) и временные файлы *.part
+        в storage.spool_dir, брошенные при сбое между приёмом и публикацией файла.
+        """
+        query = (
+            delete(UploadSessionORM)
+            .where(UploadSessionORM.expires_at <= datetime.now(timezone.utc))
+            .returning(UploadSessionORM.id)
+        )
+        expired = (await session.scalars(query)).all()
+        await session.commit()
+        for upload_id in expired:
+            await asyncio.to_thread(cls._remove_file, cls.get_upload_path(upload_id))
+        cutoff = time.time() - settings.UPLOAD_SESSION_TTL
+        stale = await asyncio.to_thread(cls._remove_stale_files, cls.get_upload_dir(), cutoff)
+        stale_parts = await asyncio.to_thread(
+            cls._remove_stale_files, storage.spool_dir, cutoff, ".part"
+        )
+        if expired or stale or stale_parts:
+            logger.info(
+                "Удалено истёкших сессий загрузки: {}, файлов без сессии: {}, временных файлов: {}",
+                len(expired), stale, stale_parts,
+            )
+        return len(expired)
+
+    @staticmethod
+    def _create_file(path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "wb").close()
+
+    @staticmethod
+    def _open_at(path: str, offset: int):
+        # Обрезаем файл до подтверждённого смещения: хвост мог остаться от прерванной записи
+        buffer = open(path, "r+b")
+        try:
+            lock_file(buffer, blocking=False)
+            if buffer.seek(0, os.SEEK_END) < offset:
+                raise FileNotFoundError(path)
+            buffer.truncate(offset)
+            buffer.seek(offset)
+        except BaseException:
+            buffer.close()
+            raise
+        return buffer
+
+    @staticmethod
+    def _digest(path: str, size: int):
+        digest = hashlib.sha256()
+        collector = MetadataCollector()
+        with open(path, "rb") as buffer:
+            while chunk := buffer.read(UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                collector.feed(chunk)
+        return digest.hexdigest(), collector.result(size)
+
+    @staticmethod
+    def _link(path: str, link: str) -> None:
+        try:
+            os.link(path, link)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            # файловая система без жёстких ссылок
+            shutil.copyfile(path, link)
+            return
+        # ссылка делит время изменения с файлом сессии: обновляем его, чтобы очистка
+        # временных файлов не приняла свежую ссылку за брошенную
+        os.utime(link)
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _remove_stale_files(directory: str, cutoff: float, suffix: str = "") -> int:
+        """Удаление файлов директории (с окончанием suffix), не изменявшихся с момента cutoff"""
+        removed = 0
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            try:
+                if entry.name.endswith(suffix) and entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
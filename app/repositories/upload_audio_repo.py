@@ -1,11 +1,33 @@
+import asyncio
+import hashlib
+import os
 import re
+import uuid
+from dataclasses import dataclass
+from typing import AsyncIterator
 
 from fastapi import HTTPException
 
+from app.audio.metadata import AudioMetadata, MetadataCollector
 from app.config.app_config import (
     ALLOWED_AUDIO,
     VALID_FILENAME_PATTERN,
+    UPLOAD_CHUNK_SIZE,
+    settings,
 )
+from app.storage.storage_helper import storage
+
+QUOTA_EXCEEDED = "Storage quota exceeded"
+
+
+@dataclass
+class SavedAudio:
+    """Временный файл загрузки, его контрольная сумма и метаданные из заголовков"""
+
+    tmp_location: str
+    sha256: str
+    size: int
+    metadata: AudioMetadata | None = None
 
 
 class UARepo:
@@ -35,6 +57,94 @@ class UARepo:
             )
 
     @classmethod
-    async def save_audio(cls, file, file_location):
-        with open(file_location, "wb") as buffer:
-            buffer.write(await file.read())
+    def get_blob_key(cls, sha256: str) -> str:
+        """Ключ файла в контентно-адресуемом хранилище: blobs/ab/cd/abcd..."""
+        return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+    @classmethod
+    def get_peaks_key(cls, sha256: str) -> str:
+        """Ключ сводки пиков для отрисовки волны, хранится рядом с файлом"""
+        return f"{cls.get_blob_key(sha256)}.peaks"
+
+    @classmethod
+    async def save_audio(
+        cls, chunks: AsyncIterator[bytes], max_size: int | None = None
+    ) -> SavedAudio:
+        """
+        Потоковое сохранение файла во временную директорию хранилища (storage.spool_dir).
+        chunks — содержимое файла по мере получения (например, часть формы из MultipartStream);
+        данные копятся до UPLOAD_CHUNK_SIZE, запись и подсчёт SHA-256 выполняются
+        в пуле потоков, поэтому расход памяти не зависит от размера файла и event loop не блокируется.
+        Заголовки контейнера накапливаются по ходу записи и разбираются без декодирования аудио.
+        max_size — свободное место в квоте пользователя: загрузка прерывается, как только
+        файл его превысит. Временный файл публикуется через publish_audio.
+        """
+        tmp_location = os.path.join(storage.spool_dir, f"{uuid.uuid4().hex}.part")
+        await asyncio.to_thread(os.makedirs, storage.spool_dir, exist_ok=True)
+        buffer = await asyncio.to_thread(open, tmp_location, "wb")
+        digest = hashlib.sha256()
+        collector = MetadataCollector()
+        size = 0
+        pending = bytearray()
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                # Прерываем загрузку сразу, не дожидаясь конца слишком большого файла
+                if size > settings.MAX_UPLOAD_SIZE:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File is too large. Maximum size is {settings.MAX_UPLOAD_SIZE} bytes.",
+                    )
+                if max_size is not None and size > max_size:
+                    raise HTTPException(status_code=413, detail=QUOTA_EXCEEDED)
+                pending += chunk
+                if len(pending) >= UPLOAD_CHUNK_SIZE:
+                    data, pending = bytes(pending), bytearray()
+                    await asyncio.to_thread(cls._write_chunk, buffer, digest, collector, data)
+            if pending:
+                await asyncio.to_thread(cls._write_chunk, buffer, digest, collector, bytes(pending))
+        except BaseException:
+            await asyncio.to_thread(buffer.close)
+            await cls.discard_audio(tmp_location)
+            raise
+        await asyncio.to_thread(buffer.close)
+        metadata = await asyncio.to_thread(collector.result, size)
+        return SavedAudio(
+            tmp_location=tmp_location, sha256=digest.hexdigest(), size=size, metadata=metadata
+        )
+
+    @staticmethod
+    def _write_chunk(buffer, digest, collector: MetadataCollector, chunk: bytes) -> None:
+        # hashlib отпускает GIL на больших блоках, поэтому хэширование идёт параллельно с event loop
+        digest.update(chunk)
+        collector.feed(chunk)
+        buffer.write(chunk)
+
+    @classmethod
+    async def publish_audio(cls, saved: SavedAudio) -> bool:
+        """
+        Публикация временного файла в контентно-адресуемое хранилище.
+        Если файл с таким содержимым уже есть, временный файл удаляется.
+        Возвращает True, если файл был добавлен в хранилище.
+        """
+        key = cls.get_blob_key(saved.sha256)
+        if await storage.stat(key) is not None:
+            await cls.discard_audio(saved.tmp_location)
+            return False
+        await storage.put_file(key, saved.tmp_location)
+        return True
+
+    @classmethod
+    async def discard_audio(cls, tmp_location: str) -> None:
+        """Удаление временного файла после неудачной загрузки"""
+        try:
+            await asyncio.to_thread(os.remove, tmp_location)
+        except FileNotFoundError:
+            pass
+
+    @classmethod
+    async def remove_blobs(cls, hashes: set[str]) -> None:
+        """Удаление файлов из хранилища, на которые больше не ссылается ни одна запись"""
+        for sha256 in hashes:
+            await storage.delete(cls.get_blob_key(sha256))
+            await storage.delete(cls.get_peaks_key(sha256))
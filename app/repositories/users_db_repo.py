@@ -1,15 +1,22 @@
-import os
-import shutil
-from typing import List
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Collection, Literal
 
 from fastapi import HTTPException
-from sqlalchemy import select
+from sqlalchemy import Row, select, delete, update, and_, func, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cache.users_cache import CachedUser, users_cache
+from app.config.app_config import settings
+from app.models.uploads import UploadSessionORM
 from app.models.users import UserORM, AudioFileORM
+from app.repositories.purge_repo import PurgeRepo, purge_worker, PREFIX
 from app.schemas.schemas import (
     SchUpdateUser,
     SchGetAudioFile,
+    SchAudioFilesPage,
     SchUserDeleteResponse,
     SchUserChangeResponse,
 )
@@ -23,7 +30,7 @@ class UserDB:
     @classmethod
     async def get_user(cls, user_id: int, session: AsyncSession) -> UserORM | None:
         """Метод для получения пользователя по id"""
-        logger.info(f"Получение пользователя по id: {user_id}")
+        logger.info("Получение пользователя по id: {}", user_id)
         query = select(UserORM).where(UserORM.id == user_id)
         user = await session.execute(query)
         user = user.scalar_one_or_none()
@@ -34,20 +41,105 @@ class UserDB:
         cls, yandex_id: int, session: AsyncSession
     ) -> UserORM | None:
         """Метод для получения пользователя по yandex_id"""
-        logger.info(f"Получение пользователя по yandex_id: {yandex_id}")
+        logger.info("Получение пользователя по yandex_id: {}", yandex_id)
         query = select(UserORM).where(UserORM.yandex_id == yandex_id)
         user = await session.execute(query)
         user = user.scalar_one_or_none()
         return user
 
+    @classmethod
+    async def get_cached_user(
+        cls, yandex_id: str, session: AsyncSession
+    ) -> CachedUser | None:
+        """Метод для получения снимка пользователя по yandex_id из кэша процесса (или из БД при промахе)"""
+        return await users_cache.get_user(yandex_id, session)
+
+    @classmethod
+    async def get_user_state(cls, yandex_id: str, session: AsyncSession) -> Row | None:
+        """
+        Версия, занятое место и профиль пользователя (id, version, used_bytes, username, email,
+        yandex_id) одним запросом; не кэшируются, так как меняются при каждой загрузке.
+        Профиль читается вместе с версией, поэтому тело ответа соответствует его ETag.
+        Запрос не затрагивает таблицу аудиофайлов, его достаточно для ответа 304 на условный запрос
+        """
+        query = select(
+            UserORM.id,
+            UserORM.version,
+            UserORM.used_bytes,
+            UserORM.username,
+            UserORM.email,
+            UserORM.yandex_id,
+        ).where(UserORM.yandex_id == yandex_id)
+        return (await session.execute(query)).one_or_none()
+
+    @staticmethod
+    def get_etag(user_id: uuid.UUID, version: int) -> str:
+        """
+        Слабый ETag данных пользователя и списка его файлов: id пользователя и версия.
+        id нужен, чтобы ответ одному пользователю не подошёл другому с той же версией
+        """
+        return f'W/"{user_id.hex}-{version}"'
+
+    @classmethod
+    async def get_free_bytes(
+        cls, yandex_id: str, session: AsyncSession, replaced: Collection[str] = ()
+    ) -> int | None:
+        """
+        Свободное место пользователя в пределах USER_STORAGE_QUOTA, им ограничивается
+        потоковая загрузка; replaced — имена перезаписываемых файлов, их место считается свободным.
+        None, если квота не задана (запрос к БД не выполняется) или пользователь не найден
+        """
+        if settings.USER_STORAGE_QUOTA <= 0:
+            return None
+        used = UserORM.used_bytes
+        if replaced:
+            replaced_size = (
+                select(func.coalesce(func.sum(AudioFileORM.size), 0))
+                .where(AudioFileORM.user_id == UserORM.id, AudioFileORM.filename.in_(replaced))
+                .scalar_subquery()
+            )
+            used = used - replaced_size
+        used_bytes = await session.scalar(select(used).where(UserORM.yandex_id == yandex_id))
+        if used_bytes is None:
+            return None
+        return max(0, settings.USER_STORAGE_QUOTA - used_bytes)
+
+    @classmethod
+    async def lock_user(cls, condition, session: AsyncSession) -> uuid.UUID | None:
+        """
+        Блокировка строки пользователя (condition — условие на UserORM) до конца транзакции,
+        id пользователя или None. Берётся перед чтением размеров перезаписываемых файлов:
+        параллельная перезапись тех же файлов ждёт коммита и читает уже новые размеры, поэтому
+        счётчик занятого места не расходится с суммой размеров. SQLite не поддерживает
+        FOR UPDATE, там конкурирующая запись отклоняется блокировкой всей БД.
+        """
+        return await session.scalar(select(UserORM.id).where(condition).with_for_update())
+
+    @classmethod
+    async def bump_version(cls, condition, session: AsyncSession, used_delta: int = 0) -> bool:
+        """
+        Увеличение версии пользователя (condition — условие на UserORM) и изменение счётчика
+        занятого места на used_delta в текущей транзакции, без коммита. Рост занятого места
+        проверяется против USER_STORAGE_QUOTA в том же UPDATE, поэтому параллельные загрузки
+        не превысят квоту. False, если квота превышена или пользователь не найден.
+        """
+        query = update(UserORM).where(condition).values(
+            version=UserORM.version + 1, used_bytes=UserORM.used_bytes + used_delta
+        )
+        if used_delta > 0 and settings.USER_STORAGE_QUOTA > 0:
+            query = query.where(UserORM.used_bytes + used_delta <= settings.USER_STORAGE_QUOTA)
+        result = await session.execute(query)
+        return result.rowcount > 0
+
     @classmethod
     async def create_user(cls, session: AsyncSession, user_data) -> dict:
         """Метод для создания пользователя"""
-        logger.info(f"Создание пользователя с данными: {user_data}")
+        logger.info("Создание пользователя с данными: {}", user_data)
         new_user = UserORM(**user_data)
         session.add(new_user)
         await session.commit()
-        logger.info(f"Пользователь с yandex_id: {user_data['yandex_id']} успешно создан")
+        await users_cache.invalidate(user_data["yandex_id"])
+        logger.info("Пользователь с yandex_id: {} успешно создан", user_data["yandex_id"])
         return {"message": "user has been created"}
 
     @classmethod
@@ -55,10 +147,10 @@ class UserDB:
         cls, yandex_id: int, user_data: SchUpdateUser, session: AsyncSession
     ) -> SchUserChangeResponse:
         """Метод для изменения пользователя по yandex_id"""
-        logger.info(f"Изменение пользователя с yandex_id: {yandex_id}")
+        logger.info("Изменение пользователя с yandex_id: {}", yandex_id)
         user = await cls.get_user_by_yandex_id(yandex_id, session)
         if user is None:
-            logger.error(f"Пользователь с yandex_id: {yandex_id} не найден")
+            logger.error("Пользователь с yandex_id: {} не найден", yandex_id)
             raise HTTPException(status_code=404, detail="User not found")
 
         user_data_dict = user_data.model_dump(
@@ -67,57 +159,129 @@ class UserDB:
 
         for key, value in user_data_dict.items():
             setattr(user, key, value)
+        user.version = UserORM.version + 1
 
         await session.commit()
-        logger.info(f"Пользователь с yandex_id: {yandex_id} успешно изменен")
+        await users_cache.invalidate(yandex_id)
+        logger.info("Пользователь с yandex_id: {} успешно изменен", yandex_id)
         return SchUserChangeResponse(
             message=f"User with yandex id {yandex_id} has been changed"
         )
 
     @classmethod
     async def get_audios_list(
-        cls, yandex_id: int, session: AsyncSession
-    ) -> List[SchGetAudioFile]:
-        """Метод для получения списка аудиозаписей пользователя по yandex_id"""
-        logger.info(f"Получение списка аудиозаписей пользователя с yandex_id")
-        user = await cls.get_user_by_yandex_id(yandex_id, session)
-        if user is None:
-            logger.error(f"Пользователь с yandex_id: {yandex_id} не найден")
+        cls,
+        yandex_id: int,
+        session: AsyncSession,
+        limit: int = 50,
+        cursor: str | None = None,
+        order_by: Literal["created_at", "filename"] = "created_at",
+    ) -> tuple[SchAudioFilesPage, str]:
+        """
+        Метод для получения страницы списка аудиозаписей пользователя по yandex_id и ETag списка.
+        Пагинация по ключу (order_by, id): следующая страница начинается после последней записи
+        предыдущей, без OFFSET. Пользователь и его записи выбираются одним запросом с LEFT JOIN,
+        поэтому отсутствие пользователя отличается от пустого списка, а версия для ETag
+        читается в том же запросе.
+        """
+        logger.info("Получение списка аудиозаписей пользователя с yandex_id: {}", yandex_id)
+        sort_column = getattr(AudioFileORM, order_by)
+        join_condition = AudioFileORM.user_id == UserORM.id
+        if cursor is not None:
+            last_value, last_id = cls._decode_cursor(cursor, order_by)
+            join_condition = and_(
+                join_condition,
+                tuple_(sort_column, AudioFileORM.id) > tuple_(last_value, last_id),
+            )
+
+        query = (
+            select(
+                *(getattr(AudioFileORM, name) for name in SchGetAudioFile.model_fields),
+                UserORM.id.label("user_id"),
+                UserORM.version,
+            )
+            .select_from(UserORM)
+            .outerjoin(AudioFileORM, join_condition)
+            .where(UserORM.yandex_id == yandex_id)
+            .order_by(sort_column, AudioFileORM.id)
+            .limit(limit + 1)
+        )
+        rows = (await session.execute(query)).all()
+        if not rows:
+            logger.error("Пользователь с yandex_id: {} не найден", yandex_id)
             raise HTTPException(status_code=404, detail="User not found")
 
-        query = select(AudioFileORM).where(AudioFileORM.user_id == user.id)
-        audios_list_orm = await session.execute(query)
-        audios_list = audios_list_orm.scalars().all()
-        audios_list = [SchGetAudioFile.model_validate(sound) for sound in audios_list]
-        logger.info(f"Список аудиозаписей пользователя с yandex_id: {yandex_id} получен")
-        return audios_list
+        etag = cls.get_etag(rows[0].user_id, rows[0].version)
+        # У пользователя без записей LEFT JOIN возвращает одну строку с NULL
+        rows = [row for row in rows if row.id is not None]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = cls._encode_cursor(getattr(rows[-1], order_by), rows[-1].id)
+
+        items = [
+            SchGetAudioFile.model_construct(**row._mapping)
+            for row in rows
+        ]
+        logger.info("Список аудиозаписей пользователя с yandex_id: {} получен", yandex_id)
+        return SchAudioFilesPage(items=items, next_cursor=next_cursor), etag
+
+    @staticmethod
+    def _encode_cursor(value: datetime | str, audio_id: uuid.UUID) -> str:
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        raw = json.dumps([value, audio_id.hex]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def _decode_cursor(
+        cursor: str, order_by: str
+    ) -> tuple[datetime | str, uuid.UUID]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            value, audio_id = json.loads(raw)
+            if order_by == "created_at":
+                value = datetime.fromisoformat(value)
+            return value, uuid.UUID(audio_id)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
 
     @classmethod
     async def delete_user(
         cls, yandex_id: int, session: AsyncSession
     ) -> SchUserDeleteResponse:
-        """Метод для удаления пользователя и всех его аудиозаписей из базы данных и папки в audio_storage"""
-        logger.info(f"Удаление пользователя с yandex_id: {yandex_id}")
-        user = await cls.get_user_by_yandex_id(yandex_id, session)
-        if user is None:
-            logger.error(f"Пользователь с yandex_id: {yandex_id} не найден")
+        """
+        Метод для удаления пользователя и всех его аудиозаписей.
+        Записи удаляются одним запросом, а файлы — фоновой очисткой хранилища
+        по отложенным удалениям, записанным в той же транзакции
+        """
+        logger.info("Удаление пользователя с yandex_id: {}", yandex_id)
+        # id читается из БД под блокировкой строки, а не из кэша процесса
+        user_id = await cls.lock_user(UserORM.yandex_id == yandex_id, session)
+        if user_id is None:
+            await session.rollback()
+            await users_cache.invalidate(yandex_id)
+            logger.error("Пользователь с yandex_id: {} не найден", yandex_id)
             raise HTTPException(status_code=404, detail="User not found")
 
-        # удаляем все аудиозаписи пользователя, прежде чем удалить самого пользователя
-        query = select(AudioFileORM).where(AudioFileORM.user_id == user.id)
-        audios_list = await session.execute(query)
-        audios_list = audios_list.scalars().all()
-        for audio in audios_list:
-            await session.delete(audio)
-        logger.info(f"Удалены все аудиозаписи пользователя с yandex_id: {yandex_id}")
-        await session.delete(user)
+        await PurgeRepo.add_user_blob_tombstones(user_id, session)
+        # аудиозаписи пользователя, сохранённые до перехода на общее хранилище
+        PurgeRepo.add_tombstone(PREFIX, f"{yandex_id}/", session)
+        # дочерние записи удаляются явно, без опоры на ON DELETE CASCADE: в БД, созданных
+        # до его появления, внешние ключи остались прежними (sync_schema их не меняет).
+        # Файлы удалённых сессий загрузки убирает фоновая очистка (UploadSessionRepo.expire_sessions)
+        await session.execute(delete(UploadSessionORM).where(UploadSessionORM.user_id == user_id))
+        await session.execute(delete(AudioFileORM).where(AudioFileORM.user_id == user_id))
+        result = await session.execute(delete(UserORM).where(UserORM.id == user_id))
+        if result.rowcount == 0:
+            await session.rollback()
+            await users_cache.invalidate(yandex_id)
+            logger.error("Пользователь с yandex_id: {} не найден", yandex_id)
+            raise HTTPException(status_code=404, detail="User not found")
         await session.commit()
-        logger.info(f"Пользователь с yandex_id: {yandex_id} успешно удален")
-        # удаляем все аудиозаписи пользователя из audio_storage
-        user_folder = os.path.join("audio_storage", user.yandex_id)
-        if os.path.exists(user_folder):
-            shutil.rmtree(user_folder)  # Удаляет папку со всем содержимым
-            logger.info(f"Папка с аудиозаписями пользователя с yandex_id: {yandex_id} успешно удалена")
+        await users_cache.invalidate(yandex_id)
+        purge_worker.wake()
+        logger.info("Пользователь с yandex_id: {} успешно удален", yandex_id)
         return SchUserDeleteResponse(
             message=f"user with yandex id {yandex_id} has been deleted"
         )
@@ -0,0 +1,121 @@
+import asyncio
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, Request
+from starlette.responses import Response
+
+from app.audio import waveform
+from app.config.app_config import settings
+from app.models.users import AudioFileORM
+from app.repositories.upload_audio_repo import UARepo
+from app.storage.storage_helper import storage
+from app.config.logger import get_logger
+
+logger = get_logger()
+
+# Сводка строится по содержимому файла и не меняется, пока не изменится формат сводки
+WAVEFORM_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+class WaveformRepo:
+    """
+    Сводки пиков для отрисовки волны. Считаются в пуле процессов после загрузки файла
+    и хранятся рядом с ним, поэтому одинаковые файлы разных пользователей
+    используют одну сводку.
+    """
+
+    _executor: ProcessPoolExecutor | None = None
+
+    @classmethod
+    def get_executor(cls) -> ProcessPoolExecutor:
+        if cls._executor is None:
+            # spawn: дочерние процессы не наследуют потоки и соединения приложения
+            cls._executor = ProcessPoolExecutor(
+                max_workers=settings.WAVEFORM_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return cls._executor
+
+    @classmethod
+    def shutdown(cls) -> None:
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
+
+    @classmethod
+    async def generate(cls, sha256: str, extension: str | None = None) -> bool:
+        """
+        Расчёт и сохранение сводки пиков для файла, если её ещё нет.
+        Запускается фоновой задачей после ответа на загрузку; ошибки только логируются.
+        """
+        if not waveform.can_decode(extension):
+            return False
+        peaks_key = UARepo.get_peaks_key(sha256)
+        tmp_location = None
+        try:
+            if await storage.stat(peaks_key) is not None:
+                return False
+            blob_key = UARepo.get_blob_key(sha256)
+            path = storage.local_path(blob_key)
+            if path is None:
+                tmp_location = await cls._download(blob_key)
+                path = tmp_location
+            loop = asyncio.get_running_loop()
+            peaks = await loop.run_in_executor(
+                cls.get_executor(),
+                waveform.compute_peaks,
+                path,
+                settings.WAVEFORM_POINTS,
+                settings.WAVEFORM_LEVELS,
+            )
+            if peaks is None:
+                logger.info("Сводка пиков для файла {} не построена: формат не поддерживается", sha256)
+                return False
+            await storage.put_stream(peaks_key, cls._iterate(peaks))
+            logger.info("Сводка пиков для файла {} сохранена ({} байт)", sha256, len(peaks))
+            return True
+        except Exception as e:
+            logger.error("Ошибка при построении сводки пиков для файла {}: {}", sha256, e)
+            return False
+        finally:
+            if tmp_location is not None:
+                await UARepo.discard_audio(tmp_location)
+
+    @classmethod
+    async def get_waveform_response(cls, audio: AudioFileORM, request: Request) -> Response:
+        """Сводка пиков файла с долгим кэшированием; ETag — хэш содержимого файла и версия формата"""
+        if audio.blob_hash is None:
+            raise HTTPException(status_code=404, detail="Waveform not found")
+        etag = f'"{audio.blob_hash[:32]}-{waveform.PEAKS_VERSION}"'
+        headers = {"etag": etag, "cache-control": WAVEFORM_CACHE_CONTROL}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None and (
+            etag in {tag.strip() for tag in if_none_match.split(",")} or if_none_match.strip() == "*"
+        ):
+            return Response(status_code=304, headers=headers)
+
+        peaks_key = UARepo.get_peaks_key(audio.blob_hash)
+        if await storage.stat(peaks_key) is None:
+            raise HTTPException(status_code=404, detail="Waveform not found")
+        peaks = b"".join([chunk async for chunk in storage.get_stream(peaks_key)])
+        return Response(content=peaks, media_type="application/octet-stream", headers=headers)
+
+    @staticmethod
+    async def _iterate(data: bytes):
+        yield data
+
+    @classmethod
+    async def _download(cls, key: str) -> str:
+        """Копия файла из удалённого хранилища во временную директорию для декодирования"""
+        tmp_location = os.path.join(storage.spool_dir, f"{uuid.uuid4().hex}.part")
+        await asyncio.to_thread(os.makedirs, storage.spool_dir, exist_ok=True)
+        buffer = await asyncio.to_thread(open, tmp_location, "wb")
+        try:
+            async for chunk in storage.get_stream(key):
+                await asyncio.to_thread(buffer.write, chunk)
+        finally:
+            await asyncio.to_thread(buffer.close)
+        return tmp_location
@@ -6,9 +6,12 @@ from app.database.database_helper import db_helper
 from app.repositories.auth_router_repo import AuthRepo
 from app.repositories.users_db_repo import UserDB
 from app.schemas.schemas import SchUserDeleteResponse
+from app.metrics.instrumented_route import InstrumentedRoute
 from app.config.logger import get_logger
 
-admin_router = APIRouter(tags=["👨🏻‍💻 admin"], prefix="/admin")
+admin_router = APIRouter(
+    tags=["👨🏻‍💻 admin"], prefix="/admin", route_class=InstrumentedRoute
+)
 
 security = HTTPBearer()
 logger = get_logger()
@@ -21,20 +24,21 @@ async def delete_user(
     user_info: HTTPAuthorizationCredentials = Depends(security),
     session: AsyncSession = Depends(db_helper.get_session),
 ) -> SchUserDeleteResponse:
+    user_info = AuthRepo.check_current_user(user_info.credentials)
     logger.info(
-        f"Пользователь с yandex_id {user_info.credentials} пытается удалить пользователя с yandex_id {yandex_id}"
+        "Пользователь с yandex_id {} пытается удалить пользователя с yandex_id {}", user_info["yandex_id"], yandex_id
     )
-    user_info = AuthRepo.check_current_user(user_info.credentials)
+    # права суперпользователя читаются из БД: кэш других воркеров отстаёт до USER_CACHE_TTL
     user = await UserDB.get_user_by_yandex_id(user_info["yandex_id"], session)
 
-    if user.superuser is False:
+    if user is None or user.superuser is False:
         logger.error(
-            f"Пользователь с yandex_id {user_info['yandex_id']} не является суперюзером"
+            "Пользователь с yandex_id {} не является суперюзером", user_info["yandex_id"]
         )
         raise HTTPException(status_code=403, detail="Only superuser can do that")
 
     message = await UserDB.delete_user(yandex_id, session)
     logger.info(
-        f"Пользователь с yandex_id {yandex_id} успешно удален администратором с yandex_id {user_info['yandex_id']}"
+        "Пользователь с yandex_id {} успешно удален администратором с yandex_id {}", yandex_id, user_info["yandex_id"]
     )
     return message
@@ -1,69 +1,623 @@
-import os
+import asyncio
+import time
+import uuid
+from typing import Literal
 
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
 from fastapi.security import (
     HTTPBearer,
     HTTPAuthorizationCredentials,
 )
+from starlette.requests import ClientDisconnect
 
 from app.database.database_helper import db_helper
-from app.repositories.audio_db_repo import AudioFileDB
+from app.repositories.audio_db_repo import AudioFileDB, FILE_EXISTS
 from app.repositories.auth_router_repo import AuthRepo
-from app.repositories.upload_audio_repo import UARepo
-from app.config.app_config import AUDIO_STORAGE_PATH
-from app.schemas.schemas import SchAudioFileResponse
+from app.repositories.download_audio_repo import DARepo
+from app.repositories.multipart_stream import MultipartStream
+from app.repositories.purge_repo import PurgeRepo
+from app.repositories.resumable_upload_repo import UploadSessionRepo
+from app.repositories.upload_audio_repo import UARepo, SavedAudio, QUOTA_EXCEEDED
+from app.repositories.users_db_repo import UserDB
+from app.repositories.waveform_repo import WaveformRepo
+from app.config.app_config import settings
+from app.schemas.schemas import (
+    ConflictMode,
+    SchAudioFileResponse,
+    SchAudioFilesPage,
+    SchAudioFileDeleteResponse,
+    SchBatchUploadItem,
+    SchBatchUploadResponse,
+    SchUploadSessionCreate,
+    SchUploadSession,
+)
+from app.metrics.instrumented_route import InstrumentedRoute
+from app.metrics.metrics import observe_upload
 from app.config.logger import get_logger
 
 audio_router = APIRouter(
     tags=["🎼 Upload Audio"],
     prefix="/audio",
+    route_class=InstrumentedRoute,
 )
 
 security = HTTPBearer()
 logger = get_logger()
 
 
-@audio_router.post("/upload/")
+# Запас на границы и заголовки частей multipart сверх размера файлов
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Описание тела загрузок для OpenAPI: форма разбирается в эндпоинтах потоково, а не FastAPI
+CONFLICT_MODE_SCHEMA = {"type": "string", "enum": [mode.value for mode in ConflictMode], "default": "error"}
+UPLOAD_FORM_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["custom_name", "file"],
+                    "properties": {
+                        "custom_name": {"type": "string"},
+                        "on_conflict": CONFLICT_MODE_SCHEMA,
+                        "file": {"type": "string", "format": "binary"},
+                    },
+                }
+            }
+        },
+    }
+}
+BATCH_UPLOAD_FORM_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["custom_names", "files"],
+                    "properties": {
+                        "custom_names": {"type": "array", "items": {"type": "string"}},
+                        "on_conflict": CONFLICT_MODE_SCHEMA,
+                        "files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+def check_content_length(request: Request, limit: int, detail: str | None = None) -> None:
+    """
+    Отказ (413) по заявленному Content-Length до чтения тела запроса:
+    limit — наибольший допустимый объём файлов в теле
+    """
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > limit + MULTIPART_OVERHEAD:
+        raise HTTPException(
+            status_code=413,
+            detail=detail or f"File is too large. Maximum size is {settings.MAX_UPLOAD_SIZE} bytes.",
+        )
+
+
+def get_extension(filename: str) -> str:
+    return filename.split(".")[-1].lower()
+
+
+def get_form_field(fields: dict[str, str], name: str) -> str:
+    if name not in fields:
+        raise HTTPException(status_code=422, detail=f"Field required: {name}")
+    return fields[name]
+
+
+def get_conflict_mode(fields: dict[str, str]) -> ConflictMode:
+    try:
+        return ConflictMode(fields.get("on_conflict", ConflictMode.ERROR))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid on_conflict value")
+
+
+async def save_form_file(form: MultipartStream, free_bytes: int | None) -> SavedAudio:
+    """Сохранение текущей файловой части формы во временный файл с учётом метрик загрузки"""
+    started = time.perf_counter()
+    saved = await UARepo.save_audio(form.iter_data(), max_size=free_bytes)
+    observe_upload(saved.size, time.perf_counter() - started)
+    return saved
+
+
+def get_receive_error(error: Exception) -> HTTPException:
+    """Ошибка приёма тела загрузки в виде ответа клиенту"""
+    if isinstance(error, HTTPException):
+        return error
+    if isinstance(error, ClientDisconnect):
+        logger.info("Клиент разорвал соединение во время загрузки")
+        return HTTPException(status_code=400, detail="Client disconnected")
+    logger.error("Ошибка при сохранении аудиофайла на диск: {}", error)
+    return HTTPException(status_code=500, detail="Failed to save/upload audio.")
+
+
+@audio_router.post("/upload/", openapi_extra=UPLOAD_FORM_SCHEMA)
 async def upload_audio(
-    file: UploadFile = File(...),
-    custom_name: str = Form(...),
+    request: Request,
+    background_tasks: BackgroundTasks,
     user_info: HTTPAuthorizationCredentials = Depends(security),
     session=Depends(db_helper.get_session),
 ) -> SchAudioFileResponse:
+    """
+    Загрузка аудиофайла (форма multipart: file, custom_name, on_conflict) под именем custom_name.
+    Если у пользователя уже есть файл с таким именем, on_conflict определяет исход:
+    error — ошибка 409, overwrite — замена файла, skip — загрузка пропускается,
+    rename — файл сохраняется под свободным именем custom_name_N.
+    Форма разбирается по мере получения тела: файл сразу пишется во временный файл хранилища,
+    а загрузка сверх MAX_UPLOAD_SIZE или квоты прерывается, не дожидаясь конца тела.
+    Поля custom_name и on_conflict стоит отправлять до файла: тогда имя проверяется до приёма
+    данных, а при перезаписи место заменяемого файла учитывается в квоте с самого начала.
+    """
     # Декодируем токен и проверяем пользователя
     user_info = AuthRepo.check_current_user(user_info.credentials)
-
-    file_extension = file.filename.split(".")[-1].lower()
     yandex_id = user_info["yandex_id"]
+    check_content_length(request, settings.MAX_UPLOAD_SIZE)
 
-    # Проверка на допустимость имени файла и расширения файла
-    UARepo.check_valid_name(custom_name)
-    UARepo.check_valid_extension(file_extension)
+    form = MultipartStream(request.headers, request.stream())
+    fields: dict[str, str] = {}
+    saved = None
+    try:
+        while (part := await form.next_part()) is not None:
+            if part.filename is None:
+                fields[part.name] = await form.read_text()
+            elif part.name == "file" and saved is None:
+                file_extension = get_extension(part.filename)
+                # Проверка на допустимость имени файла и расширения файла до приёма данных
+                UARepo.check_valid_extension(file_extension)
+                if "custom_name" in fields:
+                    UARepo.check_valid_name(fields["custom_name"])
+                on_conflict = get_conflict_mode(fields)
+                replaced = fields.get("custom_name") if on_conflict == ConflictMode.OVERWRITE else None
+                free_bytes = await UserDB.get_free_bytes(
+                    yandex_id, session, replaced={replaced} if replaced else ()
+                )
+                # соединение с БД не удерживается на время потоковой загрузки
+                await session.close()
+                if free_bytes is not None:
+                    check_content_length(request, free_bytes, QUOTA_EXCEEDED)
+                # Потоковое сохранение файла во временную директорию с подсчётом SHA-256
+                saved = await save_form_file(form, free_bytes)
+        if saved is None:
+            raise HTTPException(status_code=422, detail="Field required: file")
+        custom_name = get_form_field(fields, "custom_name")
+        UARepo.check_valid_name(custom_name)
+        on_conflict = get_conflict_mode(fields)
+    except Exception as e:
+        if saved is not None:
+            await UARepo.discard_audio(saved.tmp_location)
+        raise get_receive_error(e)
     logger.info(
-        f"Проверка имени файла '{custom_name}' и расширения '{file_extension}' прошла успешно"
+        "Проверка имени файла '{}' и расширения '{}' прошла успешно", custom_name, file_extension
     )
 
-    path = f"{AUDIO_STORAGE_PATH}/{yandex_id}/"
-    # Создание директории пользователя, если она не существует
-    if not os.path.exists(path):
-        os.makedirs(f"{path}")
-        logger.info(
-            f"Создана директория для пользователя с yandex_id {yandex_id}: {path}"
-        )
-
-    file_location = f"{path}{custom_name}.{file_extension}"
+    file_location = UARepo.get_blob_key(saved.sha256)
+    leased = blob_created = False
     try:
-        # Сохранение файла на диск в директории
-        await UARepo.save_audio(file, file_location)
+        # Аренда защищает файл от фоновой очистки, пока запись о нём не создана
+        await PurgeRepo.lease_blobs({saved.sha256}, session)
+        leased = True
+        # Файл с таким же содержимым хранится один раз, повторная загрузка только добавляет ссылку
+        blob_created = await UARepo.publish_audio(saved)
         # Сохранение информации о файле в базе данных
         response = await AudioFileDB.create_audio(
-            yandex_id=yandex_id, filename=custom_name, file_path=path, session=session
+            yandex_id=yandex_id,
+            filename=custom_name,
+            file_path=file_location,
+            session=session,
+            extension=file_extension,
+            blob_hash=saved.sha256,
+            metadata=saved.metadata,
+            on_conflict=on_conflict,
         )
     except Exception as e:
-        logger.error(f"Ошибка при сохранении/загрузке аудиофайла: {str(e)}")
+        await UARepo.discard_audio(saved.tmp_location)
+        if leased:
+            # запись не создана: новый файл удалит фоновая очистка, если на него нет ссылок
+            discarded = {saved.sha256} if blob_created else set()
+            await PurgeRepo.release_blobs({saved.sha256}, session, discarded)
+        if isinstance(e, HTTPException):
+            raise
+        logger.error("Ошибка при сохранении/загрузке аудиофайла: {}", e)
         raise HTTPException(status_code=500, detail="Failed to save/upload audio.")
+    # при пропуске запись не создана, и новый файл может остаться без ссылок
+    discarded = {saved.sha256} if blob_created and on_conflict == ConflictMode.SKIP else set()
+    await PurgeRepo.release_blobs({saved.sha256}, session, discarded)
 
     logger.info(
-        f"Аудиофайл '{custom_name}.{file_extension}' успешно сохранен и записан в директорию: {file_location}"
+        "Аудиофайл '{}.{}' успешно сохранен в хранилище: {}", custom_name, file_extension, file_location
     )
+    # Сводка пиков для отрисовки волны считается после отправки ответа
+    background_tasks.add_task(WaveformRepo.generate, saved.sha256, file_extension)
     return response
+
+
+@audio_router.post("/upload_batch/", openapi_extra=BATCH_UPLOAD_FORM_SCHEMA)
+async def upload_audio_batch(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    user_info: HTTPAuthorizationCredentials = Depends(security),
+    session=Depends(db_helper.get_session),
+) -> SchBatchUploadResponse:
+    """
+    Пакетная загрузка аудиофайлов (форма multipart: files, custom_names, on_conflict):
+    custom_names[i] — имя для files[i]. Файлы принимаются из тела по мере получения,
+    публикуются в хранилище параллельно (не больше BATCH_UPLOAD_CONCURRENCY одновременно),
+    записи о них создаются одним INSERT и одним коммитом. Совпадения имён с уже загруженными
+    файлами и внутри пакета разрешаются согласно on_conflict, как у /audio/upload/.
+    Ответ содержит результат по каждому файлу; файлы, для которых запись не создана,
+    удаляет фоновая очистка, если на них нет других ссылок.
+    """
+    user_info = AuthRepo.check_current_user(user_info.credentials)
+    yandex_id = user_info["yandex_id"]
+    check_content_length(request, settings.BATCH_UPLOAD_MAX_FILES * settings.MAX_UPLOAD_SIZE)
+    user = await UserDB.get_cached_user(yandex_id, session)
+    if user is None:
+        logger.error("Пользователь с yandex_id {} не найден при пакетной загрузке", yandex_id)
+        raise HTTPException(status_code=404, detail="User not found")
+
+    form = MultipartStream(request.headers, request.stream())
+    fields: dict[str, str] = {}
+    custom_names: list[str] = []
+    # по файлу пакета: (расширение, временный файл, ошибка)
+    received: list[tuple[str, SavedAudio | None, str | None]] = []
+    free_bytes = None
+    try:
+        while (part := await form.next_part()) is not None:
+            if part.filename is None:
+                value = await form.read_text()
+                if part.name == "custom_names":
+                    custom_names.append(value)
+                else:
+                    fields[part.name] = value
+                continue
+            if part.name != "files":
+                continue
+            if len(received) >= settings.BATCH_UPLOAD_MAX_FILES:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Too many files. Maximum is {settings.BATCH_UPLOAD_MAX_FILES} per request.",
+                )
+            if not received:
+                # файлы ограничены местом, оставшимся в квоте после уже принятых файлов пакета;
+                # пакет целиком проверяется при записи в БД
+                on_conflict = get_conflict_mode(fields)
+                replaced = set(custom_names) if on_conflict == ConflictMode.OVERWRITE else ()
+                free_bytes = await UserDB.get_free_bytes(yandex_id, session, replaced=replaced)
+                await session.close()
+                if free_bytes is not None:
+                    check_content_length(request, free_bytes, QUOTA_EXCEEDED)
+            extension = get_extension(part.filename)
+            try:
+                if len(received) < len(custom_names):
+                    UARepo.check_valid_name(custom_names[len(received)])
+                UARepo.check_valid_extension(extension)
+                saved = await save_form_file(form, free_bytes)
+            except HTTPException as e:
+                received.append((extension, None, e.detail))
+                continue
+            if free_bytes is not None:
+                free_bytes -= saved.size
+            received.append((extension, saved, None))
+        if len(received) != len(custom_names):
+            raise HTTPException(status_code=400, detail="Number of files and names must match")
+        on_conflict = get_conflict_mode(fields)
+        # Аренда защищает файлы от фоновой очистки, пока записи о них не созданы
+        leased = {saved.sha256 for _, saved, _ in received if saved is not None}
+        await PurgeRepo.lease_blobs(leased, session)
+    except Exception as e:
+        for _, saved, _ in received:
+            if saved is not None:
+                await UARepo.discard_audio(saved.tmp_location)
+        raise get_receive_error(e)
+
+    semaphore = asyncio.Semaphore(settings.BATCH_UPLOAD_CONCURRENCY)
+    results = await asyncio.gather(
+        *(
+            publish_batch_file(custom_name, saved, detail, semaphore)
+            for custom_name, (_, saved, detail) in zip(custom_names, received)
+        )
+    )
+    extensions = [extension for extension, _, _ in received]
+
+    stored = [
+        (custom_name, extension, saved, blob_created)
+        for custom_name, extension, (saved, blob_created, _) in zip(custom_names, extensions, results)
+        if saved is not None
+    ]
+    audios = [
+        {
+            "filename": custom_name,
+            "file_path": UARepo.get_blob_key(saved.sha256),
+            "extension": extension,
+            "blob_hash": saved.sha256,
+            **saved.metadata.as_dict(),
+        }
+        for custom_name, extension, saved, _ in stored
+    ]
+    try:
+        created = iter(await AudioFileDB.create_audios(user.id, audios, session, on_conflict))
+    except HTTPException:
+        # записи не созданы: опубликованные этим запросом файлы удалит фоновая очистка,
+        # если на них нет ссылок
+        published = {saved.sha256 for _, _, saved, blob_created in stored if blob_created}
+        await PurgeRepo.release_blobs(leased, session, published)
+        raise
+
+    items = []
+    rejected = set()
+    for custom_name, extension, (saved, blob_created, detail) in zip(custom_names, extensions, results):
+        if saved is None:
+            items.append(SchBatchUploadItem(filename=custom_name, success=False, detail=detail))
+            continue
+        item = next(created)
+        items.append(item)
+        if not item.success:
+            if blob_created:
+                rejected.add(saved.sha256)
+            continue
+        background_tasks.add_task(WaveformRepo.generate, saved.sha256, extension)
+    await PurgeRepo.release_blobs(leased, session, rejected)
+    logger.info(
+        "Пакетная загрузка для пользователя с yandex_id {}: сохранено {} из {} файлов",
+        yandex_id,
+        sum(item.success for item in items),
+        len(received),
+    )
+    return SchBatchUploadResponse(items=items)
+
+
+async def publish_batch_file(
+    custom_name: str, saved: SavedAudio | None, detail: str | None, semaphore: asyncio.Semaphore
+) -> tuple[SavedAudio | None, bool, str | None]:
+    """
+    Проверка имени и публикация одного принятого файла пакета:
+    (файл, добавлен ли в хранилище, ошибка)
+    """
+    if saved is None:
+        return None, False, detail
+    async with semaphore:
+        try:
+            # имя могло прийти в форме после файла
+            UARepo.check_valid_name(custom_name)
+            blob_created = await UARepo.publish_audio(saved)
+        except HTTPException as e:
+            await UARepo.discard_audio(saved.tmp_location)
+            return None, False, e.detail
+        except Exception as e:
+            await UARepo.discard_audio(saved.tmp_location)
+            logger.error("Ошибка при публикации аудиофайла {}: {}", custom_name, e)
+            return None, False, "Failed to save audio."
+        return saved, blob_created, None
+
+
+async def get_upload_owner(user_info: HTTPAuthorizationCredentials, session):
+    """Пользователь из токена для эндпоинтов возобновляемой загрузки"""
+    yandex_id = AuthRepo.check_current_user(user_info.credentials)["yandex_id"]
+    user = await UserDB.get_cached_user(yandex_id, session)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
+def upload_headers(upload) -> dict:
+    return {
+        "Upload-Offset": str(upload.offset),
+        "Upload-Length": str(upload.size),
+        "Cache-Control": "no-store",
+    }
+
+
+@audio_router.post("/uploads/", status_code=201)
+async def create_upload_session(
+    data: SchUploadSessionCreate,
+    response: Response,
+    user_info: HTTPAuthorizationCredentials = Depends(security),
+    session=Depends(db_helper.get_session),
+) -> SchUploadSession:
+    """
+    Начало возобновляемой загрузки: имя файла, исходное имя (для расширения) и размер в байтах.
+    Затем данные отправляются запросами PATCH /audio/uploads/{upload_id} с заголовком Upload-Offset.
+    """
+    user = await get_upload_owner(user_info, session)
+    extension = data.filename.split(".")[-1].lower()
+    UARepo.check_valid_name(data.custom_name)
+    UARepo.check_valid_extension(extension)
+    free_bytes = await UserDB.get_free_bytes(user.yandex_id, session)
+    if free_bytes is not None and data.size > free_bytes:
+        raise HTTPException(status_code=413, detail=QUOTA_EXCEEDED)
+    upload = await UploadSessionRepo.create_session(
+        user.id, data.custom_name, extension, data.size, session
+    )
+    response.headers["Location"] = f"{audio_router.prefix}/uploads/{upload.id}"
+    return SchUploadSession.model_validate(upload)
+
+
+@audio_router.head("/uploads/{upload_id}")
+async def get_upload_offset(
+    upload_id: uuid.UUID,
+    user_info: HTTPAuthorizationCredentials = Depends(security),
+    session=Depends(db_helper.get_session),
+):
+    """Текущее смещение загрузки в заголовке Upload-Offset, с него продолжается отправка после обрыва"""
+    user = await get_upload_owner(user_info, session)
+    upload = await UploadSessionRepo.get_session(upload_id, user.id, session)
+    return Response(status_code=200, headers=upload_headers(upload))
+
+
+@audio_router.patch("/uploads/{upload_id}", status_code=204)
+async def append_upload_chunk(
+    upload_id: uuid.UUID,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    user_info: HTTPAuthorizationCredentials = Depends(security),
+    session=Depends(db_helper.get_session),
+):
+    """
+    Дозапись тела запроса с позиции Upload-Offset (должна совпадать с текущим смещением, иначе 409).
+    В ответе — новое смещение; при обрыве соединения принятая часть сохраняется.
+    """
+    user = await get_upload_owner(user_info, session)
+    upload = await UploadSessionRepo.get_session(upload_id, user.id, session)
+    upload.offset = await UploadSessionRepo.write_chunk(
+        upload, upload_offset, request.stream(), session
+    )
+    return Response(status_code=204, headers=upload_headers(upload))
+
+
+@audio_router.post("/uploads/{upload_id}/finalize")
+async def finalize_upload(
+    upload_id: uuid.UUID,
+    background_tasks: BackgroundTasks,
+    on_conflict: ConflictMode = ConflictMode.ERROR,
+    user_info: HTTPAuthorizationCredentials = Depends(security),
+    session=Depends(db_helper.get_session),
+) -> SchAudioFileResponse:
+    """
+    Завершение загрузки: проверки и сохранение как у /audio/upload/ (on_conflict — в параметре запроса).
+    Сессия удаляется после создания записи; при отказе (409, 413 и т.п.) она остаётся,
+    и завершение можно повторить, пока сессия не истечёт
+    """
+    user = await get_upload_owner(user_info, session)
+    upload = await UploadSessionRepo.get_session(upload_id, user.id, session)
+    UARepo.check_valid_name(upload.filename)
+    UARepo.check_valid_extension(upload.extension)
+    # Конфликт имени и квота проверяются до подсчёта хэша и публикации файла
+    if on_conflict == ConflictMode.ERROR and await AudioFileDB.is_name_taken(
+        user.id, upload.filename, session
+    ):
+        raise HTTPException(status_code=409, detail=FILE_EXISTS)
+    replaced = {upload.filename} if on_conflict == ConflictMode.OVERWRITE else ()
+    free_bytes = await UserDB.get_free_bytes(user.yandex_id, session, replaced=replaced)
+    if free_bytes is not None and upload.size > free_bytes:
+        raise HTTPException(status_code=413, detail=QUOTA_EXCEEDED)
+    # соединение с БД не удерживается на время подсчёта хэша
+    await session.close()
+    saved = await UploadSessionRepo.finalize(upload)
+
+    file_location = UARepo.get_blob_key(saved.sha256)
+    leased = blob_created = False
+    try:
+        await PurgeRepo.lease_blobs({saved.sha256}, session)
+        leased = True
+        blob_created = await UARepo.publish_audio(saved)
+        response = await AudioFileDB.create_audio(
+            yandex_id=user.yandex_id,
+            filename=upload.filename,
+            file_path=file_location,
+            session=session,
+            extension=upload.extension,
+            blob_hash=saved.sha256,
+            metadata=saved.metadata,
+            on_conflict=on_conflict,
+        )
+    except Exception as e:
+        # данные сессии остаются на месте: публиковалась ссылка на её файл
+        await UARepo.discard_audio(saved.tmp_location)
+        if leased:
+            discarded = {saved.sha256} if blob_created else set()
+            await PurgeRepo.release_blobs({saved.sha256}, session, discarded)
+        if isinstance(e, HTTPException):
+            raise
+        logger.error("Ошибка при завершении загрузки {}: {}", upload_id, e)
+        raise HTTPException(status_code=500, detail="Failed to save/upload audio.")
+    await UploadSessionRepo.delete_session(upload_id, session)
+    discarded = {saved.sha256} if blob_created and on_conflict == ConflictMode.SKIP else set()
+    await PurgeRepo.release_blobs({saved.sha256}, session, discarded)
+
+    logger.info("Возобновляемая загрузка {} завершена: {}", upload_id, file_location)
+    background_tasks.add_task(WaveformRepo.generate, saved.sha256, upload.extension)
+    return response
+
+
+@audio_router.delete("/uploads/{upload_id}", status_code=204)
+async def cancel_upload(
+    upload_id: uuid.UUID,
+    user_info: HTTPAuthorizationCredentials = Depends(security),
+    session=Depends(db_helper.get_session),
+):
+    """Отмена загрузки: сессия и принятые данные удаляются"""
+    user = await get_upload_owner(user_info, session)
+    await UploadSessionRepo.get_session(upload_id, user.id, session)
+    await UploadSessionRepo.delete_session(upload_id, session)
+    return Response(status_code=204)
+
+
+@audio_router.get("/search")
+async def search_audios(
+    q: str = Query(..., min_length=1, max_length=255),
+    mode: Literal["prefix", "contains"] = "contains",
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: str | None = None,
+    user_info: HTTPAuthorizationCredentials = Depends(security),
+    session=Depends(db_helper.get_session),
+) -> SchAudioFilesPage:
+    """
+    Поиск файлов пользователя по имени без учёта регистра: mode=prefix — имена, начинающиеся
+    с q (для автодополнения), mode=contains — также имена, содержащие q.
+    Совпадения по началу имени идут первыми; для следующей страницы передайте next_cursor.
+    """
+    yandex_id = AuthRepo.check_current_user(user_info.credentials)["yandex_id"]
+    user = await UserDB.get_cached_user(yandex_id, session)
+    if user is None:
+        logger.error("Пользователь с yandex_id {} не найден при поиске", yandex_id)
+        raise HTTPException(status_code=404, detail="User not found")
+    return await AudioFileDB.search_audios(
+        user.id, q, session, mode=mode, limit=limit, cursor=cursor
+    )
+
+
+@audio_router.api_route("/{audio_id}", methods=["GET", "HEAD"])
+async def download_audio(
+    audio_id: uuid.UUID,
+    request: Request,
+    user_info: HTTPAuthorizationCredentials = Depends(security),
+    session=Depends(db_helper.get_session),
+) -> Response:
+    """Скачивание аудиофайла с поддержкой Range-запросов, ETag и Last-Modified"""
+    user_info = AuthRepo.check_current_user(user_info.credentials)
+
+    audio = await AudioFileDB.get_owned_audio(audio_id, user_info["yandex_id"], session)
+    return await DARepo.get_file_response(audio, request)
+
+
+@audio_router.get("/{audio_id}/waveform")
+async def get_waveform(
+    audio_id: uuid.UUID,
+    request: Request,
+    user_info: HTTPAuthorizationCredentials = Depends(security),
+    session=Depends(db_helper.get_session),
+) -> Response:
+    """
+    Сводка пиков аудиофайла для отрисовки волны (формат описан в app/audio/waveform.py).
+    Появляется через несколько секунд после загрузки, до этого — 404.
+    """
+    user_info = AuthRepo.check_current_user(user_info.credentials)
+    audio = await AudioFileDB.get_owned_audio(audio_id, user_info["yandex_id"], session)
+    return await WaveformRepo.get_waveform_response(audio, request)
+
+
+@audio_router.delete("/{audio_id}")
+async def delete_audio(
+    audio_id: uuid.UUID,
+    user_info: HTTPAuthorizationCredentials = Depends(security),
+    session=Depends(db_helper.get_session),
+) -> SchAudioFileDeleteResponse:
+    """Удаление аудиофайла владельцем"""
+    user_info = AuthRepo.check_current_user(user_info.credentials)
+    audio = await AudioFileDB.get_owned_audio(audio_id, user_info["yandex_id"], session)
+    return await AudioFileDB.delete_audio(audio, session)
@@ -6,9 +6,12 @@ from app.repositories.auth_router_repo import AuthRepo
 from app.repositories.users_db_repo import UserDB
 from app.database.database_helper import db_helper
 from app.schemas.schemas import SchAuthResponse, SchAuthRedirectResponse
+from app.metrics.instrumented_route import InstrumentedRoute
 from app.config.logger import get_logger
 
-auth_router = APIRouter(tags=["🔐 auth"], prefix="/auth")
+auth_router = APIRouter(
+    tags=["🔐 auth"], prefix="/auth", route_class=InstrumentedRoute
+)
 logger = get_logger()
 
 
@@ -16,8 +19,8 @@ logger = get_logger()
 @auth_router.get("/yandex")
 async def yandex_auth() -> SchAuthRedirectResponse:
     """Роутер, для получения ссылки/редиректа пользователя к авторизации на Яндексе"""
-    redirect_uri = f"https://oauth.yandex.ru/authorize?response_type=code&client_id={settings.YANDEX_CLIENT_ID}"
-    logger.info(f"Отправлена ссылка на Яндекс авторизацию: {redirect_uri}")
+    redirect_uri = f"{settings.YANDEX_OAUTH_URL}/authorize?response_type=code&client_id={settings.YANDEX_CLIENT_ID}"
+    logger.info("Отправлена ссылка на Яндекс авторизацию: {}", redirect_uri)
     return SchAuthRedirectResponse(redirect_url=redirect_uri)
 
 
@@ -26,12 +29,12 @@ async def yandex_callback(
     code: str, session=Depends(db_helper.get_session)
 ) -> SchAuthResponse:
     """Роутер, для получения токенов пользователя после авторизации на Яндексе"""
-    logger.info(f"Получен код авторизации от Яндекса: {code}")
+    logger.info("Получен код авторизации от Яндекса: {}", code)
 
     token_data = await AuthRepo.get_yandex_token(code)
 
     if token_data.get("error"):
-        logger.error(f"Ошибка при получении токенов от Яндекса: {token_data.get('error')}")
+        logger.error("Ошибка при получении токенов от Яндекса: {}", token_data.get("error"))
         raise HTTPException(status_code=400, detail=token_data.get("error"))
 
     access_token = token_data.get("access_token")
@@ -40,7 +43,7 @@ async def yandex_callback(
         raise HTTPException(
             status_code=status.HTTP_400, detail="Не удалось получить токен"
         )
-    logger.info(f"Получен токен пользователя: {access_token}")
+    logger.info("Получен токен пользователя от Яндекса")
 
     user_info = await AuthRepo.get_user_info(access_token)
 
@@ -56,7 +59,7 @@ async def yandex_callback(
         "email": user_info["default_email"],
     }
 
-    logger.info(f"Получены данные пользователя: {user_data}")
+    logger.info("Получены данные пользователя: {}", user_data)
 
     new_access_token, new_refresh_token = AuthRepo.create_jwt_tokens(user_data)
 
@@ -68,7 +71,7 @@ async def yandex_callback(
     ):
         await UserDB.create_user(session=session, user_data=user_data)
         logger.info(
-            f"Пользователь с Yandex ID {user_data['yandex_id']} добавлен в базу данных."
+            "Пользователь с Yandex ID {} добавлен в базу данных.", user_data["yandex_id"]
         )
 
     return SchAuthResponse(
@@ -87,7 +90,7 @@ async def refresh_token(refr_token: str) -> SchAuthResponse:
         # Декодируем токен
         try:
             payload = jwt.decode(refr_token, settings.SECRET_KEY, algorithms=["HS256"])
-            logger.info(f"Токен декодирован успешно. Payload: {payload}")
+            logger.info("Refresh-токен декодирован успешно для пользователя с Yandex ID: {}", payload.get("yandex_id"))
         except jwt.ExpiredSignatureError:
             logger.error("Refresh token истек")
             raise HTTPException(status_code=401, detail="Refresh token истек")
@@ -103,12 +106,12 @@ async def refresh_token(refr_token: str) -> SchAuthResponse:
         type_token = payload.get("type")
 
         if not user_data["yandex_id"] or type_token != "refresh":
-            logger.error(f"Некорректный refresh_token: {refr_token}")
+            logger.error("Некорректный refresh_token")
             raise HTTPException(status_code=400, detail="Некорректный refresh_token")
 
         # Создание новых токенов
         new_access_token, new_refresh_token = AuthRepo.create_jwt_tokens(user_data)
-        logger.info(f"Созданы новые токены для пользователя с Yandex ID: {user_data['yandex_id']}")
+        logger.info("Созданы новые токены для пользователя с Yandex ID: {}", user_data["yandex_id"])
 
         # Возврат ответа
         return SchAuthResponse(
@@ -118,5 +121,5 @@ async def refresh_token(refr_token: str) -> SchAuthResponse:
         )
 
     except Exception as e:
-        logger.error(f"Ошибка при обновлении токенов: {str(e)}")
+        logger.error("Ошибка при обновлении токенов: {}", e)
         raise HTTPException(status_code=500, detail="Ошибка при обновлении токенов")
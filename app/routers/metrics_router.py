@@ -0,0 +1,22 @@
+import asyncio
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.config.app_config import settings
+from app.metrics.metrics import registry
+from app.metrics.multiprocess import render_multiprocess
+
+metrics_router = APIRouter(tags=["📈 metrics"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    """Метрики приложения в текстовом формате Prometheus; при METRICS_DIR — сумма по всем воркерам"""
+    if settings.METRICS_DIR:
+        body = await asyncio.to_thread(render_multiprocess, registry.snapshot(), settings.METRICS_DIR)
+    else:
+        body = registry.render()
+    return PlainTextResponse(body, media_type=PROMETHEUS_CONTENT_TYPE)
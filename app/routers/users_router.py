@@ -1,40 +1,73 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
+from app.config.app_config import settings
 from app.database.database_helper import db_helper
 from app.repositories.auth_router_repo import AuthRepo
 from app.repositories.users_db_repo import UserDB
 from app.schemas.schemas import (
     SchGetUser,
     SchUpdateUser,
-    SchGetAudioFile,
+    SchAudioFilesPage,
     SchUserChangeResponse,
 )
+from app.metrics.instrumented_route import InstrumentedRoute
 from app.config.logger import get_logger
 
-users_router = APIRouter(tags=["🙍‍♂️ users"], prefix="/users")
+users_router = APIRouter(
+    tags=["🙍‍♂️ users"], prefix="/users", route_class=InstrumentedRoute
+)
 
 security = HTTPBearer()
 logger = get_logger()
 
+# Ответы можно хранить только в кэше клиента и перед использованием нужно проверять по ETag
+USER_CACHE_CONTROL = "private, no-cache"
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Совпадает ли ETag с If-None-Match запроса (слабое сравнение, как требует RFC 9110)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={"etag": etag, "cache-control": USER_CACHE_CONTROL})
+
 
 @users_router.get("/get_user_info/")
 async def get_user_info(
+    request: Request,
+    response: Response,
     user_info: HTTPAuthorizationCredentials = Depends(security),
     session=Depends(db_helper.get_session),
 ) -> SchGetUser | None:
-    """Получение информации о пользователе"""
+    """
+    Получение информации о пользователе, в том числе занятого места и квоты.
+    Ответ содержит ETag; на запрос с совпадающим If-None-Match возвращается 304
+    """
     # Декодируем токен и проверяем пользователя
     user_info = AuthRepo.check_current_user(user_info.credentials)
-    user_data = await UserDB.get_user_by_yandex_id(user_info["yandex_id"], session)
-
-    if user_data is None:
-        logger.error(f"Пользователь с Yandex ID {user_info['yandex_id']} не найден.")
+    # профиль читается тем же запросом, что и версия для ETag, а не из кэша процесса
+    state = await UserDB.get_user_state(user_info["yandex_id"], session)
+    if state is None:
+        logger.error("Пользователь с Yandex ID {} не найден.", user_info["yandex_id"])
         raise HTTPException(status_code=404, detail="User not found")
+    etag = UserDB.get_etag(state.id, state.version)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
 
-    user = SchGetUser.model_validate(user_data)
+    response.headers["etag"] = etag
+    response.headers["cache-control"] = USER_CACHE_CONTROL
+    user = SchGetUser.model_validate(state)
+    user.quota_bytes = settings.USER_STORAGE_QUOTA or None
     logger.info(
-        f"Информация о пользователе с Yandex ID {user_info['yandex_id']} успешно получена."
+        "Информация о пользователе с Yandex ID {} успешно получена.", user_info["yandex_id"]
     )
     return user
 
@@ -46,33 +79,52 @@ async def change_user_info(
     session=Depends(db_helper.get_session),
 ) -> SchUserChangeResponse:
     """Изменение информации о пользователе"""
+    user_info = AuthRepo.check_current_user(user_info.credentials)
     logger.info(
-        f"Попытка изменить информацию о пользователе с Yandex ID {user_info.credentials}"
+        "Попытка изменить информацию о пользователе с Yandex ID {}", user_info["yandex_id"]
     )
-
-    user_info = AuthRepo.check_current_user(user_info.credentials)
     message = await UserDB.change_user(user_info["yandex_id"], update_data, session)
 
     logger.info(
-        f"Информация о пользователе с Yandex ID {user_info['yandex_id']} успешно обновлена."
+        "Информация о пользователе с Yandex ID {} успешно обновлена.", user_info["yandex_id"]
     )
     return message
 
 
 @users_router.get("/get_audios_list/")
 async def get_audios_list(
+    request: Request,
+    response: Response,
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: str | None = None,
+    order_by: Literal["created_at", "filename"] = "created_at",
     user_info: HTTPAuthorizationCredentials = Depends(security),
     session=Depends(db_helper.get_session),
-) -> list[SchGetAudioFile]:
-    """Получение списка аудиофайлов пользователя"""
+) -> SchAudioFilesPage:
+    """
+    Получение страницы списка аудиофайлов пользователя.
+    Для следующей страницы передайте next_cursor из ответа в параметре cursor.
+    Ответ содержит ETag; на запрос с совпадающим If-None-Match возвращается 304
+    без обращения к таблице аудиофайлов.
+    """
+    user_info = AuthRepo.check_current_user(user_info.credentials)
     logger.info(
-        f"Получение списка аудиофайлов для пользователя с Yandex ID {user_info.credentials}"
+        "Получение списка аудиофайлов для пользователя с Yandex ID {}", user_info["yandex_id"]
     )
+    if request.headers.get("if-none-match") is not None:
+        state = await UserDB.get_user_state(user_info["yandex_id"], session)
+        if state is not None:
+            etag = UserDB.get_etag(state.id, state.version)
+            if is_not_modified(request, etag):
+                return not_modified_response(etag)
 
-    user_info = AuthRepo.check_current_user(user_info.credentials)
-    audios_list = await UserDB.get_audios_list(user_info["yandex_id"], session)
+    audios_list, etag = await UserDB.get_audios_list(
+        user_info["yandex_id"], session, limit=limit, cursor=cursor, order_by=order_by
+    )
+    response.headers["etag"] = etag
+    response.headers["cache-control"] = USER_CACHE_CONTROL
 
     logger.info(
-        f"Список аудиофайлов пользователя с Yandex ID {user_info['yandex_id']} получен."
+        "Список аудиофайлов пользователя с Yandex ID {} получен.", user_info["yandex_id"]
     )
     return audios_list
@@ -1,3 +1,6 @@
+import uuid
+from datetime import datetime
+from enum import Enum
 from typing import Optional
 from pydantic import BaseModel, EmailStr, Field
 
@@ -15,6 +18,9 @@ class SchGetUser(ConfigResponse):
     username: str = Field()
     email: EmailStr
     yandex_id: str
+    # Занятое место и квота в байтах (None — без ограничения)
+    used_bytes: int = 0
+    quota_bytes: Optional[int] = None
 
 
 class SchUpdateUser(ConfigResponse):
@@ -23,15 +29,99 @@ class SchUpdateUser(ConfigResponse):
 
 
 class SchGetAudioFile(ConfigResponse):
+    id: uuid.UUID
     filename: str
     file_path: str
+    created_at: Optional[datetime] = None
+    codec: Optional[str] = None
+    duration: Optional[float] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    bitrate: Optional[int] = None
+    size: Optional[int] = None
+
+
+class SchAudioFilesPage(ConfigResponse):
+    items: list[SchGetAudioFile]
+    next_cursor: Optional[str] = None
+
+
+class ConflictMode(str, Enum):
+    """Что делать, если у пользователя уже есть файл с таким именем"""
+
+    ERROR = "error"
+    OVERWRITE = "overwrite"
+    SKIP = "skip"
+    RENAME = "rename"
 
 
 class SchAudioFileResponse(ConfigResponse):
     message: str
+    id: Optional[uuid.UUID] = None
+    filename: Optional[str] = None
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "message": "Audio file created successfully",
+                "id": "3fa85f64-5717-4562-b3fc-2c963f66afa6",
+                "filename": "my_track",
+            }
+        }
+    }
+
+
+class SchBatchUploadItem(ConfigResponse):
+    filename: str
+    success: bool
+    id: Optional[uuid.UUID] = None
+    detail: Optional[str] = None
+
+
+class SchBatchUploadResponse(ConfigResponse):
+    items: list[SchBatchUploadItem]
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "items": [
+                    {"filename": "track_01", "success": True, "id": "3fa85f64-5717-4562-b3fc-2c963f66afa6", "detail": None},
+                    {"filename": "track 02", "success": False, "id": None, "detail": "Invalid file name."},
+                ]
+            }
+        }
+    }
+
+
+class SchUploadSessionCreate(ConfigResponse):
+    custom_name: str
+    filename: str
+    size: int = Field(gt=0)
+
+
+class SchUploadSession(ConfigResponse):
+    id: uuid.UUID
+    offset: int
+    size: int
+    expires_at: datetime
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "id": "3fa85f64-5717-4562-b3fc-2c963f66afa6",
+                "offset": 0,
+                "size": 104857600,
+                "expires_at": "2025-01-02T12:00:00Z",
+            }
+        }
+    }
+
+
+class SchAudioFileDeleteResponse(ConfigResponse):
+    message: str
 
     model_config = {
-        "json_schema_extra": {"example": {"message": "Audio file created successfully"}}
+        "json_schema_extra": {"example": {"message": "Audio file deleted successfully"}}
     }
 
 
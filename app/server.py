@@ -0,0 +1,113 @@
+import asyncio
+import importlib.util
+import os
+import tempfile
+import time
+
+import uvicorn
+
+from app.config.app_config import AUDIO_STORAGE_PATH, settings
+from app.database.database_helper import db_helper
+from app.config.logger import get_logger, setup_file_logging
+from app.metrics.multiprocess import clear_snapshots
+from app.storage.file_lock import lock_file
+
+# модели регистрируются в Base.metadata при импорте; главный процесс не импортирует app.main
+from app.models.users import UserORM, AudioFileORM  # noqa: F401
+from app.models.purge import PurgeTombstoneORM, BlobLeaseORM  # noqa: F401
+from app.models.uploads import UploadSessionORM  # noqa: F401
+from app.models.schema_version import SchemaVersionORM  # noqa: F401
+
+logger = get_logger()
+
+# Главный процесс выставляет переменную после инициализации, воркеры наследуют её и инициализацию пропускают
+INITIALIZED_ENV = "AUDIO_SERVER_INITIALIZED"
+
+
+async def initialize() -> None:
+    """
+    Создание директории хранилища и приведение схемы БД к моделям; оба шага идемпотентны.
+    Если версия схемы в БД совпадает с моделями, DDL не выполняется (DBHelper.ensure_schema).
+    """
+    started = time.perf_counter()
+    logger.info("Проверка директории для сохранения аудио файлов")
+    try:
+        await asyncio.to_thread(os.makedirs, AUDIO_STORAGE_PATH, exist_ok=True)
+    except Exception as e:
+        logger.error("Ошибка при создании директории для аудио: {}", e)
+        raise Exception(f"Ошибка при создании директории для аудио: {e}")
+    await db_helper.ensure_schema()
+    logger.info("Инициализация выполнена за {:.0f} мс", (time.perf_counter() - started) * 1000)
+
+
+async def initialize_once() -> None:
+    """
+    Инициализация при старте процесса. Если её уже выполнил главный процесс (python -m app.server),
+    шаг пропускается; иначе выполняется под блокировкой INIT_LOCK_FILE, поэтому процессы,
+    запущенные одновременно, не создают таблицы наперегонки.
+    """
+    if os.environ.get(INITIALIZED_ENV) == "1":
+        logger.info("Инициализация выполнена главным процессом")
+        return
+    lock = await asyncio.to_thread(acquire_lock, settings.INIT_LOCK_FILE)
+    try:
+        await initialize()
+    finally:
+        await asyncio.to_thread(lock.close)
+
+
+def acquire_lock(path: str):
+    """Эксклюзивная блокировка файла; снимается закрытием файла или завершением процесса"""
+    lock = open(path, "a")
+    try:
+        lock_file(lock)
+    except BaseException:
+        lock.close()
+        raise
+    return lock
+
+
+def serve() -> None:
+    """
+    Продакшн-запуск: инициализация один раз в главном процессе, затем SERVER_WORKERS воркеров
+    uvicorn (по умолчанию по числу ядер) на uvloop и httptools, если они установлены.
+    Метрики воркеров объединяются через общую директорию METRICS_DIR.
+    По SIGTERM воркеры перестают принимать соединения и до SERVER_GRACEFUL_TIMEOUT секунд
+    дожидаются запросов в обработке, в том числе идущих загрузок.
+    """
+    setup_file_logging()
+    asyncio.run(initialize_and_release())
+    os.environ[INITIALIZED_ENV] = "1"
+
+    workers = settings.SERVER_WORKERS or os.cpu_count() or 1
+    if workers > 1 or settings.METRICS_DIR:
+        # метрики каждого воркера живут в его памяти: /metrics объединяет снимки всех воркеров
+        metrics_dir = settings.METRICS_DIR or tempfile.mkdtemp(prefix="fastapi_audio_server.metrics.")
+        clear_snapshots(metrics_dir)
+        os.environ["METRICS_DIR"] = metrics_dir
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    logger.info("Запуск сервера: воркеров {}, event loop {}, HTTP {}", workers, loop, http)
+    uvicorn.run(
+        "app.main:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=workers,
+        loop=loop,
+        http=http,
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.SERVER_KEEPALIVE_TIMEOUT,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT,
+    )
+
+
+async def initialize_and_release() -> None:
+    """Инициализация в главном процессе; соединения пула закрываются до запуска воркеров"""
+    try:
+        await initialize_once()
+    finally:
+        await db_helper.async_engine.dispose()
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,55 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+
+@dataclass
+class StorageStat:
+    """Сведения об объекте в хранилище"""
+
+    size: int
+    last_modified: float
+    etag: str
+
+
+class BaseStorage(ABC):
+    """
+    Интерфейс хранилища аудиофайлов.
+    Объекты адресуются ключами вида "blobs/ab/cd/<sha256>", разделитель — "/".
+    """
+
+    # Локальная директория для временных файлов загрузок
+    spool_dir: str
+
+    @abstractmethod
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes]) -> int:
+        """Запись объекта из асинхронного потока блоков, возвращает размер в байтах"""
+
+    @abstractmethod
+    async def put_file(self, key: str, local_path: str) -> None:
+        """Публикация временного файла из spool_dir под ключом key, локальный файл удаляется"""
+
+    @abstractmethod
+    def get_stream(
+        self, key: str, start: int = 0, end: int | None = None
+    ) -> AsyncIterator[bytes]:
+        """Чтение объекта блоками, start и end задают диапазон байтов [start, end)"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Удаление объекта, отсутствие объекта не является ошибкой"""
+
+    @abstractmethod
+    async def delete_prefix(self, prefix: str) -> None:
+        """Удаление всех объектов, ключи которых начинаются с prefix"""
+
+    @abstractmethod
+    async def stat(self, key: str) -> StorageStat | None:
+        """Сведения об объекте или None, если объекта нет"""
+
+    def local_path(self, key: str) -> str | None:
+        """Путь к объекту в локальной файловой системе, если хранилище его предоставляет"""
+        return None
+
+    async def close(self) -> None:
+        """Освобождение ресурсов хранилища при остановке приложения"""
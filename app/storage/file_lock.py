@@ -0,0 +1,37 @@
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: блокировка диапазона байтов через msvcrt
+    fcntl = None
+    import msvcrt
+
+# Пауза между попытками взять занятую блокировку в Windows, в секундах
+LOCK_RETRY_INTERVAL = 0.1
+
+
+def lock_file(file, blocking: bool = True) -> None:
+    """
+    Эксклюзивная блокировка открытого файла между процессами; снимается закрытием файла
+    или завершением процесса. Без blocking занятая блокировка сразу даёт BlockingIOError.
+    В POSIX используется flock, в Windows — msvcrt.locking первого байта файла
+    (позиция в файле при этом не меняется).
+    """
+    if fcntl is not None:
+        fcntl.flock(file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return
+    position = file.tell()
+    file.seek(0)
+    try:
+        # LK_LOCK сдаётся после десяти попыток, поэтому ожидание блокировки реализовано здесь
+        while True:
+            try:
+                msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+                return
+            except OSError:
+                if not blocking:
+                    raise BlockingIOError(f"Файл {file.name} заблокирован другим процессом")
+            time.sleep(LOCK_RETRY_INTERVAL)
+    finally:
+        file.seek(position)
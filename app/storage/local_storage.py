@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import uuid
+from typing import AsyncIterator
+
+from app.config.app_config import UPLOAD_CHUNK_SIZE
+from app.storage.base_storage import BaseStorage, StorageStat
+
+
+class LocalStorage(BaseStorage):
+    """Хранилище в локальной директории, все операции с диском выполняются в пуле потоков"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    @property
+    def spool_dir(self) -> str:
+        # Временные файлы лежат внутри root, чтобы публикация была атомарным переименованием
+        return os.path.join(self.root, "tmp")
+
+    def local_path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes]) -> int:
+        await asyncio.to_thread(os.makedirs, self.spool_dir, exist_ok=True)
+        tmp_location = os.path.join(self.spool_dir, f"{uuid.uuid4().hex}.part")
+        buffer = await asyncio.to_thread(open, tmp_location, "wb")
+        size = 0
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                await asyncio.to_thread(buffer.write, chunk)
+        except BaseException:
+            await asyncio.to_thread(buffer.close)
+            await asyncio.to_thread(self._remove, tmp_location)
+            raise
+        await asyncio.to_thread(buffer.close)
+        await self.put_file(key, tmp_location)
+        return size
+
+    async def put_file(self, key: str, local_path: str) -> None:
+        await asyncio.to_thread(self._replace, local_path, self.local_path(key))
+
+    @staticmethod
+    def _replace(source: str, destination: str) -> None:
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(source, destination)
+
+    async def get_stream(
+        self, key: str, start: int = 0, end: int | None = None
+    ) -> AsyncIterator[bytes]:
+        file = await asyncio.to_thread(open, self.local_path(key), "rb")
+        try:
+            await asyncio.to_thread(file.seek, start)
+            position = start
+            while end is None or position < end:
+                size = UPLOAD_CHUNK_SIZE if end is None else min(UPLOAD_CHUNK_SIZE, end - position)
+                chunk = await asyncio.to_thread(file.read, size)
+                if not chunk:
+                    break
+                position += len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(file.close)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._remove, self.local_path(key))
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    async def delete_prefix(self, prefix: str) -> None:
+        await asyncio.to_thread(self._remove_prefix, prefix)
+
+    def _remove_prefix(self, prefix: str) -> None:
+        # Префикс, оканчивающийся на "/", соответствует директории целиком
+        path = self.local_path(prefix.rstrip("/"))
+        if prefix.endswith("/"):
+            shutil.rmtree(path, ignore_errors=True)
+            return
+        directory, name_prefix = os.path.split(path)
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if name.startswith(name_prefix):
+                entry = os.path.join(directory, name)
+                if os.path.isdir(entry):
+                    shutil.rmtree(entry, ignore_errors=True)
+                else:
+                    self._remove(entry)
+
+    async def stat(self, key: str) -> StorageStat | None:
+        try:
+            stat_result = await asyncio.to_thread(os.stat, self.local_path(key))
+        except FileNotFoundError:
+            return None
+        etag_base = f"{stat_result.st_mtime}-{stat_result.st_size}"
+        return StorageStat(
+            size=stat_result.st_size,
+            last_modified=stat_result.st_mtime,
+            etag=f'"{hashlib.md5(etag_base.encode(), usedforsecurity=False).hexdigest()}"',
+        )
@@ -0,0 +1,272 @@
+import asyncio
+import os
+from typing import AsyncIterator
+
+from app.config.logger import get_logger
+from app.storage.base_storage import BaseStorage, StorageStat
+
+logger = get_logger()
+
+# Минимальный размер части multipart-загрузки в S3 (кроме последней)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3Storage(BaseStorage):
+    """
+    Хранилище в S3-совместимом сервисе.
+    Используется один клиент boto3 с пулом соединений на весь процесс, вызовы выполняются в пуле потоков.
+    Большие файлы загружаются multipart-загрузкой, части отправляются параллельно.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        spool_dir: str,
+        endpoint_url: str | None = None,
+        region_name: str | None = None,
+        access_key_id: str | None = None,
+        secret_access_key: str | None = None,
+        prefix: str = "",
+        part_size: int = 8 * 1024 * 1024,
+        max_concurrency: int = 8,
+    ):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError as e:
+            raise RuntimeError(
+                "Для STORAGE_BACKEND=s3 необходим пакет boto3: poetry install --extras s3"
+            ) from e
+
+        self.bucket = bucket
+        self.spool_dir = spool_dir
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.max_concurrency = max_concurrency
+        self.client = boto3.session.Session().client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region_name,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            config=Config(
+                max_pool_connections=max_concurrency * 2,
+                retries={"max_attempts": 3, "mode": "standard"},
+            ),
+        )
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes]) -> int:
+        buffer = bytearray()
+        size = 0
+        upload_id = None
+        parts: list[asyncio.Task] = []
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                size += len(chunk)
+                while len(buffer) >= self.part_size:
+                    if upload_id is None:
+                        upload_id = await self._create_multipart_upload(key)
+                    body = bytes(buffer[: self.part_size])
+                    del buffer[: self.part_size]
+                    # Ограничиваем число частей в полёте, чтобы память не росла с размером файла
+                    await semaphore.acquire()
+                    parts.append(
+                        asyncio.create_task(
+                            self._upload_part_released(
+                                semaphore, key, upload_id, len(parts) + 1, body
+                            )
+                        )
+                    )
+            if upload_id is None:
+                await asyncio.to_thread(
+                    self.client.put_object,
+                    Bucket=self.bucket,
+                    Key=self._key(key),
+                    Body=bytes(buffer),
+                )
+                return size
+            if buffer:
+                await semaphore.acquire()
+                parts.append(
+                    asyncio.create_task(
+                        self._upload_part_released(
+                            semaphore, key, upload_id, len(parts) + 1, bytes(buffer)
+                        )
+                    )
+                )
+            etags = await asyncio.gather(*parts)
+            await self._complete_multipart_upload(key, upload_id, etags)
+            return size
+        except BaseException:
+            for task in parts:
+                task.cancel()
+            if upload_id is not None:
+                await self._abort_multipart_upload(key, upload_id)
+            raise
+
+    async def put_file(self, key: str, local_path: str) -> None:
+        size = await asyncio.to_thread(os.path.getsize, local_path)
+        try:
+            if size <= self.part_size:
+                await asyncio.to_thread(self._put_small_file, key, local_path)
+            else:
+                await self._put_large_file(key, local_path, size)
+        finally:
+            await asyncio.to_thread(self._remove, local_path)
+
+    def _put_small_file(self, key: str, local_path: str) -> None:
+        with open(local_path, "rb") as file:
+            self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=file)
+
+    async def _put_large_file(self, key: str, local_path: str, size: int) -> None:
+        upload_id = await self._create_multipart_upload(key)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def upload(part_number: int, offset: int) -> str:
+            # Каждая часть читается из файла по своему смещению, поэтому части загружаются независимо
+            async with semaphore:
+                body = await asyncio.to_thread(
+                    self._read_range, local_path, offset, self.part_size
+                )
+                return await self._upload_part(key, upload_id, part_number, body)
+
+        try:
+            etags = await asyncio.gather(
+                *(
+                    upload(number, offset)
+                    for number, offset in enumerate(range(0, size, self.part_size), start=1)
+                )
+            )
+            await self._complete_multipart_upload(key, upload_id, etags)
+        except BaseException:
+            await self._abort_multipart_upload(key, upload_id)
+            raise
+
+    @staticmethod
+    def _read_range(local_path: str, offset: int, size: int) -> bytes:
+        with open(local_path, "rb") as file:
+            file.seek(offset)
+            return file.read(size)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    async def _create_multipart_upload(self, key: str) -> str:
+        response = await asyncio.to_thread(
+            self.client.create_multipart_upload, Bucket=self.bucket, Key=self._key(key)
+        )
+        return response["UploadId"]
+
+    async def _upload_part(
+        self, key: str, upload_id: str, part_number: int, body: bytes
+    ) -> str:
+        response = await asyncio.to_thread(
+            self.client.upload_part,
+            Bucket=self.bucket,
+            Key=self._key(key),
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        return response["ETag"]
+
+    async def _upload_part_released(
+        self,
+        semaphore: asyncio.Semaphore,
+        key: str,
+        upload_id: str,
+        part_number: int,
+        body: bytes,
+    ) -> str:
+        try:
+            return await self._upload_part(key, upload_id, part_number, body)
+        finally:
+            semaphore.release()
+
+    async def _complete_multipart_upload(
+        self, key: str, upload_id: str, etags: list[str]
+    ) -> None:
+        await asyncio.to_thread(
+            self.client.complete_multipart_upload,
+            Bucket=self.bucket,
+            Key=self._key(key),
+            UploadId=upload_id,
+            MultipartUpload={
+                "Parts": [
+                    {"ETag": etag, "PartNumber": number}
+                    for number, etag in enumerate(etags, start=1)
+                ]
+            },
+        )
+
+    async def _abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        try:
+            await asyncio.to_thread(
+                self.client.abort_multipart_upload,
+                Bucket=self.bucket,
+                Key=self._key(key),
+                UploadId=upload_id,
+            )
+        except Exception as e:
+            logger.error("Не удалось отменить multipart-загрузку {}: {}", upload_id, e)
+
+    async def get_stream(
+        self, key: str, start: int = 0, end: int | None = None
+    ) -> AsyncIterator[bytes]:
+        params = {"Bucket": self.bucket, "Key": self._key(key)}
+        if start or end is not None:
+            params["Range"] = f"bytes={start}-{'' if end is None else end - 1}"
+        response = await asyncio.to_thread(self.client.get_object, **params)
+        body = response["Body"]
+        try:
+            while chunk := await asyncio.to_thread(body.read, self.part_size // 8):
+                yield chunk
+        finally:
+            await asyncio.to_thread(body.close)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(
+            self.client.delete_object, Bucket=self.bucket, Key=self._key(key)
+        )
+
+    async def delete_prefix(self, prefix: str) -> None:
+        await asyncio.to_thread(self._delete_prefix, prefix)
+
+    def _delete_prefix(self, prefix: str) -> None:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            objects = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+            if objects:
+                # list_objects_v2 отдаёт не более 1000 ключей, столько же принимает delete_objects
+                self.client.delete_objects(
+                    Bucket=self.bucket, Delete={"Objects": objects, "Quiet": True}
+                )
+
+    async def stat(self, key: str) -> StorageStat | None:
+        from botocore.exceptions import ClientError
+
+        try:
+            response = await asyncio.to_thread(
+                self.client.head_object, Bucket=self.bucket, Key=self._key(key)
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return StorageStat(
+            size=response["ContentLength"],
+            last_modified=response["LastModified"].timestamp(),
+            etag=response["ETag"],
+        )
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self.client.close)
@@ -0,0 +1,29 @@
+import os
+
+from app.config.app_config import AUDIO_STORAGE_PATH, settings
+from app.storage.base_storage import BaseStorage
+from app.storage.local_storage import LocalStorage
+
+
+def create_storage() -> BaseStorage:
+    """Создание хранилища аудиофайлов по настройке STORAGE_BACKEND"""
+    if settings.STORAGE_BACKEND == "local":
+        return LocalStorage(AUDIO_STORAGE_PATH)
+    if settings.STORAGE_BACKEND == "s3":
+        from app.storage.s3_storage import S3Storage
+
+        return S3Storage(
+            bucket=settings.S3_BUCKET,
+            spool_dir=os.path.join(AUDIO_STORAGE_PATH, "tmp"),
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region_name=settings.S3_REGION,
+            access_key_id=settings.S3_ACCESS_KEY_ID,
+            secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            prefix=settings.S3_PREFIX,
+            part_size=settings.S3_PART_SIZE,
+            max_concurrency=settings.S3_MAX_CONCURRENCY,
+        )
+    raise ValueError(f"Неизвестное хранилище: {settings.STORAGE_BACKEND}")
+
+
+storage = create_storage()
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.config.app_config import settings
+from app.database.database_helper import DBHelper, db_helper
+from app.main import app
+
+from app.tests.benchmarks.harness import (
+    ENABLED,
+    BASELINE_PATH,
+    RESULTS_PATH,
+    UPDATE_BASELINE,
+    BenchmarkResults,
+)
+
+
+@pytest.fixture(autouse=True)
+def require_benchmark_mode():
+    if not ENABLED:
+        pytest.skip("бенчмарки запускаются с BENCHMARK=1")
+
+
+@pytest.fixture(autouse=True)
+def no_upload_limits(monkeypatch):
+    """Бенчмарки меряют пропускную способность, лимиты допуска загрузок в них отключены"""
+    monkeypatch.setattr(settings, "UPLOAD_MAX_WRITERS", 0)
+    monkeypatch.setattr(settings, "UPLOAD_RATE_LIMIT", 0)
+
+
+@pytest.fixture(scope="session")
+def benchmark_session():
+    """Общие результаты всех бенчмарков; по окончании прогона записываются в RESULTS_PATH"""
+    baseline = {}
+    if BASELINE_PATH.exists():
+        baseline = json.loads(BASELINE_PATH.read_text())["metrics"]
+    results = BenchmarkResults(baseline)
+    yield results
+    if not results.metrics:
+        return
+    report = json.dumps(results.dump(), indent=2, ensure_ascii=False)
+    RESULTS_PATH.write_text(report)
+    if UPDATE_BASELINE:
+        BASELINE_PATH.write_text(report)
+
+
+@pytest.fixture
+def benchmark(benchmark_session):
+    """Результаты бенчмарков; в конце теста проверяет, нет ли ухудшений"""
+    yield benchmark_session
+    benchmark_session.check()
+
+
+@pytest_asyncio.fixture
+async def file_db(tmp_path):
+    """
+    Файловая SQLite в режиме WAL для параллельной нагрузки: in-memory база тестов
+    работает через одно соединение, и параллельные транзакции в ней мешают друг другу
+    """
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'benchmark.db'}", connect_args={"timeout": 30}
+    )
+
+    def enable_wal(connection, _):
+        connection.execute("PRAGMA journal_mode=WAL")
+
+    event.listen(engine.sync_engine, "connect", enable_wal)
+    session_maker = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+    helper = DBHelper(engine, session_maker)
+    await helper.create_all()
+    previous = app.dependency_overrides[db_helper.get_session]
+    app.dependency_overrides[db_helper.get_session] = helper.get_session
+    yield session_maker
+    app.dependency_overrides[db_helper.get_session] = previous
+    await engine.dispose()
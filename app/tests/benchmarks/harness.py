@@ -0,0 +1,123 @@
+import os
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Бенчмарки запускаются только явно: BENCHMARK=1 pytest app/tests/benchmarks
+ENABLED = os.getenv("BENCHMARK") == "1"
+# quick — размеры для регулярной проверки, full — до 1 ГБ загрузки и 100 тыс. файлов у пользователя
+SCALE = os.getenv("BENCHMARK_SCALE", "quick")
+# Результаты прогона в JSON и сохранённый в репозитории базовый прогон
+RESULTS_PATH = Path(os.getenv("BENCHMARK_RESULTS", "benchmark_results.json"))
+BASELINE_PATH = Path(
+    os.getenv("BENCHMARK_BASELINE", Path(__file__).with_name("baseline.json"))
+)
+# Допустимое ухудшение относительно базового прогона (0.5 — на 50%)
+THRESHOLD = float(os.getenv("BENCHMARK_THRESHOLD", "0.5"))
+# BENCHMARK_UPDATE_BASELINE=1 перезаписывает базовый прогон результатами текущего
+UPDATE_BASELINE = os.getenv("BENCHMARK_UPDATE_BASELINE") == "1"
+
+KB = 1024
+MB = 1024 * KB
+GB = 1024 * MB
+# Размеры загружаемых файлов и число файлов у пользователя для замеров списка
+UPLOAD_SIZES = {
+    "quick": [KB, MB, 16 * MB],
+    "full": [KB, MB, 64 * MB, GB],
+}[SCALE]
+AUDIOS_COUNTS = {
+    "quick": [10, 1000],
+    "full": [10, 1000, 10_000, 100_000],
+}[SCALE]
+# Число запросов на замер задержки и операций в смешанной нагрузке
+LATENCY_REQUESTS = {"quick": 200, "full": 1000}[SCALE]
+MIXED_OPERATIONS = {"quick": 400, "full": 4000}[SCALE]
+MIXED_CONCURRENCY = 16
+
+
+def size_label(size: int) -> str:
+    for unit, name in ((GB, "gb"), (MB, "mb"), (KB, "kb")):
+        if size >= unit:
+            return f"{size // unit}{name}"
+    return f"{size}b"
+
+
+def percentile(values: list[float], q: int) -> float:
+    """Перцентиль q (1–99) выборки с линейной интерполяцией"""
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+class Timer:
+    """Замер длительности блока через time.perf_counter"""
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+
+
+class BenchmarkResults:
+    """
+    Результаты прогона: имя метрики -> значение, единица и направление
+    (больше — лучше для пропускной способности, меньше — для задержек).
+    Метрика сразу сравнивается с базовым прогоном: ухудшение больше THRESHOLD
+    роняет тест. Метрики, которых нет в базовом прогоне, и метрики с gated=False
+    (p99 внутри одного процесса слишком шумный) только записываются.
+    """
+
+    def __init__(self, baseline: dict):
+        self.baseline = baseline
+        self.metrics: dict[str, dict] = {}
+        self.regressions: list[str] = []
+
+    def record(
+        self,
+        name: str,
+        value: float,
+        unit: str,
+        higher_is_better: bool = False,
+        gated: bool = True,
+    ) -> None:
+        self.metrics[name] = {
+            "value": round(value, 6),
+            "unit": unit,
+            "higher_is_better": higher_is_better,
+            "gated": gated,
+        }
+        base = self.baseline.get(name)
+        if base is None or not gated or UPDATE_BASELINE:
+            return
+        if higher_is_better:
+            regressed = value < base["value"] * (1 - THRESHOLD)
+        else:
+            regressed = value > base["value"] * (1 + THRESHOLD)
+        if regressed:
+            self.regressions.append(
+                f"{name}: {value:.6g} {unit} против {base['value']:.6g} {unit} в базовом прогоне"
+            )
+
+    def record_latencies(self, name: str, samples: list[float]) -> None:
+        """p50 и p99 задержки в миллисекундах"""
+        samples = [sample * 1000 for sample in samples]
+        self.record(f"{name}.p50", percentile(samples, 50), "ms")
+        self.record(f"{name}.p99", percentile(samples, 99), "ms", gated=False)
+
+    def check(self) -> None:
+        regressions, self.regressions = self.regressions, []
+        assert not regressions, "Ухудшение относительно базового прогона:\n" + "\n".join(regressions)
+
+    def dump(self) -> dict:
+        return {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "scale": SCALE,
+            "threshold": THRESHOLD,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "metrics": self.metrics,
+        }
@@ -0,0 +1,125 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import insert
+
+from app.models.users import AudioFileORM
+from app.tests.benchmarks.harness import AUDIOS_COUNTS, LATENCY_REQUESTS, Timer
+
+INSERT_BATCH = 10_000
+
+
+async def create_audios(user, count: int, session) -> None:
+    """Записи об аудиофайлах пользователя пачками по INSERT_BATCH строк"""
+    started = datetime.now(timezone.utc)
+    for start in range(0, count, INSERT_BATCH):
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "user_id": user.id,
+                "filename": f"track_{i:06d}",
+                "file_path": f"blobs/00/00/{i:064d}",
+                "extension": "mp3",
+                "blob_hash": f"{i:064d}",
+                "created_at": started - timedelta(seconds=i),
+            }
+            for i in range(start, min(start + INSERT_BATCH, count))
+        ]
+        await session.execute(insert(AudioFileORM), rows)
+    await session.commit()
+
+
+async def middle_cursor(async_client: AsyncClient, headers: dict, order_by: str, count: int):
+    """Курсор страницы примерно из середины списка (None, если список короче одной страницы)"""
+    params = {"limit": 500, "order_by": order_by}
+    cursor, seen = None, 0
+    while seen < count // 2:
+        response = await async_client.get("/users/get_audios_list/", headers=headers, params=params)
+        page = response.json()
+        seen += len(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+        params["cursor"] = cursor
+    return cursor
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("count", AUDIOS_COUNTS)
+@pytest.mark.parametrize("order_by", ["created_at", "filename"])
+async def test_get_audios_list_latency(
+    async_client: AsyncClient,
+    valid_test_access_token,
+    test_user,
+    db_session,
+    benchmark,
+    count,
+    order_by,
+):
+    """
+    Задержка /users/get_audios_list/ у пользователя с count файлами: первая страница, страница
+    из середины и повторный опрос первой страницы с If-None-Match (ответ 304)
+    """
+    await create_audios(test_user, count, db_session)
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    params = {"limit": 50, "order_by": order_by}
+    pages = {"first_page": params}
+    cursor = await middle_cursor(async_client, headers, order_by, count)
+    if cursor is not None:
+        pages["middle_page"] = {**params, "cursor": cursor}
+
+    for name, page_params in pages.items():
+        elapsed = []
+        for _ in range(LATENCY_REQUESTS):
+            with Timer() as timer:
+                response = await async_client.get(
+                    "/users/get_audios_list/", headers=headers, params=page_params
+                )
+            assert response.status_code == 200
+            elapsed.append(timer.elapsed)
+        benchmark.record_latencies(f"audios_list.{count}.{order_by}.{name}", elapsed)
+
+    response = await async_client.get("/users/get_audios_list/", headers=headers, params=params)
+    conditional_headers = {**headers, "If-None-Match": response.headers["etag"]}
+    elapsed = []
+    for _ in range(LATENCY_REQUESTS):
+        with Timer() as timer:
+            response = await async_client.get(
+                "/users/get_audios_list/", headers=conditional_headers, params=params
+            )
+        assert response.status_code == 304
+        elapsed.append(timer.elapsed)
+    benchmark.record_latencies(f"audios_list.{count}.{order_by}.not_modified", elapsed)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("count", AUDIOS_COUNTS)
+@pytest.mark.parametrize(
+    "name, params",
+    [
+        ("prefix", {"q": "TRACK_0001", "mode": "prefix"}),
+        ("contains", {"q": "0_05", "mode": "contains"}),
+    ],
+)
+async def test_search_audios_latency(
+    async_client: AsyncClient,
+    valid_test_access_token,
+    test_user,
+    db_session,
+    benchmark,
+    count,
+    name,
+    params,
+):
+    """Задержка /audio/search у пользователя с count файлами: автодополнение и поиск подстроки"""
+    await create_audios(test_user, count, db_session)
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    elapsed = []
+    for _ in range(LATENCY_REQUESTS):
+        with Timer() as timer:
+            response = await async_client.get("/audio/search", headers=headers, params=params)
+        assert response.status_code == 200
+        elapsed.append(timer.elapsed)
+    benchmark.record_latencies(f"audios_search.{count}.{name}", elapsed)
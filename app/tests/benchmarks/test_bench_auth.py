@@ -0,0 +1,53 @@
+import time
+
+import pytest
+from httpx import AsyncClient
+
+from app.repositories.auth_router_repo import AuthRepo, token_cache
+from app.tests.benchmarks.harness import LATENCY_REQUESTS, Timer
+
+# Число проверок в раунде: проверка подписи стоит десятки микросекунд, попадание в кэш — единицы
+CHECKS = {"uncached": 2_000, "cached": 50_000}
+# Микрозамеры повторяются, берётся лучший результат: он меньше всего зависит от соседней нагрузки
+ROUNDS = 5
+
+
+def best_per_call(check, mode: str) -> float:
+    """Лучшее по ROUNDS раундам среднее время одного вызова в микросекундах"""
+    checks, best = CHECKS[mode], float("inf")
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        for _ in range(checks):
+            if mode == "uncached":
+                token_cache.clear()
+            check()
+        best = min(best, (time.perf_counter() - started) / checks * 1e6)
+    return best
+
+
+@pytest.mark.asyncio
+async def test_auth_overhead(
+    async_client: AsyncClient, valid_test_access_token, test_user, benchmark
+):
+    """
+    Стоимость авторизации: проверка токена с подписью и из token_cache,
+    и задержка защищённого эндпоинта рядом с открытым
+    """
+    def check():
+        AuthRepo.check_current_user(valid_test_access_token)
+
+    for mode in CHECKS:
+        benchmark.record(f"auth.check_token.{mode}", best_per_call(check, mode), "us")
+
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    for name, url, request_headers in (
+        ("public", "/auth/yandex", {}),
+        ("protected", "/users/get_user_info/", headers),
+        ("rejected", "/users/get_user_info/", {"Authorization": "Bearer invalid"}),
+    ):
+        elapsed = []
+        for _ in range(LATENCY_REQUESTS):
+            with Timer() as timer:
+                await async_client.get(url, headers=request_headers)
+            elapsed.append(timer.elapsed)
+        benchmark.record_latencies(f"auth.http.{name}", elapsed)
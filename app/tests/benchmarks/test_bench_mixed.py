@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import itertools
+import os
+import random
+import time
+from datetime import datetime, timedelta, UTC
+
+import jwt
+import pytest
+from httpx import AsyncClient
+
+from app.config.app_config import settings
+from app.models.users import UserORM
+from app.tests.benchmarks.harness import MIXED_CONCURRENCY, MIXED_OPERATIONS, KB
+from app.tests.benchmarks.test_bench_audios_list import create_audios
+
+
+@pytest.mark.asyncio
+async def test_mixed_workload(
+    async_client: AsyncClient,
+    valid_test_access_token,
+    file_db,
+    storage_path,
+    benchmark,
+):
+    """
+    Смешанная нагрузка из MIXED_CONCURRENCY параллельных клиентов:
+    70% чтений списка, 20% скачиваний диапазона, 10% загрузок по 64 КБ
+    """
+    async with file_db() as session:
+        user = UserORM(yandex_id="43141123123", username="test_user", email="test@example.com")
+        session.add(user)
+        await session.commit()
+        await create_audios(user, 1000, session)
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    content = b"ID3" + os.urandom(64 * KB)
+    response = await async_client.post(
+        "/audio/upload/",
+        headers=headers,
+        data={"custom_name": "seed"},
+        files={"file": ("seed.mp3", content, "audio/mpeg")},
+    )
+    assert response.status_code == 200
+    page = (
+        await async_client.get(
+            "/users/get_audios_list/", headers=headers, params={"order_by": "filename", "limit": 500}
+        )
+    ).json()
+    audio_id = next(item["id"] for item in page["items"] if item["filename"] == "seed")
+
+    rng = random.Random(0)
+    operations = rng.choices(["list", "download", "upload"], weights=[7, 2, 1], k=MIXED_OPERATIONS)
+    queue = iter(enumerate(operations))
+    elapsed = {name: [] for name in ("list", "download", "upload")}
+    counter = itertools.count()
+
+    async def client():
+        for i, operation in queue:
+            started = time.perf_counter()
+            if operation == "list":
+                response = await async_client.get("/users/get_audios_list/", headers=headers)
+            elif operation == "download":
+                response = await async_client.get(
+                    f"/audio/{audio_id}", headers={**headers, "Range": "bytes=0-16383"}
+                )
+            else:
+                body = hashlib.sha256(str(i).encode()).digest() + content
+                response = await async_client.post(
+                    "/audio/upload/",
+                    headers=headers,
+                    data={"custom_name": f"mixed_{next(counter)}"},
+                    files={"file": ("mixed.mp3", body, "audio/mpeg")},
+                )
+            assert response.status_code in (200, 206)
+            elapsed[operation].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(MIXED_CONCURRENCY)))
+    total = time.perf_counter() - started
+
+    benchmark.record("mixed.throughput", MIXED_OPERATIONS / total, "ops/s", True)
+    for name, samples in elapsed.items():
+        if samples:
+            benchmark.record_latencies(f"mixed.{name}", samples)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("limited", [False, True], ids=["unlimited", "limited"])
+async def test_abusive_uploader(
+    async_client: AsyncClient,
+    valid_test_access_token,
+    file_db,
+    storage_path,
+    benchmark,
+    monkeypatch,
+    limited,
+):
+    """
+    Один пользователь загружает файлы из MIXED_CONCURRENCY * 2 параллельных клиентов,
+    другой в это время читает список: задержка второго без лимитов допуска и с ними
+    """
+    if limited:
+        monkeypatch.setattr(settings, "UPLOAD_MAX_WRITERS", 4)
+        monkeypatch.setattr(settings, "UPLOAD_RATE_LIMIT", 5)
+        monkeypatch.setattr(settings, "UPLOAD_RATE_BURST", 10)
+    async with file_db() as session:
+        abuser = UserORM(yandex_id="43141123123", username="abuser", email="abuser@example.com")
+        victim = UserORM(yandex_id="victim", username="victim", email="victim@example.com")
+        session.add_all([abuser, victim])
+        await session.commit()
+        await create_audios(victim, 1000, session)
+    abuser_headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    victim_token = jwt.encode(
+        {
+            "yandex_id": "victim",
+            "exp": datetime.now(UTC) + timedelta(hours=1),
+            "type": "access",
+        },
+        settings.SECRET_KEY,
+        algorithm="HS256",
+    )
+    victim_headers = {"Authorization": f"Bearer {victim_token}"}
+    content = b"ID3" + os.urandom(256 * KB)
+    counter = itertools.count()
+    statuses = []
+    done = asyncio.Event()
+
+    async def abuser_client():
+        while not done.is_set():
+            response = await async_client.post(
+                "/audio/upload/",
+                headers=abuser_headers,
+                data={"custom_name": f"flood_{next(counter)}"},
+                files={"file": ("flood.mp3", content, "audio/mpeg")},
+            )
+            statuses.append(response.status_code)
+            if response.status_code == 429:
+                await asyncio.sleep(0.01)
+
+    flood = [asyncio.create_task(abuser_client()) for _ in range(MIXED_CONCURRENCY * 2)]
+    elapsed = []
+    for _ in range(MIXED_OPERATIONS // 4):
+        started = time.perf_counter()
+        response = await async_client.get("/users/get_audios_list/", headers=victim_headers)
+        assert response.status_code == 200
+        elapsed.append(time.perf_counter() - started)
+    done.set()
+    await asyncio.gather(*flood)
+
+    assert set(statuses) <= {200, 429}
+    name = "limited" if limited else "unlimited"
+    benchmark.record_latencies(f"abuse.{name}.victim_list", elapsed)
+    benchmark.record(f"abuse.{name}.rejected", statuses.count(429), "requests", gated=False)
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+from httpx import AsyncClient
+
+from app.config.app_config import settings
+from app.tests.benchmarks.harness import UPLOAD_SIZES, MB, Timer, size_label
+
+
+def write_audio(path, size: int) -> None:
+    """Файл заданного размера: заголовок ID3 и повторяющийся случайный блок"""
+    block = os.urandom(min(size, MB))
+    with open(path, "wb") as buffer:
+        buffer.write(b"ID3")
+        written = 3
+        while written < size:
+            written += buffer.write(block[: size - written])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("size", UPLOAD_SIZES, ids=size_label)
+async def test_upload_throughput(
+    async_client: AsyncClient,
+    valid_test_access_token,
+    test_user,
+    storage_path,
+    tmp_path,
+    monkeypatch,
+    benchmark,
+    size,
+):
+    """Пропускная способность /audio/upload/ для файлов разного размера"""
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", max(settings.MAX_UPLOAD_SIZE, size))
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    source = tmp_path / "source.mp3"
+    write_audio(source, size)
+    # мелкие файлы загружаются много раз, чтобы замер не тонул в погрешности
+    repeats = max(1, min(50, 64 * MB // size))
+
+    elapsed = []
+    for i in range(repeats):
+        with open(source, "rb") as buffer, Timer() as timer:
+            response = await async_client.post(
+                "/audio/upload/",
+                headers=headers,
+                data={"custom_name": f"track_{i}"},
+                files={"file": ("track.mp3", buffer, "audio/mpeg")},
+            )
+        assert response.status_code == 200
+        elapsed.append(timer.elapsed)
+
+    label = size_label(size)
+    benchmark.record(f"upload.{label}.throughput", size * repeats / sum(elapsed) / MB, "MB/s", True)
+    benchmark.record_latencies(f"upload.{label}.latency", elapsed)
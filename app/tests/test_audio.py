@@ -0,0 +1,676 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+from httpx import AsyncClient
+from sqlalchemy import event, select, text, update
+
+from app.config.app_config import UPLOAD_CHUNK_SIZE, settings
+from app.models.purge import BlobLeaseORM
+from app.models.users import AudioFileORM
+from app.repositories.audio_db_repo import AudioFileDB, SEARCH_UPPER_BOUND
+from app.repositories.purge_repo import PurgeRepo, BLOB
+from app.repositories.upload_audio_repo import UARepo, QUOTA_EXCEEDED
+from app.storage.storage_helper import storage
+
+
+async def iter_chunks(content: bytes, chunk_size: int = 64 * 1024):
+    """Содержимое блоками, как его отдаёт разбор тела запроса"""
+    for start in range(0, len(content), chunk_size):
+        yield content[start:start + chunk_size]
+
+
+@pytest.mark.asyncio
+async def test_save_audio_streams_to_temp_file(storage_path):
+    """Файл сохраняется во временный файл и появляется в хранилище только после публикации"""
+    content = b"\x00\x01" * 300_000
+
+    saved = await UARepo.save_audio(iter_chunks(content))
+
+    assert saved.size == len(content)
+    assert saved.sha256 == hashlib.sha256(content).hexdigest()
+    assert await UARepo.publish_audio(saved) is True
+    with open(storage.local_path(UARepo.get_blob_key(saved.sha256)), "rb") as blob:
+        assert blob.read() == content
+    assert list((storage_path / "tmp").iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_save_audio_rejects_too_large_file(storage_path, monkeypatch):
+    """Превышение MAX_UPLOAD_SIZE прерывает загрузку с ошибкой 413 и не оставляет временных файлов"""
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 1024)
+    with pytest.raises(HTTPException) as exc:
+        await UARepo.save_audio(iter_chunks(b"a" * 4096, chunk_size=512))
+
+    assert exc.value.status_code == 413
+    assert list((storage_path / "tmp").iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_upload_audio_rejected_before_body_is_received(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path, monkeypatch
+):
+    """
+    Тело формы разбирается по мере получения: файл сверх MAX_UPLOAD_SIZE отклоняется,
+    пока клиент ещё отправляет данные, а заявленный слишком большой Content-Length — до чтения тела
+    """
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 2 * UPLOAD_CHUNK_SIZE)
+    headers = {
+        "Authorization": f"Bearer {valid_test_access_token}",
+        "Content-Type": "multipart/form-data; boundary=xyz",
+    }
+    sent = []
+
+    async def body():
+        yield b'--xyz\r\nContent-Disposition: form-data; name="custom_name"\r\n\r\nendless\r\n'
+        yield b'--xyz\r\nContent-Disposition: form-data; name="file"; filename="a.mp3"\r\n\r\n'
+        for _ in range(100):
+            sent.append(UPLOAD_CHUNK_SIZE)
+            yield b"a" * UPLOAD_CHUNK_SIZE
+        yield b"\r\n--xyz--\r\n"
+
+    response = await async_client.post("/audio/upload/", headers=headers, content=body())
+    assert response.status_code == 413
+    assert len(sent) == 3
+    assert [p for p in storage_path.rglob("*") if p.is_file()] == []
+
+    sent.clear()
+    response = await async_client.post(
+        "/audio/upload/",
+        headers={**headers, "Content-Length": str(100 * UPLOAD_CHUNK_SIZE)},
+        content=body(),
+    )
+    assert response.status_code == 413
+    assert sent == []
+
+
+@pytest.mark.asyncio
+async def test_upload_audio_form_fields_after_file(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path
+):
+    """Поля формы можно отправить и после файла; без custom_name загрузка отклоняется"""
+    headers = {
+        "Authorization": f"Bearer {valid_test_access_token}",
+        "Content-Type": "multipart/form-data; boundary=xyz",
+    }
+    file_part = (
+        b'--xyz\r\nContent-Disposition: form-data; name="file"; filename="a.mp3"\r\n'
+        b"Content-Type: audio/mpeg\r\n\r\nID3late\r\n"
+    )
+    name_part = b'--xyz\r\nContent-Disposition: form-data; name="custom_name"\r\n\r\nlate\r\n'
+
+    response = await async_client.post(
+        "/audio/upload/", headers=headers, content=file_part + name_part + b"--xyz--\r\n"
+    )
+    assert response.status_code == 200
+    assert response.json()["filename"] == "late"
+
+    response = await async_client.post(
+        "/audio/upload/", headers=headers, content=file_part + b"--xyz--\r\n"
+    )
+    assert response.status_code == 422
+    assert list((storage_path / "tmp").iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_upload_audio(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path
+):
+    """Загрузка аудиофайла сохраняет его в контентно-адресуемом хранилище"""
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    content = b"ID3" + b"\x00" * 1024
+    response = await async_client.post(
+        "/audio/upload/",
+        headers=headers,
+        data={"custom_name": "my_track"},
+        files={"file": ("song.mp3", content, "audio/mpeg")},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["message"] == "Audio file created successfully"
+    blob_location = storage.local_path(UARepo.get_blob_key(hashlib.sha256(content).hexdigest()))
+    assert os.path.isfile(blob_location)
+
+
+@pytest.mark.asyncio
+async def test_duplicate_uploads_share_one_blob(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path, purge_worker
+):
+    """Одинаковые файлы хранятся один раз и удаляются вместе с последней ссылкой"""
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    content = b"fLaC" + b"\x07" * 2048
+    for name in ("first", "second"):
+        response = await async_client.post(
+            "/audio/upload/",
+            headers=headers,
+            data={"custom_name": name},
+            files={"file": ("song.flac", content, "audio/flac")},
+        )
+        assert response.status_code == 200
+
+    blob_location = storage.local_path(UARepo.get_blob_key(hashlib.sha256(content).hexdigest()))
+    blobs = [p for p in (storage_path / "blobs").rglob("*") if p.is_file()]
+    assert len(blobs) == 1
+
+    audios = (await async_client.get("/users/get_audios_list/", headers=headers)).json()["items"]
+    response = await async_client.delete(f"/audio/{audios[0]['id']}", headers=headers)
+    assert response.status_code == 200
+    await purge_worker.purge_all()
+    assert os.path.isfile(blob_location)
+
+    response = await async_client.delete(f"/audio/{audios[1]['id']}", headers=headers)
+    assert response.status_code == 200
+    assert os.path.isfile(blob_location)
+    await purge_worker.purge_all()
+    assert not os.path.isfile(blob_location)
+
+
+@pytest.mark.asyncio
+async def test_purge_waits_for_blob_lease(db_session, storage_path, purge_worker):
+    """
+    Файл, который загрузка нашла в хранилище и на который ещё не сослалась, очистка не удаляет:
+    удаление откладывается до снятия аренды. Истёкшая аренда очистке не мешает.
+    """
+    saved = await UARepo.save_audio(iter_chunks(b"ID3leased"))
+    await UARepo.publish_audio(saved)
+    blob_location = storage.local_path(UARepo.get_blob_key(saved.sha256))
+    PurgeRepo.add_tombstone(BLOB, saved.sha256, db_session)
+    await db_session.commit()
+
+    await PurgeRepo.lease_blobs({saved.sha256}, db_session)
+    await purge_worker.purge_all()
+    assert os.path.isfile(blob_location)
+
+    await PurgeRepo.release_blobs({saved.sha256}, db_session)
+    await purge_worker.purge_all()
+    assert not os.path.isfile(blob_location)
+
+    saved = await UARepo.save_audio(iter_chunks(b"ID3leased"))
+    await UARepo.publish_audio(saved)
+    await PurgeRepo.lease_blobs({saved.sha256}, db_session)
+    expired = datetime(2000, 1, 1, tzinfo=timezone.utc)
+    await db_session.execute(update(BlobLeaseORM).values(expires_at=expired))
+    PurgeRepo.add_tombstone(BLOB, saved.sha256, db_session)
+    await db_session.commit()
+    await purge_worker.purge_all()
+    assert not os.path.isfile(blob_location)
+    assert (await db_session.scalars(select(BlobLeaseORM))).all() == []
+
+
+@pytest.mark.asyncio
+async def test_download_audio_with_range(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path
+):
+    """Скачивание поддерживает Range, HEAD и условные запросы по ETag"""
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    content = bytes(range(256)) * 64
+    await async_client.post(
+        "/audio/upload/",
+        headers=headers,
+        data={"custom_name": "ranged"},
+        files={"file": ("song.wav", content, "audio/wav")},
+    )
+    audios = (await async_client.get("/users/get_audios_list/", headers=headers)).json()["items"]
+    url = f"/audio/{audios[0]['id']}"
+
+    response = await async_client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-type"] == "audio/wav"
+
+    response = await async_client.get(url, headers={**headers, "Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == content[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(content)}"
+
+    response = await async_client.head(url, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(content))
+
+    etag = response.headers["etag"]
+    response = await async_client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_download_audio_accel_redirect(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path, monkeypatch
+):
+    """С DOWNLOAD_ACCEL_REDIRECT файл отдаёт nginx: ответ без тела с внутренним адресом файла"""
+    monkeypatch.setattr(settings, "DOWNLOAD_ACCEL_REDIRECT", "/protected-audio/")
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    await async_client.post(
+        "/audio/upload/",
+        headers=headers,
+        data={"custom_name": "accel"},
+        files={"file": ("song.wav", b"RIFFaccel", "audio/wav")},
+    )
+    audios = (await async_client.get("/users/get_audios_list/", headers=headers)).json()["items"]
+
+    response = await async_client.get(f"/audio/{audios[0]['id']}", headers=headers)
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["content-type"] == "audio/wav"
+    assert response.headers["content-disposition"] == 'attachment; filename="accel.wav"'
+    internal_path = response.headers["x-accel-redirect"]
+    assert internal_path.startswith("/protected-audio/blobs/")
+    with open(os.path.join(storage_path, internal_path.removeprefix("/protected-audio/")), "rb") as file:
+        assert file.read() == b"RIFFaccel"
+
+
+@pytest.mark.asyncio
+async def test_download_audio_not_found(async_client: AsyncClient, valid_test_access_token):
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    response = await async_client.get(
+        "/audio/00000000-0000-0000-0000-000000000000", headers=headers
+    )
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_create_audio_statements(test_user, db_session, test_engine):
+    """
+    Запись об аудиофайле создаётся одним INSERT ... SELECT без отдельного поиска пользователя,
+    за ним следует только UPDATE версии и счётчика занятого места пользователя
+    """
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", count)
+    try:
+        await AudioFileDB.create_audio(
+            yandex_id=test_user.yandex_id,
+            filename="single",
+            file_path="blobs/aa/bb/hash",
+            session=db_session,
+        )
+        created = len(statements)
+        with pytest.raises(HTTPException) as exc:
+            await AudioFileDB.create_audio(
+                yandex_id="unknown", filename="single", file_path="x", session=db_session
+            )
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", count)
+
+    assert exc.value.status_code == 404
+    assert created == 2
+    assert [statement.lstrip().split()[0].upper() for statement in statements[:2]] == ["INSERT", "UPDATE"]
+    # без вставленной строки один запрос уточняет причину: нет пользователя или имя занято
+    assert len(statements) == 4
+    assert statements[2].lstrip().upper().startswith("INSERT")
+
+
+@pytest.mark.asyncio
+async def test_upload_audio_for_missing_user(
+    async_client: AsyncClient, valid_test_access_token, storage_path, purge_worker
+):
+    """Загрузка от несуществующего пользователя возвращает 404 и не оставляет файлов после очистки"""
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    response = await async_client.post(
+        "/audio/upload/",
+        headers=headers,
+        data={"custom_name": "orphan"},
+        files={"file": ("song.mp3", b"ID3orphan", "audio/mpeg")},
+    )
+
+    assert response.status_code == 404
+    await purge_worker.purge_all()
+    assert [p for p in storage_path.rglob("*") if p.is_file()] == []
+
+
+@pytest.mark.asyncio
+async def test_upload_audio_batch(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path, test_engine
+):
+    """Пакет сохраняется одним INSERT, ошибки отдельных файлов возвращаются по каждому файлу"""
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    inserts = []
+
+    def count(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("INSERT INTO AUDIO_FILES"):
+            inserts.append(statement)
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", count)
+    try:
+        response = await async_client.post(
+            "/audio/upload_batch/",
+            headers=headers,
+            data={"custom_names": ["one", "bad", "two"]},
+            files=[
+                ("files", ("one.mp3", b"ID3one", "audio/mpeg")),
+                ("files", ("bad.txt", b"text", "text/plain")),
+                ("files", ("two.flac", b"fLaCtwo", "audio/flac")),
+            ],
+        )
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", count)
+
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert [item["filename"] for item in items] == ["one", "bad", "two"]
+    assert [item["success"] for item in items] == [True, False, True]
+    assert items[1]["id"] is None and items[1]["detail"]
+    assert len(inserts) == 1
+    blobs = [p for p in (storage_path / "blobs").rglob("*") if p.is_file()]
+    assert len(blobs) == 2
+
+    audios = (await async_client.get("/users/get_audios_list/", headers=headers)).json()["items"]
+    assert sorted(audio["id"] for audio in audios) == sorted([items[0]["id"], items[2]["id"]])
+
+
+@pytest.mark.asyncio
+async def test_upload_audio_batch_removes_blobs_on_failure(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path, monkeypatch, purge_worker
+):
+    """Если записи не удалось создать, опубликованные запросом файлы удаляет фоновая очистка"""
+
+    async def fail(*args, **kwargs):
+        raise HTTPException(status_code=500, detail="Failed to create audio files")
+
+    monkeypatch.setattr(AudioFileDB, "create_audios", fail)
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    response = await async_client.post(
+        "/audio/upload_batch/",
+        headers=headers,
+        data={"custom_names": ["one", "two"]},
+        files=[
+            ("files", ("one.mp3", b"ID3one", "audio/mpeg")),
+            ("files", ("two.mp3", b"ID3two", "audio/mpeg")),
+        ],
+    )
+
+    assert response.status_code == 500
+    await purge_worker.purge_all()
+    assert [p for p in storage_path.rglob("*") if p.is_file()] == []
+
+
+@pytest.mark.asyncio
+async def test_upload_audio_batch_rejects_mismatched_names(
+    async_client: AsyncClient, valid_test_access_token, test_user
+):
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    response = await async_client.post(
+        "/audio/upload_batch/",
+        headers=headers,
+        data={"custom_names": ["one", "two"]},
+        files=[("files", ("one.mp3", b"ID3one", "audio/mpeg"))],
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_upload_audio_name_conflict_modes(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path, purge_worker
+):
+    """Повторная загрузка с тем же именем: ошибка, пропуск, переименование или перезапись"""
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+
+    async def upload(content, on_conflict=None):
+        data = {"custom_name": "track"}
+        if on_conflict is not None:
+            data["on_conflict"] = on_conflict
+        return await async_client.post(
+            "/audio/upload/",
+            headers=headers,
+            data=data,
+            files={"file": ("song.mp3", content, "audio/mpeg")},
+        )
+
+    first = await upload(b"ID3first")
+    assert first.status_code == 200
+    assert (await upload(b"ID3second")).status_code == 409
+
+    skipped = await upload(b"ID3second", "skip")
+    assert skipped.status_code == 200
+    assert skipped.json()["id"] == first.json()["id"]
+
+    renamed = await upload(b"ID3second", "rename")
+    assert renamed.json()["filename"] == "track_1"
+    assert (await upload(b"ID3third", "rename")).json()["filename"] == "track_2"
+
+    overwritten = await upload(b"ID3fourth", "overwrite")
+    assert overwritten.json()["id"] == first.json()["id"]
+    await purge_worker.purge_all()
+
+    audios = (await async_client.get("/users/get_audios_list/", headers=headers)).json()["items"]
+    assert sorted(audio["filename"] for audio in audios) == ["track", "track_1", "track_2"]
+    # файл первой загрузки больше ни на что не ссылается и удалён
+    first_blob = storage.local_path(UARepo.get_blob_key(hashlib.sha256(b"ID3first").hexdigest()))
+    assert not os.path.isfile(first_blob)
+    blobs = [p for p in (storage_path / "blobs").rglob("*") if p.is_file()]
+    assert len(blobs) == 3
+
+
+@pytest.mark.asyncio
+async def test_upload_audio_batch_name_conflicts(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path, purge_worker
+):
+    """Совпадения имён в пакете разрешаются по каждому файлу"""
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+
+    async def upload_batch(names, on_conflict):
+        return await async_client.post(
+            "/audio/upload_batch/",
+            headers=headers,
+            data={"custom_names": names, "on_conflict": on_conflict},
+            files=[
+                ("files", (f"{index}.mp3", f"ID3{index}{on_conflict}".encode(), "audio/mpeg"))
+                for index in range(len(names))
+            ],
+        )
+
+    response = await upload_batch(["one", "two", "one"], "error")
+    items = response.json()["items"]
+    assert [item["success"] for item in items] == [True, True, False]
+
+    items = (await upload_batch(["one", "three"], "skip")).json()["items"]
+    assert [item["success"] for item in items] == [False, True]
+    assert "skipped" in items[0]["detail"]
+    # файл пропущенной записи не остаётся в хранилище
+    await purge_worker.purge_all()
+    blobs = [p for p in (storage_path / "blobs").rglob("*") if p.is_file()]
+    assert len(blobs) == 3
+
+    items = (await upload_batch(["one", "one"], "rename")).json()["items"]
+    assert [item["filename"] for item in items] == ["one_1", "one_2"]
+
+    items = (await upload_batch(["two"], "overwrite")).json()["items"]
+    assert items[0]["success"]
+
+    audios = (await async_client.get("/users/get_audios_list/", headers=headers)).json()["items"]
+    assert sorted(audio["filename"] for audio in audios) == ["one", "one_1", "one_2", "three", "two"]
+
+
+@pytest.mark.asyncio
+async def test_audio_files_lookups_use_user_indexes(test_user, db_session):
+    """Список файлов пользователя и поиск по имени идут по составным индексам"""
+
+    async def plan(sql):
+        rows = (await db_session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))).all()
+        return " ".join(row[-1] for row in rows)
+
+    listing = await plan(
+        "SELECT id FROM audio_files WHERE user_id = 'x' ORDER BY created_at, id LIMIT 51"
+    )
+    assert "ix_audio_files_user_id_created_at" in listing
+    assert "TEMP B-TREE" not in listing
+    lookup = await plan("SELECT id FROM audio_files WHERE user_id = 'x' AND filename = 'track'")
+    assert "ix_audio_files_user_id_filename" in lookup
+
+
+@pytest.mark.asyncio
+async def test_search_audios_ranked_and_paginated(
+    async_client: AsyncClient, valid_test_access_token, test_user, db_session
+):
+    """Поиск по имени: точное совпадение, затем начало имени, затем подстрока; страницы по курсору"""
+    names = ["Drum_loop", "drum", "big_drum", "drums_2", "bass", "kick_DRUM_x"]
+    await AudioFileDB.create_audios(
+        test_user.id,
+        [{"filename": name, "file_path": f"blobs/{name}"} for name in names],
+        db_session,
+    )
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+
+    async def search(**params):
+        response = await async_client.get("/audio/search", headers=headers, params=params)
+        assert response.status_code == 200
+        return response.json()
+
+    page = await search(q="DRUM")
+    assert [item["filename"] for item in page["items"]] == [
+        "drum", "Drum_loop", "drums_2", "big_drum", "kick_DRUM_x"
+    ]
+    page = await search(q="drum", mode="prefix")
+    assert [item["filename"] for item in page["items"]] == ["drum", "Drum_loop", "drums_2"]
+    # "_" в запросе — обычный символ, а не шаблон LIKE
+    page = await search(q="m_")
+    assert [item["filename"] for item in page["items"]] == ["Drum_loop", "kick_DRUM_x"]
+
+    seen, params = [], {"q": "drum", "limit": 2}
+    while True:
+        page = await search(**params)
+        seen += [item["filename"] for item in page["items"]]
+        if page["next_cursor"] is None:
+            break
+        params["cursor"] = page["next_cursor"]
+    assert seen == ["drum", "Drum_loop", "drums_2", "big_drum", "kick_DRUM_x"]
+
+    response = await async_client.get(
+        "/audio/search", headers=headers, params={"q": "drum", "cursor": "broken"}
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_search_audios_prefix_uses_index(test_user, db_session):
+    """Префиксный поиск читает диапазон индекса в порядке выдачи, без сортировки"""
+    range_key, _ = AudioFileDB.get_search_keys(db_session)
+    query = (
+        select(AudioFileORM.id)
+        .where(
+            AudioFileORM.user_id == test_user.id,
+            range_key >= "tr",
+            range_key < "tr" + SEARCH_UPPER_BOUND,
+        )
+        .order_by(range_key)
+        .limit(21)
+    )
+    compiled = query.compile(db_session.get_bind(), compile_kwargs={"literal_binds": True})
+    rows = (await db_session.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))).all()
+    plan = " ".join(row[-1] for row in rows)
+    assert "ix_audio_files_user_id_filename_nocase" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+@pytest.mark.asyncio
+async def test_save_audio_stops_at_quota(storage_path):
+    """Загрузка прерывается на первом блоке сверх свободного места, а не после записи всего файла"""
+    reads = []
+
+    async def endless():
+        while True:
+            reads.append(UPLOAD_CHUNK_SIZE)
+            yield b"a" * UPLOAD_CHUNK_SIZE
+
+    with pytest.raises(HTTPException) as exc:
+        await UARepo.save_audio(endless(), max_size=UPLOAD_CHUNK_SIZE)
+
+    assert exc.value.status_code == 413
+    assert len(reads) == 2
+    assert list((storage_path / "tmp").iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_upload_audio_batch_quota_while_streaming(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path, monkeypatch
+):
+    """
+    Файлы пакета ограничены местом, оставшимся после уже принятых файлов,
+    а тело, заведомо не помещающееся в квоту, отклоняется по Content-Length
+    """
+    monkeypatch.setattr(settings, "USER_STORAGE_QUOTA", 1000)
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    response = await async_client.post(
+        "/audio/upload_batch/",
+        headers=headers,
+        data={"custom_names": ["one", "two", "three"]},
+        files=[
+            ("files", ("one.mp3", b"ID3" + b"1" * 597, "audio/mpeg")),
+            ("files", ("two.mp3", b"ID3" + b"2" * 597, "audio/mpeg")),
+            ("files", ("three.mp3", b"ID3" + b"3" * 297, "audio/mpeg")),
+        ],
+    )
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert [item["success"] for item in items] == [True, False, True]
+    assert items[1]["detail"] == QUOTA_EXCEEDED
+    assert len([p for p in (storage_path / "blobs").rglob("*") if p.is_file()]) == 2
+
+    sent = []
+
+    async def body():
+        yield (
+            b"--x\r\nContent-Disposition: form-data; name=\"custom_name\"\r\n\r\nbig\r\n"
+            b"--x\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.mp3\"\r\n\r\n"
+        )
+        for _ in range(16):
+            sent.append(1)
+            yield b"a" * 100
+
+    response = await async_client.post(
+        "/audio/upload/",
+        headers={
+            **headers,
+            "Content-Type": "multipart/form-data; boundary=x",
+            "Content-Length": str(1024 * 1024),
+        },
+        content=body(),
+    )
+    assert response.status_code == 413
+    assert response.json()["detail"] == QUOTA_EXCEEDED
+    assert len(sent) <= 1
+
+
+@pytest.mark.asyncio
+async def test_storage_usage_accounting_and_quota(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path, monkeypatch
+):
+    """Занятое место меняется вместе с записями, загрузка сверх квоты отклоняется"""
+    monkeypatch.setattr(settings, "USER_STORAGE_QUOTA", 1000)
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+
+    async def upload(name, size, on_conflict="error"):
+        return await async_client.post(
+            "/audio/upload/",
+            headers=headers,
+            data={"custom_name": name, "on_conflict": on_conflict},
+            files={"file": ("song.mp3", b"ID3" + bytes([len(name)]) * (size - 3), "audio/mpeg")},
+        )
+
+    async def usage():
+        info = (await async_client.get("/users/get_user_info/", headers=headers)).json()
+        assert info["quota_bytes"] == 1000
+        return info["used_bytes"]
+
+    first = await upload("first", 400)
+    assert first.status_code == 200
+    assert (await upload("second", 300)).status_code == 200
+    assert await usage() == 700
+
+    response = await upload("third", 400)
+    assert response.status_code == 413
+    assert await usage() == 700
+    # перезапись учитывает освобождаемое место старого файла
+    assert (await upload("second", 500, "overwrite")).status_code == 200
+    assert await usage() == 900
+
+    response = await async_client.delete(f"/audio/{first.json()['id']}", headers=headers)
+    assert response.status_code == 200
+    assert await usage() == 500
+    blobs = [p for p in (storage_path / "blobs").rglob("*") if p.is_file()]
+    assert len(blobs) == 3
@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from fastapi import HTTPException
+
+from app.cache.ttl_cache import TTLCache
+from app.clients.http_client import HTTPClient
+from app.config.app_config import settings
+from app.repositories import auth_router_repo
+from app.repositories.auth_router_repo import AuthRepo
+
+
+@pytest.fixture
+def token_cache(monkeypatch):
+    cache = TTLCache(maxsize=2)
+    monkeypatch.setattr(auth_router_repo, "token_cache", cache)
+    return cache
+
+
+def test_check_current_user_uses_token_cache(token_cache, valid_test_access_token):
+    """Повторная проверка того же токена берётся из кэша"""
+    first = AuthRepo.check_current_user(valid_test_access_token)
+    second = AuthRepo.check_current_user(valid_test_access_token)
+
+    assert first == second
+    assert token_cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+
+def test_invalid_token_is_not_cached(token_cache):
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc:
+            AuthRepo.check_current_user("test_token")
+        assert exc.value.status_code == 401
+    assert len(token_cache) == 0
+
+
+def test_ttl_cache_expiry_and_eviction():
+    """Записи истекают в свой срок, а при переполнении вытесняются давно не использованные"""
+    cache = TTLCache(maxsize=2)
+    cache.set("expired", 1, expires_at=time.time() - 1)
+    assert cache.get("expired") is None
+
+    cache.set("a", 1, expires_at=time.time() + 60)
+    cache.set("b", 2, expires_at=time.time() + 60)
+    cache.get("a")
+    cache.set("c", 3, expires_at=time.time() + 60)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+@pytest_asyncio.fixture
+async def yandex_stub(monkeypatch):
+    """Локальная заглушка OAuth-сервера и API Яндекса"""
+    state = {"info_calls": 0, "info_failures": 0, "info_delay": 0, "token_calls": 0, "peers": set()}
+
+    async def token(request: web.Request):
+        state["token_calls"] += 1
+        state["peers"].add(request.transport.get_extra_info("peername"))
+        data = await request.post()
+        return web.json_response({"access_token": f"token-{data['code']}"})
+
+    async def info(request: web.Request):
+        state["info_calls"] += 1
+        state["peers"].add(request.transport.get_extra_info("peername"))
+        await asyncio.sleep(state["info_delay"])
+        if state["info_calls"] <= state["info_failures"]:
+            return web.Response(status=503)
+        assert request.headers["Authorization"] == "OAuth token-code"
+        return web.json_response({"id": "1", "real_name": "Test", "default_email": "t@ya.ru"})
+
+    stub = web.Application()
+    stub.router.add_post("/token", token)
+    stub.router.add_get("/info", info)
+    server = TestServer(stub)
+    await server.start_server()
+    url = str(server.make_url("")).rstrip("/")
+    monkeypatch.setattr(settings, "YANDEX_OAUTH_URL", url)
+    monkeypatch.setattr(settings, "YANDEX_LOGIN_URL", url)
+
+    client = HTTPClient(
+        limit=10,
+        limit_per_host=2,
+        keepalive_timeout=30,
+        connect_timeout=1,
+        read_timeout=0.2,
+        retries=2,
+        retry_backoff=0.01,
+    )
+    monkeypatch.setattr(auth_router_repo, "http_client", client)
+    yield state
+    await client.close()
+    await server.close()
+
+
+@pytest.mark.asyncio
+async def test_yandex_requests_reuse_connection(yandex_stub):
+    """Запросы к Яндексу идут через одно keep-alive соединение общего клиента"""
+    token = await AuthRepo.get_yandex_token("code")
+    for _ in range(3):
+        info = await AuthRepo.get_user_info(token["access_token"])
+
+    assert info["id"] == "1"
+    assert len(yandex_stub["peers"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_yandex_request_retries_unavailable(yandex_stub):
+    yandex_stub["info_failures"] = 2
+    info = await AuthRepo.get_user_info("token-code")
+
+    assert info["id"] == "1"
+    assert yandex_stub["info_calls"] == 3
+
+
+@pytest.mark.asyncio
+async def test_yandex_request_timeout(yandex_stub):
+    """Зависший Яндекс не держит запрос дольше таймаутов с повторами"""
+    yandex_stub["info_delay"] = 1
+    with pytest.raises(HTTPException) as exc:
+        await AuthRepo.get_user_info("token-code")
+
+    assert exc.value.status_code == 504
+    assert yandex_stub["info_calls"] == 3
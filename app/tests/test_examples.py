@@ -1,94 +1,10 @@
-import os
-import sys
-from datetime import datetime, timedelta, UTC
-
-import jwt
 import pytest
-import pytest_asyncio
 from fastapi import HTTPException
-from httpx import AsyncClient, ASGITransport
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-
-
-
-# Добавляем корневую папку в путь поиска модулей
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from httpx import AsyncClient
 
 from app.config.app_config import settings
-from app.database.database_helper import DBHelper, db_helper
-from app.main import app
-from app.models.base_model import Base
 from app.repositories.upload_audio_repo import UARepo
 
-# URL тестовой базы данных (SQLite in-memory)
-TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
-
-# Создаем асинхронный движок и сессию для тестов
-test_async_engine = create_async_engine(TEST_DATABASE_URL, echo=False)
-TestSessionLocal = async_sessionmaker(
-    bind=test_async_engine, expire_on_commit=False, class_=AsyncSession
-)
-
-# Создаем тестовый экземпляр DBHelper
-test_db_helper = DBHelper(test_async_engine, TestSessionLocal)
-
-
-@pytest.fixture(scope="session", autouse=True)
-def override_db():
-    """
-    Подменяет зависимость на тестовый DBHelper
-    """
-    settings.DATABASE_URL = TEST_DATABASE_URL
-    app.dependency_overrides[db_helper.get_session] = test_db_helper.get_session
-    yield
-    app.dependency_overrides.clear()
-
-
-@pytest_asyncio.fixture(scope="session")
-async def setup_test_db():
-    """
-    Создает тестовую базу перед тестами и удаляет после
-    """
-    async with test_async_engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    yield
-    async with test_async_engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
-
-
-@pytest_asyncio.fixture(scope="function", autouse=True)
-async def clean_db():
-    """
-    Очищает базу перед каждым тестом
-    """
-    await test_db_helper.drop_all()
-    await test_db_helper.create_all()
-    yield
-
-
-@pytest_asyncio.fixture(scope="session")
-async def async_client():
-    """
-    Создает асинхронного клиента для тестов
-    """
-    async with AsyncClient(
-        transport=ASGITransport(app=app), base_url="http://test"
-    ) as client:
-        yield client
-
-
-@pytest.fixture
-def valid_test_access_token():
-    """Создает валидный JWT-токен для тестирования (access token)."""
-    payload = {
-        "yandex_id": "43141123123",
-        "username": "test_user",
-        "email": "test@example.com",
-        "exp": datetime.now(UTC) + timedelta(hours=settings.TOKEN_EXPIRE_HOURS),
-        "type": "access",
-    }
-    return jwt.encode(payload, settings.SECRET_KEY, algorithm="HS256")
-
 ###################### Пример интеграционных тестов ######################
 
 @pytest.mark.asyncio
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+from httpx import AsyncClient
+
+from app.config.app_config import settings
+from app.config.logger import (
+    get_logger,
+    json_format,
+    log_filter,
+    request_id_var,
+    request_log_count_var,
+)
+
+
+@pytest.fixture
+def captured_logs():
+    """Дополнительный sink с JSON-форматом, собирающий сообщения в список"""
+    logger = get_logger()
+    messages = []
+    handler_id = logger.add(messages.append, format=json_format, filter=log_filter, level="DEBUG")
+    yield messages
+    logger.remove(handler_id)
+
+
+@pytest.mark.asyncio
+async def test_request_id_header(async_client: AsyncClient):
+    response = await async_client.get("/auth/yandex", headers={"X-Request-ID": "abc-123"})
+    assert response.headers["x-request-id"] == "abc-123"
+
+    response = await async_client.get("/auth/yandex", headers={"X-Request-ID": "bad id\n"})
+    assert len(response.headers["x-request-id"]) == 32
+
+
+def test_request_log_budget_and_json(captured_logs, monkeypatch):
+    """Сообщения пишутся JSON-строками с id запроса, сверх бюджета запроса — только WARNING и выше"""
+    monkeypatch.setattr(settings, "LOG_REQUEST_BUDGET", 2)
+    logger = get_logger()
+    request_id_token = request_id_var.set("req-1")
+    log_count_token = request_log_count_var.set([0])
+    try:
+        for i in range(4):
+            logger.info("Сообщение {}", i)
+        logger.warning("Предупреждение")
+    finally:
+        request_log_count_var.reset(log_count_token)
+        request_id_var.reset(request_id_token)
+
+    records = [json.loads(message) for message in captured_logs]
+    assert [record["message"] for record in records] == ["Сообщение 0", "Сообщение 1", "Предупреждение"]
+    assert {record["request_id"] for record in records} == {"req-1"}
+    assert {record["function"] for record in records} == {"test_request_log_budget_and_json"}
+
+
+class FormatCounter:
+    """Аргумент сообщения, считающий обращения к нему при форматировании"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __format__(self, spec: str) -> str:
+        self.calls += 1
+        return "значение"
+
+
+def test_dropped_messages_are_not_formatted(captured_logs, monkeypatch):
+    """Сообщения сверх бюджета запроса и отброшенные выборкой не форматируются"""
+    monkeypatch.setattr(settings, "LOG_REQUEST_BUDGET", 1)
+    monkeypatch.setattr(settings, "LOG_DEBUG_SAMPLE_RATE", 0)
+    logger = get_logger()
+    argument = FormatCounter()
+    log_count_token = request_log_count_var.set([0])
+    try:
+        logger.debug("Отладка {}", argument)
+        for _ in range(3):
+            logger.info("Сообщение {}", argument)
+    finally:
+        request_log_count_var.reset(log_count_token)
+
+    assert argument.calls == 1
+    assert [json.loads(message)["message"] for message in captured_logs] == ["Сообщение значение"]
+
+
+def test_debug_sampling(captured_logs, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_DEBUG_SAMPLE_RATE", 0)
+    logger = get_logger()
+    logger.debug("Отладка")
+    logger.info("Информация")
+
+    assert [json.loads(message)["message"] for message in captured_logs] == ["Информация"]
@@ -0,0 +1,139 @@
+import io
+import struct
+import wave
+
+import pytest
+from httpx import AsyncClient
+
+from app.audio.metadata import MetadataCollector
+
+
+def collect(content: bytes, chunk_size: int = 64 * 1024):
+    collector = MetadataCollector()
+    # первый блок короче ID3-заголовка, чтобы проверить накопление начала файла
+    collector.feed(content[:3])
+    for start in range(3, len(content), chunk_size):
+        collector.feed(content[start : start + chunk_size])
+    return collector.result(len(content))
+
+
+def make_wav(seconds: int = 1, sample_rate: int = 8000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(b"\x00\x00" * sample_rate * seconds)
+    return buffer.getvalue()
+
+
+def make_mp3(frames: int, id3_size: int = 0, xing_frames: int | None = None) -> bytes:
+    # MPEG-1 Layer III, 128 кбит/с, 44100 Гц, стерео: кадр 417 байт
+    frame = bytearray(b"\xff\xfb\x90\x00" + b"\x00" * 413)
+    first = bytearray(frame)
+    if xing_frames is not None:
+        first[36:48] = b"Xing" + struct.pack(">II", 1, xing_frames)
+    id3 = b""
+    if id3_size:
+        synchsafe = bytes((id3_size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+        id3 = b"ID3\x03\x00\x00" + synchsafe + b"\x00" * id3_size
+    return id3 + bytes(first) + bytes(frame) * (frames - 1)
+
+
+def make_adts(frames: int, frame_size: int = 372) -> bytes:
+    # AAC LC, 44100 Гц, стерео
+    header = bytes(
+        (
+            0xFF,
+            0xF1,
+            (1 << 6) | (4 << 2),
+            (2 << 6) | (frame_size >> 11),
+            (frame_size >> 3) & 0xFF,
+            ((frame_size & 7) << 5) | 0x1F,
+            0xFC,
+        )
+    )
+    return (header + b"\x00" * (frame_size - 7)) * frames
+
+
+def ogg_page(packet: bytes, granule: int, serial: int = 7) -> bytes:
+    return (
+        b"OggS\x00\x02"
+        + struct.pack("<qIII", granule, serial, 0, 0)
+        + bytes((1, len(packet)))
+        + packet
+    )
+
+
+def test_wav_metadata():
+    metadata = collect(make_wav(seconds=2))
+    assert (metadata.codec, metadata.sample_rate, metadata.channels) == ("pcm", 8000, 1)
+    assert metadata.duration == 2
+    assert metadata.bitrate == 8000 * 16
+
+
+def test_flac_metadata():
+    packed = (44100 << 44) | (1 << 41) | (15 << 36) | 441000
+    streaminfo = b"\x00" * 10 + struct.pack(">Q", packed) + b"\x00" * 16
+    content = b"fLaC" + b"\x80" + len(streaminfo).to_bytes(3, "big") + streaminfo + b"\x00" * 1000
+    metadata = collect(content)
+    assert (metadata.codec, metadata.sample_rate, metadata.channels) == ("flac", 44100, 2)
+    assert metadata.duration == 10
+
+
+def test_mp3_cbr_after_large_id3_tag():
+    """ID3v2-тег больше буфера заголовков пропускается, длительность CBR считается по размеру"""
+    content = make_mp3(frames=100, id3_size=300 * 1024)
+    metadata = collect(content)
+    assert (metadata.codec, metadata.sample_rate, metadata.channels) == ("mp3", 44100, 2)
+    assert metadata.bitrate == 128000
+    assert metadata.duration == pytest.approx(100 * 417 * 8 / 128000)
+    assert metadata.size == len(content)
+
+
+def test_mp3_xing_frames():
+    metadata = collect(make_mp3(frames=10, xing_frames=1000))
+    assert metadata.duration == pytest.approx(1000 * 1152 / 44100)
+
+
+def test_adts_metadata():
+    metadata = collect(make_adts(frames=200))
+    assert (metadata.codec, metadata.sample_rate, metadata.channels) == ("aac", 44100, 2)
+    assert metadata.duration == pytest.approx(200 * 1024 / 44100)
+
+
+def test_ogg_vorbis_metadata():
+    identification = b"\x01vorbis" + struct.pack("<IBIiIiB", 0, 2, 48000, 0, 128000, 0, 0) + b"\x01"
+    content = ogg_page(identification, 0) + b"\x00" * 200_000 + ogg_page(b"\x00" * 10, 48000 * 3)
+    metadata = collect(content)
+    assert (metadata.codec, metadata.sample_rate, metadata.channels) == ("vorbis", 48000, 2)
+    assert metadata.duration == 3
+
+
+def test_unknown_format_keeps_size():
+    metadata = collect(b"not an audio file" * 100)
+    assert metadata.codec is None and metadata.duration is None
+    assert metadata.size == 1700
+
+
+@pytest.mark.asyncio
+async def test_upload_stores_metadata(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path
+):
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    content = make_wav(seconds=3)
+    response = await async_client.post(
+        "/audio/upload/",
+        headers=headers,
+        data={"custom_name": "voice"},
+        files={"file": ("voice.wav", content, "audio/wav")},
+    )
+    assert response.status_code == 200
+
+    (item,) = (await async_client.get("/users/get_audios_list/", headers=headers)).json()["items"]
+    assert item["codec"] == "pcm"
+    assert item["duration"] == 3
+    assert item["sample_rate"] == 8000
+    assert item["channels"] == 1
+    assert item["bitrate"] == 128000
+    assert item["size"] == len(content)
@@ -0,0 +1,127 @@
+import time
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.metrics.metrics import db_queries_total, instrument_engine
+from app.metrics.multiprocess import render_snapshots
+from app.metrics.registry import Registry
+from app.metrics.startup import StartupReport
+from app.middleware.startup_report import StartupReportMiddleware
+
+
+def test_registry_render():
+    """Счётчики и гистограммы выводятся в текстовом формате Prometheus"""
+    registry = Registry()
+    counter = registry.counter("requests_total", "Запросы", ("route",))
+    histogram = registry.histogram("duration_seconds", "Время", buckets=(0.1, 1))
+    counter.labels('/a"b').inc()
+    counter.labels('/a"b').inc(2)
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+    registry.add_collector(lambda: [("pool_size", "Пул", "gauge", [({}, 5)])])
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{route="/a\\"b"} 3' in lines
+    assert 'duration_seconds_bucket{le="0.1"} 2' in lines
+    assert 'duration_seconds_bucket{le="1"} 3' in lines
+    assert 'duration_seconds_bucket{le="+Inf"} 4' in lines
+    assert "duration_seconds_sum 3.65" in lines
+    assert "duration_seconds_count 4" in lines
+    assert "pool_size 5" in lines
+
+
+def test_render_snapshots_merges_workers():
+    """Счётчики и гистограммы воркеров суммируются, gauge и коллекторы — только у живых воркеров"""
+    snapshots = []
+    for pid, requests, live in ((101, 2, True), (102, 3, True), (103, 5, False)):
+        registry = Registry()
+        registry.counter("requests_total", "Запросы", ("route",)).labels("/a").inc(requests)
+        registry.gauge("in_progress", "В обработке").inc(1)
+        registry.histogram("duration_seconds", "Время", buckets=(1,)).observe(0.5)
+        registry.add_collector(lambda: [("pool_size", "Пул", "gauge", [({}, 5)])])
+        snapshots.append({**registry.snapshot(), "pid": pid, "time": time.time(), "live": live})
+
+    lines = render_snapshots(snapshots, stale_after=10).splitlines()
+
+    assert 'requests_total{route="/a"} 10' in lines
+    assert "in_progress 2" in lines
+    assert 'duration_seconds_bucket{le="1"} 3' in lines
+    assert lines.count("# TYPE pool_size gauge") == 1
+    assert 'pool_size{worker="101"} 5' in lines
+    assert 'pool_size{worker="102"} 5' in lines
+    assert not any('worker="103"' in line for line in lines)
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path
+):
+    """Запросы учитываются по шаблону маршрута, загрузки — по объёму"""
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    response = await async_client.post(
+        "/audio/upload/",
+        headers=headers,
+        data={"custom_name": "metrics"},
+        files={"file": ("track.mp3", b"\xff\xfb" * 512, "audio/mpeg")},
+    )
+    assert response.status_code == 200
+    await async_client.get("/audio/00000000-0000-0000-0000-000000000000", headers=headers)
+
+    response = await async_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_requests_total{method="POST",route="/audio/upload/",status="200"}' in body
+    assert 'http_requests_total{method="GET",route="/audio/{audio_id}",status="404"}' in body
+    assert 'http_requests_in_progress{method="GET",route="/audio/{audio_id}"} 0' in body
+    assert "audio_upload_bytes_total" in body
+    assert "http_request_duration_seconds_bucket" in body
+    # статистика кэшей токенов и пользователей
+    lines = body.splitlines()
+    assert lines.count("# TYPE cache_hits_total counter") == 1
+    for cache in ("token", "users"):
+        assert any(line.startswith(f'cache_hits_total{{cache="{cache}"}}') for line in lines)
+        assert any(line.startswith(f'cache_entries{{cache="{cache}"}}') for line in lines)
+
+
+@pytest.mark.asyncio
+async def test_engine_instrumentation():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    instrument_engine(engine)
+    before = db_queries_total.labels("SELECT").value
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            with pytest.raises(Exception):
+                await conn.execute(text("SELECT * FROM missing"))
+            assert not conn.sync_connection.info["query_started"]
+    finally:
+        await engine.dispose()
+    assert db_queries_total.labels("SELECT").value == before + 1
+
+
+@pytest.mark.asyncio
+async def test_startup_report_measures_first_request():
+    """Отчёт о старте содержит фазы до первого запроса и сам первый запрос, дальше замеров нет"""
+    report = StartupReport(started=0.0, interpreter=0.05)
+    report.restart()
+    report.mark("imports")
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(scope["path"])
+
+    middleware = StartupReportMiddleware(app, report)
+    for path in ("/first", "/second"):
+        await middleware({"type": "http", "path": path}, None, None)
+
+    assert calls == ["/first", "/second"]
+    assert list(report.phases) == ["interpreter", "imports", "first_request"]
+    registry = Registry()
+    registry.add_collector(report.collect)
+    assert 'app_startup_phase_seconds{phase="interpreter"} 0.05' in registry.render()
@@ -0,0 +1,155 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+import app.server as server
+import app.storage.file_lock as file_lock
+from app.config.app_config import settings
+
+
+@pytest.mark.asyncio
+async def test_initialize_once_is_serialized(tmp_path, monkeypatch):
+    """Процессы, стартующие одновременно, инициализируются по очереди под файловой блокировкой"""
+    monkeypatch.setattr(settings, "INIT_LOCK_FILE", str(tmp_path / "init.lock"))
+    monkeypatch.delenv(server.INITIALIZED_ENV, raising=False)
+    active, overlaps = [0], []
+
+    async def initialize():
+        active[0] += 1
+        overlaps.append(active[0])
+        await asyncio.sleep(0.05)
+        active[0] -= 1
+
+    monkeypatch.setattr(server, "initialize", initialize)
+    await asyncio.gather(*(server.initialize_once() for _ in range(3)))
+
+    assert overlaps == [1, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_initialize_once_skipped_in_workers(monkeypatch):
+    """Воркеры не повторяют инициализацию, выполненную главным процессом"""
+    monkeypatch.setenv(server.INITIALIZED_ENV, "1")
+
+    async def initialize():
+        raise AssertionError("инициализация должна быть пропущена")
+
+    monkeypatch.setattr(server, "initialize", initialize)
+    await server.initialize_once()
+
+
+def test_lock_file_without_fcntl(tmp_path, monkeypatch):
+    """В Windows (без fcntl) блокировка берётся через msvcrt.locking, занятая — ожидается или отклоняется"""
+    attempts = []
+
+    class FakeMsvcrt:
+        LK_NBLCK = 2
+
+        @staticmethod
+        def locking(fd, mode, nbytes):
+            attempts.append((mode, nbytes))
+            if len(attempts) < 3:
+                raise OSError("locked")
+
+    monkeypatch.setattr(file_lock, "fcntl", None)
+    monkeypatch.setattr(file_lock, "msvcrt", FakeMsvcrt, raising=False)
+    monkeypatch.setattr(file_lock, "LOCK_RETRY_INTERVAL", 0)
+    with open(tmp_path / "lock", "a") as lock:
+        with pytest.raises(BlockingIOError):
+            file_lock.lock_file(lock, blocking=False)
+        file_lock.lock_file(lock)
+    assert attempts == [(FakeMsvcrt.LK_NBLCK, 1)] * 3
+
+
+def test_serve_runs_workers_after_initialization(tmp_path, monkeypatch):
+    calls = []
+
+    async def initialize_and_release():
+        calls.append("init")
+
+    monkeypatch.setattr(server, "initialize_and_release", initialize_and_release)
+    monkeypatch.setattr(server, "setup_file_logging", lambda: None)
+    monkeypatch.setattr(server.uvicorn, "run", lambda target, **options: calls.append((target, options)))
+    monkeypatch.setattr(settings, "SERVER_WORKERS", 0)
+    monkeypatch.setenv(server.INITIALIZED_ENV, "0")
+    metrics_dir = tmp_path / "metrics"
+    metrics_dir.mkdir()
+    (metrics_dir / "1.json").write_text("{}")
+    monkeypatch.setattr(settings, "METRICS_DIR", str(metrics_dir))
+    monkeypatch.setenv("METRICS_DIR", "")
+
+    server.serve()
+
+    assert calls[0] == "init"
+    target, options = calls[1]
+    assert target == "app.main:app"
+    assert options["workers"] == (os.cpu_count() or 1)
+    assert options["timeout_graceful_shutdown"] == settings.SERVER_GRACEFUL_TIMEOUT
+    assert os.environ[server.INITIALIZED_ENV] == "1"
+    # воркеры получают общую директорию метрик, снимки прошлого запуска удалены
+    assert os.environ["METRICS_DIR"] == str(metrics_dir)
+    assert list(metrics_dir.iterdir()) == []
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def scrape_requests_total(base_url: str) -> int:
+    """Число запросов к /auth/yandex по /metrics одного из воркеров (новое соединение на запрос)"""
+    body = httpx.get(f"{base_url}/metrics").text
+    prefix = 'http_requests_total{method="GET",route="/auth/yandex",status="200"} '
+    return sum(int(line.removeprefix(prefix)) for line in body.splitlines() if line.startswith(prefix))
+
+
+def test_metrics_aggregated_across_workers(tmp_path):
+    """С двумя воркерами /metrics любого из них показывает запросы, обслуженные обоими"""
+    port = free_port()
+    metrics_dir = tmp_path / "metrics"
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")),
+        "DATABASE_URL": f"sqlite+aiosqlite:///{tmp_path / 'server.db'}",
+        "SERVER_HOST": "127.0.0.1",
+        "SERVER_PORT": str(port),
+        "SERVER_WORKERS": "2",
+        "METRICS_DIR": str(metrics_dir),
+        "METRICS_FLUSH_INTERVAL": "0.1",
+        "INIT_LOCK_FILE": str(tmp_path / "init.lock"),
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.server"],
+        cwd=tmp_path,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while len(list(metrics_dir.glob("*.json"))) < 2:
+            assert process.poll() is None and time.monotonic() < deadline, "воркеры не запустились"
+            time.sleep(0.1)
+
+        for _ in range(20):
+            assert httpx.get(f"{base_url}/auth/yandex").status_code == 200
+        pids = {snapshot.stem for snapshot in metrics_dir.glob("*.json")}
+        assert len(pids) == 2
+
+        # снимки других воркеров обновляются раз в METRICS_FLUSH_INTERVAL
+        deadline = time.monotonic() + 10
+        while scrape_requests_total(base_url) != 20:
+            assert time.monotonic() < deadline, "метрики воркеров не объединились"
+            time.sleep(0.1)
+        assert [scrape_requests_total(base_url) for _ in range(10)] == [20] * 10
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from app.storage.local_storage import LocalStorage
+
+
+async def read_all(stream) -> bytes:
+    return b"".join([chunk async for chunk in stream])
+
+
+async def iterate(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.mark.asyncio
+async def test_local_storage(tmp_path):
+    """Локальное хранилище: запись, чтение диапазона, stat и удаление по префиксу"""
+    storage = LocalStorage(str(tmp_path))
+
+    size = await storage.put_stream("user/a.mp3", iterate(b"0123", b"456789"))
+    assert size == 10
+    assert await read_all(storage.get_stream("user/a.mp3", 2, 5)) == b"234"
+    assert (await storage.stat("user/a.mp3")).size == 10
+
+    await storage.delete_prefix("user/")
+    assert await storage.stat("user/a.mp3") is None
+    assert os.listdir(storage.spool_dir) == []
+
+
+@pytest.fixture
+def s3_storage(tmp_path, monkeypatch):
+    """S3Storage поверх локальной заглушки S3 из moto"""
+    moto = pytest.importorskip("moto")
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        monkeypatch.setenv(name, "testing")
+    with moto.mock_aws():
+        from app.storage.s3_storage import S3Storage, MIN_PART_SIZE
+
+        storage = S3Storage(
+            bucket="audio",
+            spool_dir=str(tmp_path),
+            region_name="us-east-1",
+            prefix="test",
+            part_size=MIN_PART_SIZE,
+        )
+        storage.client.create_bucket(Bucket="audio")
+        yield storage
+
+
+@pytest.mark.asyncio
+async def test_s3_storage_multipart(s3_storage):
+    """Большой файл загружается multipart-загрузкой и читается по диапазонам"""
+    content = os.urandom(s3_storage.part_size * 2 + 1024)
+    local_path = os.path.join(s3_storage.spool_dir, "upload.part")
+    with open(local_path, "wb") as file:
+        file.write(content)
+
+    await s3_storage.put_file("blobs/aa/bb/hash", local_path)
+
+    assert not os.path.exists(local_path)
+    stat = await s3_storage.stat("blobs/aa/bb/hash")
+    assert stat.size == len(content)
+    assert await read_all(s3_storage.get_stream("blobs/aa/bb/hash", 100, 200)) == content[100:200]
+    assert await read_all(s3_storage.get_stream("blobs/aa/bb/hash")) == content
+
+
+@pytest.mark.asyncio
+async def test_s3_storage_stream_and_delete_prefix(s3_storage):
+    chunk = b"x" * (s3_storage.part_size // 2 + 1)
+    size = await s3_storage.put_stream("user/a.wav", iterate(chunk, chunk, chunk))
+    await s3_storage.put_stream("user/b.wav", iterate(b"small"))
+
+    assert size == len(chunk) * 3
+    assert (await s3_storage.stat("user/a.wav")).size == size
+
+    await s3_storage.delete_prefix("user/")
+    assert await s3_storage.stat("user/a.wav") is None
+    assert await s3_storage.stat("user/b.wav") is None
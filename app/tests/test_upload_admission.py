@@ -0,0 +1,163 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from app.cache.rate_limit import MemoryRateLimitStore, RateLimitStore
+from app.config.app_config import settings
+from app.metrics.metrics import upload_rejected_total
+from app.middleware.upload_admission import UploadAdmission, UploadAdmissionMiddleware
+
+
+def upload_scope(token: str, path: str = "/audio/upload/", method: str = "POST") -> dict:
+    return {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "headers": [(b"authorization", f"Bearer {token}".encode())],
+    }
+
+
+async def call(middleware, scope) -> tuple[int, dict, int]:
+    """Запрос к middleware: (статус, заголовки, сколько раз читалось тело)"""
+    messages, reads = [], []
+
+    async def receive():
+        reads.append(1)
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware(scope, receive, send)
+    start = messages[0]
+    headers = {name.decode(): value.decode() for name, value in start["headers"]}
+    return start["status"], headers, len(reads)
+
+
+async def ok_app(scope, receive, send):
+    await receive()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_rejects_before_reading_body(valid_test_access_token, monkeypatch):
+    """Сверх лимита частоты запрос получает 429 с Retry-After, тело запроса не читается"""
+    monkeypatch.setattr(settings, "UPLOAD_RATE_LIMIT", 0.1)
+    monkeypatch.setattr(settings, "UPLOAD_RATE_BURST", 2)
+    middleware = UploadAdmissionMiddleware(ok_app, UploadAdmission(MemoryRateLimitStore()))
+    before = upload_rejected_total.labels("rate").value
+
+    for _ in range(2):
+        status, _, reads = await call(middleware, upload_scope(valid_test_access_token))
+        assert (status, reads) == (200, 1)
+    status, headers, reads = await call(middleware, upload_scope(valid_test_access_token))
+
+    assert status == 429
+    assert reads == 0
+    assert 1 <= int(headers["retry-after"]) <= 10
+    assert upload_rejected_total.labels("rate").value == before + 1
+    # чтение и запросы без токена не ограничиваются
+    status, _, _ = await call(middleware, upload_scope(valid_test_access_token, "/audio/search", "GET"))
+    assert status == 200
+    status, _, _ = await call(middleware, upload_scope("broken"))
+    assert status == 200
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writers_bound(valid_test_access_token, monkeypatch):
+    """Пока заняты все места пишущих запросов, новые сразу получают 429"""
+    monkeypatch.setattr(settings, "UPLOAD_MAX_WRITERS", 1)
+    release = asyncio.Event()
+
+    async def slow_app(scope, receive, send):
+        await release.wait()
+        await ok_app(scope, receive, send)
+
+    admission = UploadAdmission(MemoryRateLimitStore())
+    middleware = UploadAdmissionMiddleware(slow_app, admission)
+    first = asyncio.create_task(call(middleware, upload_scope(valid_test_access_token)))
+    await asyncio.sleep(0)
+
+    status, headers, reads = await call(middleware, upload_scope(valid_test_access_token))
+    assert (status, headers["retry-after"], reads) == (429, "1", 0)
+
+    release.set()
+    assert (await first)[0] == 200
+    assert admission.writers == 0
+    assert (await call(middleware, upload_scope(valid_test_access_token)))[0] == 200
+
+
+@pytest.mark.asyncio
+async def test_shared_store_limits_all_workers(valid_test_access_token, monkeypatch):
+    """Воркеры с общим хранилищем делят один лимит; ошибка хранилища не блокирует загрузки"""
+    monkeypatch.setattr(settings, "UPLOAD_RATE_LIMIT", 0.1)
+    monkeypatch.setattr(settings, "UPLOAD_RATE_BURST", 3)
+
+    class SharedStore(RateLimitStore):
+        """Заменитель общего хранилища: одно состояние на несколько процессов"""
+
+        def __init__(self):
+            self.local = MemoryRateLimitStore()
+            self.calls = []
+
+        async def take(self, key, rate, burst):
+            self.calls.append(key)
+            return await self.local.take(key, rate, burst)
+
+    shared = SharedStore()
+    workers = [
+        UploadAdmissionMiddleware(ok_app, UploadAdmission(shared)) for _ in range(2)
+    ]
+    statuses = [
+        (await call(workers[i % 2], upload_scope(valid_test_access_token)))[0] for i in range(4)
+    ]
+    assert statuses == [200, 200, 200, 429]
+    assert shared.calls == ["43141123123"] * 4
+
+    class BrokenStore(RateLimitStore):
+        async def take(self, key, rate, burst):
+            raise ConnectionError("store is down")
+
+    middleware = UploadAdmissionMiddleware(ok_app, UploadAdmission(BrokenStore()))
+    assert (await call(middleware, upload_scope(valid_test_access_token)))[0] == 200
+
+
+@pytest.mark.asyncio
+async def test_upload_rate_limit_over_http(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path, monkeypatch
+):
+    monkeypatch.setattr(settings, "UPLOAD_RATE_LIMIT", 0.1)
+    monkeypatch.setattr(settings, "UPLOAD_RATE_BURST", 1)
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    statuses = []
+    for name in ("one", "two"):
+        response = await async_client.post(
+            "/audio/upload/",
+            headers=headers,
+            data={"custom_name": name},
+            files={"file": ("song.mp3", b"ID3" + name.encode(), "audio/mpeg")},
+        )
+        statuses.append(response.status_code)
+
+    assert statuses == [200, 429]
+    assert response.headers["Retry-After"] == "10"
+    assert response.headers["X-Request-ID"]
+    assert [p for p in (storage_path / "tmp").glob("*") if p.is_file()] == []
+
+
+@pytest.mark.asyncio
+async def test_memory_store_refills_tokens(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.cache.rate_limit.time.monotonic", lambda: now[0])
+    store = MemoryRateLimitStore(maxsize=2)
+
+    assert [await store.take("user", 2, 2) for _ in range(2)] == [0, 0]
+    assert await store.take("user", 2, 2) == pytest.approx(0.5)
+    now[0] += 0.5
+    assert await store.take("user", 2, 2) == 0
+    # вытесненная корзина начинается заново полной
+    await store.take("other", 2, 2)
+    await store.take("third", 2, 2)
+    assert await store.take("user", 2, 2) == 0
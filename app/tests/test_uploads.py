@@ -0,0 +1,179 @@
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select, update, func
+from starlette.requests import ClientDisconnect
+
+from app.config.app_config import settings
+from app.models.uploads import UploadSessionORM
+from app.repositories.resumable_upload_repo import UploadSessionRepo
+from app.repositories.upload_audio_repo import UARepo
+from app.storage.storage_helper import storage
+
+
+async def create_session(async_client: AsyncClient, headers: dict, size: int) -> str:
+    response = await async_client.post(
+        "/audio/uploads/",
+        headers=headers,
+        json={"custom_name": "long_track", "filename": "master.flac", "size": size},
+    )
+    assert response.status_code == 201
+    assert response.headers["Location"].endswith(response.json()["id"])
+    return response.json()["id"]
+
+
+@pytest.mark.asyncio
+async def test_resumable_upload(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path
+):
+    """Файл принимается частями по смещению и после завершения сохраняется как обычная загрузка"""
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    content = b"fLaC" + os.urandom(3000)
+    upload_id = await create_session(async_client, headers, len(content))
+    url = f"/audio/uploads/{upload_id}"
+
+    response = await async_client.patch(
+        url, headers={**headers, "Upload-Offset": "0"}, content=content[:1000]
+    )
+    assert response.status_code == 204
+    assert response.headers["Upload-Offset"] == "1000"
+
+    # повтор с устаревшим смещением отклоняется
+    response = await async_client.patch(
+        url, headers={**headers, "Upload-Offset": "0"}, content=content[:1000]
+    )
+    assert response.status_code == 409
+
+    response = await async_client.post(f"{url}/finalize", headers=headers)
+    assert response.status_code == 409
+
+    response = await async_client.head(url, headers=headers)
+    assert response.headers["Upload-Offset"] == "1000"
+    assert response.headers["Upload-Length"] == str(len(content))
+
+    response = await async_client.patch(
+        url, headers={**headers, "Upload-Offset": "1000"}, content=content[1000:]
+    )
+    assert response.headers["Upload-Offset"] == str(len(content))
+
+    response = await async_client.post(f"{url}/finalize", headers=headers)
+    assert response.status_code == 200
+    blob_location = storage.local_path(UARepo.get_blob_key(hashlib.sha256(content).hexdigest()))
+    with open(blob_location, "rb") as blob:
+        assert blob.read() == content
+    assert os.listdir(UploadSessionRepo.get_upload_dir()) == []
+
+    audios = (await async_client.get("/users/get_audios_list/", headers=headers)).json()["items"]
+    assert [(audio["filename"], audio["size"]) for audio in audios] == [("long_track", len(content))]
+    assert (await async_client.head(url, headers=headers)).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_resumable_upload_requires_shared_spool_with_s3(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path, monkeypatch
+):
+    """С S3 сессии создаются, только если временная директория общая для всех узлов"""
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    monkeypatch.setattr(settings, "STORAGE_BACKEND", "s3")
+    response = await async_client.post(
+        "/audio/uploads/",
+        headers=headers,
+        json={"custom_name": "long_track", "filename": "master.flac", "size": 10},
+    )
+    assert response.status_code == 501
+
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_SHARED", True)
+    await create_session(async_client, headers, 10)
+
+
+@pytest.mark.asyncio
+async def test_resumable_upload_keeps_data_on_disconnect(test_user, db_session, storage_path):
+    """При обрыве соединения принятая часть сохраняется, продолжить можно с нового смещения"""
+    upload = await UploadSessionRepo.create_session(test_user.id, "track", "mp3", 10, db_session)
+
+    async def interrupted():
+        # соединение с БД не удерживается, пока принимаются данные
+        assert not db_session.in_transaction()
+        yield b"ID3"
+        raise ClientDisconnect()
+
+    offset = await UploadSessionRepo.write_chunk(upload, 0, interrupted(), db_session)
+    assert offset == 3
+    upload = await UploadSessionRepo.get_session(upload.id, test_user.id, db_session)
+    assert upload.offset == 3
+
+    async def rest():
+        yield b"\x00" * 7
+
+    assert await UploadSessionRepo.write_chunk(upload, 3, rest(), db_session) == 10
+    with open(UploadSessionRepo.get_upload_path(upload.id), "rb") as buffer:
+        assert buffer.read() == b"ID3" + b"\x00" * 7
+
+
+@pytest.mark.asyncio
+async def test_finalize_refusal_keeps_session(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path, monkeypatch
+):
+    """Отказ при завершении (409, 413) не удаляет сессию: завершение можно повторить"""
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    response = await async_client.post(
+        "/audio/upload/",
+        headers=headers,
+        data={"custom_name": "long_track"},
+        files={"file": ("song.mp3", b"ID3existing", "audio/mpeg")},
+    )
+    assert response.status_code == 200
+    content = b"fLaC" + os.urandom(996)
+    upload_id = await create_session(async_client, headers, len(content))
+    url = f"/audio/uploads/{upload_id}"
+    await async_client.patch(url, headers={**headers, "Upload-Offset": "0"}, content=content)
+
+    response = await async_client.post(f"{url}/finalize", headers=headers)
+    assert response.status_code == 409
+    monkeypatch.setattr(settings, "USER_STORAGE_QUOTA", 500)
+    response = await async_client.post(f"{url}/finalize?on_conflict=rename", headers=headers)
+    assert response.status_code == 413
+    assert (await async_client.head(url, headers=headers)).status_code == 200
+    blobs = [p for p in (storage_path / "blobs").rglob("*") if p.is_file()]
+    assert len(blobs) == 1
+
+    monkeypatch.setattr(settings, "USER_STORAGE_QUOTA", 0)
+    response = await async_client.post(f"{url}/finalize?on_conflict=rename", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["filename"] == "long_track_1"
+    blob_location = storage.local_path(UARepo.get_blob_key(hashlib.sha256(content).hexdigest()))
+    with open(blob_location, "rb") as blob:
+        assert blob.read() == content
+    assert os.listdir(UploadSessionRepo.get_upload_dir()) == []
+    assert (await async_client.head(url, headers=headers)).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_abandoned_uploads_expire(test_user, db_session, storage_path, purge_worker):
+    """Брошенные сессии удаляются фоновой очисткой вместе с файлами"""
+    expired = await UploadSessionRepo.create_session(test_user.id, "old", "mp3", 10, db_session)
+    active = await UploadSessionRepo.create_session(test_user.id, "new", "mp3", 10, db_session)
+    await db_session.execute(
+        update(UploadSessionORM)
+        .where(UploadSessionORM.id == expired.id)
+        .values(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+    )
+    await db_session.commit()
+    # файл без сессии, давно не изменявшийся
+    orphan = os.path.join(UploadSessionRepo.get_upload_dir(), "orphan.upload")
+    open(orphan, "wb").close()
+    os.utime(orphan, (0, 0))
+    # временные файлы загрузок, брошенные при сбое до публикации, и файл идущей загрузки
+    abandoned_part = os.path.join(storage.spool_dir, "abandoned.part")
+    open(abandoned_part, "wb").close()
+    os.utime(abandoned_part, (0, 0))
+    open(os.path.join(storage.spool_dir, "current.part"), "wb").close()
+
+    assert await purge_worker.expire_uploads() == 1
+
+    assert await db_session.scalar(select(func.count()).select_from(UploadSessionORM)) == 1
+    assert os.listdir(UploadSessionRepo.get_upload_dir()) == [f"{active.id}.upload"]
+    assert sorted(os.listdir(storage.spool_dir)) == ["current.part", "uploads"]
@@ -0,0 +1,289 @@
+import pytest
+from fastapi import HTTPException
+from httpx import AsyncClient
+from sqlalchemy import delete, event, select, func, update
+
+from app.cache.users_cache import users_cache
+from app.models.purge import PurgeTombstoneORM
+from app.models.uploads import UploadSessionORM
+from app.models.users import UserORM, AudioFileORM
+from app.repositories.audio_db_repo import AudioFileDB
+from app.repositories.resumable_upload_repo import UploadSessionRepo
+from app.repositories.upload_audio_repo import UARepo
+from app.repositories.users_db_repo import UserDB
+
+
+@pytest.mark.asyncio
+async def test_user_cache_is_invalidated_on_change(
+    async_client: AsyncClient, valid_test_access_token, test_user, db_session, monkeypatch
+):
+    """Пользователь берётся из кэша, а изменение пользователя сбрасывает запись во всех воркерах"""
+    broadcast = []
+    monkeypatch.setattr(users_cache, "invalidation_hook", broadcast.append)
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+
+    for _ in range(2):
+        user = await UserDB.get_cached_user(test_user.yandex_id, db_session)
+        assert user.username == "test_user"
+    assert users_cache.stats()["hits"] >= 1
+
+    response = await async_client.patch(
+        "/users/change_user/", headers=headers, json={"username": "renamed"}
+    )
+    assert response.status_code == 200
+    assert broadcast == [test_user.yandex_id]
+
+    user = await UserDB.get_cached_user(test_user.yandex_id, db_session)
+    assert user.username == "renamed"
+
+
+@pytest.mark.asyncio
+async def test_stale_user_cache_is_not_trusted(
+    async_client: AsyncClient, valid_test_access_token, test_user, db_session, storage_path
+):
+    """
+    Изменения, сделанные другим воркером, не видны кэшу до USER_CACHE_TTL: права суперпользователя
+    проверяются по БД, а запись от имени удалённого пользователя отклоняется с 404
+    """
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    await db_session.execute(update(UserORM).values(superuser=True))
+    await db_session.commit()
+    assert (await UserDB.get_cached_user(test_user.yandex_id, db_session)).superuser
+
+    await db_session.execute(update(UserORM).values(superuser=False))
+    await db_session.commit()
+    response = await async_client.delete(
+        "/admin/delete_user_by_admin/", headers=headers, params={"yandex_id": "other"}
+    )
+    assert response.status_code == 403
+
+    await db_session.execute(delete(UserORM))
+    await db_session.commit()
+    assert await UserDB.get_cached_user(test_user.yandex_id, db_session) is not None
+    response = await async_client.post(
+        "/audio/upload_batch/",
+        headers=headers,
+        data={"custom_names": ["orphan"]},
+        files=[("files", ("orphan.mp3", b"ID3orphan", "audio/mpeg"))],
+    )
+    assert response.status_code == 404
+    response = await async_client.post(
+        "/audio/uploads/",
+        headers=headers,
+        json={"custom_name": "orphan", "filename": "orphan.flac", "size": 10},
+    )
+    assert response.status_code == 404
+    assert await db_session.scalar(select(func.count()).select_from(AudioFileORM)) == 0
+
+
+@pytest.mark.asyncio
+async def test_get_user_info_matches_etag(
+    async_client: AsyncClient, valid_test_access_token, test_user, db_session
+):
+    """Тело ответа читается вместе с версией: изменение в другом воркере не отдаётся из устаревшего кэша"""
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    await UserDB.get_cached_user(test_user.yandex_id, db_session)
+    etag = (await async_client.get("/users/get_user_info/", headers=headers)).headers["etag"]
+
+    # другой воркер изменил пользователя, а сброс кэша в этот процесс ещё не дошёл
+    await db_session.execute(
+        update(UserORM)
+        .where(UserORM.id == test_user.id)
+        .values(username="elsewhere", version=UserORM.version + 1)
+    )
+    await db_session.commit()
+
+    response = await async_client.get(
+        "/users/get_user_info/", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.json()["username"] == "elsewhere"
+    assert response.headers["etag"] != etag
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("order_by", ["filename", "created_at"])
+async def test_get_audios_list_keyset_pagination(
+    async_client: AsyncClient, valid_test_access_token, test_user, db_session, order_by
+):
+    """Список аудиофайлов отдаётся страницами по курсору в заданном порядке"""
+    names = [f"track_{i:02d}" for i in range(7)]
+    for name in reversed(names):
+        await AudioFileDB.create_audio(
+            yandex_id=test_user.yandex_id, filename=name, file_path=name, session=db_session
+        )
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+
+    received, cursor = [], None
+    while True:
+        params = {"limit": 3, "order_by": order_by}
+        if cursor:
+            params["cursor"] = cursor
+        page = (
+            await async_client.get("/users/get_audios_list/", headers=headers, params=params)
+        ).json()
+        received += [item["filename"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert received == (names if order_by == "filename" else names[::-1])
+
+
+@pytest.mark.asyncio
+async def test_get_audios_list_missing_user(
+    async_client: AsyncClient, valid_test_access_token
+):
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    response = await async_client.get("/users/get_audios_list/", headers=headers)
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_get_audios_list_empty(
+    async_client: AsyncClient, valid_test_access_token, test_user
+):
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    response = await async_client.get("/users/get_audios_list/", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"items": [], "next_cursor": None}
+
+
+@pytest.mark.asyncio
+async def test_get_audios_list_conditional_get(
+    async_client: AsyncClient, valid_test_access_token, test_user, db_session, test_engine
+):
+    """
+    Повторный опрос списка с If-None-Match получает 304 без обращения к таблице аудиофайлов,
+    а загрузка и удаление файла меняют ETag
+    """
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    response = await async_client.get("/users/get_audios_list/", headers=headers)
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    statements = []
+
+    def collect(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", collect)
+    try:
+        response = await async_client.get(
+            "/users/get_audios_list/", headers={**headers, "If-None-Match": etag}
+        )
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", collect)
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+    assert statements and not any("audio_files" in statement for statement in statements)
+
+    created = await AudioFileDB.create_audio(
+        yandex_id=test_user.yandex_id, filename="new", file_path="new", session=db_session
+    )
+    response = await async_client.get(
+        "/users/get_audios_list/", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert [item["filename"] for item in response.json()["items"]] == ["new"]
+    assert response.headers["etag"] != etag
+    etag = response.headers["etag"]
+
+    audio = await AudioFileDB.get_owned_audio(created.id, test_user.yandex_id, db_session)
+    await AudioFileDB.delete_audio(audio, db_session)
+    response = await async_client.get(
+        "/users/get_audios_list/", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.json()["items"] == []
+
+
+@pytest.mark.asyncio
+async def test_get_user_info_conditional_get(
+    async_client: AsyncClient, valid_test_access_token, test_user
+):
+    """ETag информации о пользователе сравнивается со списком If-None-Match и меняется при изменении пользователя"""
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    etag = (await async_client.get("/users/get_user_info/", headers=headers)).headers["etag"]
+    response = await async_client.get(
+        "/users/get_user_info/", headers={**headers, "If-None-Match": f'"other", {etag}'}
+    )
+    assert response.status_code == 304
+
+    await async_client.patch("/users/change_user/", headers=headers, json={"username": "renamed"})
+    response = await async_client.get(
+        "/users/get_user_info/", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.json()["username"] == "renamed"
+    assert response.headers["etag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_delete_user_purges_storage_in_background(
+    test_user, db_session, storage_path, purge_worker
+):
+    """
+    Удаление пользователя не трогает хранилище: файлы удаляет фоновая очистка,
+    причём файлы, на которые ссылаются другие пользователи, остаются
+    """
+    other = UserORM(yandex_id="other", username="other", email="other@example.com")
+    db_session.add(other)
+    await db_session.commit()
+
+    blobs = {}
+    for sha256 in ("a" * 64, "b" * 64):
+        blobs[sha256] = storage_path / UARepo.get_blob_key(sha256)
+        blobs[sha256].parent.mkdir(parents=True, exist_ok=True)
+        blobs[sha256].write_bytes(b"data")
+        await AudioFileDB.create_audio(
+            yandex_id=test_user.yandex_id,
+            filename=sha256[:1],
+            file_path=UARepo.get_blob_key(sha256),
+            session=db_session,
+            blob_hash=sha256,
+        )
+    await AudioFileDB.create_audio(
+        yandex_id="other", filename="shared", file_path="", session=db_session, blob_hash="b" * 64
+    )
+    legacy = storage_path / test_user.yandex_id / "old.mp3"
+    legacy.parent.mkdir()
+    legacy.write_bytes(b"data")
+
+    await UserDB.delete_user(test_user.yandex_id, db_session)
+
+    assert await db_session.scalar(select(func.count()).select_from(AudioFileORM)) == 1
+    assert await db_session.scalar(select(func.count()).select_from(PurgeTombstoneORM)) == 3
+    assert legacy.exists() and all(path.exists() for path in blobs.values())
+
+    await purge_worker.purge_all()
+
+    assert not blobs["a" * 64].exists()
+    assert blobs["b" * 64].exists()
+    assert not legacy.parent.exists()
+    assert await db_session.scalar(select(func.count()).select_from(PurgeTombstoneORM)) == 0
+
+
+@pytest.mark.asyncio
+async def test_delete_user_without_cascade(test_user, db_session, storage_path):
+    """
+    Записи пользователя удаляются явно: в БД, созданной до ON DELETE CASCADE
+    (здесь — SQLite без проверки внешних ключей), каскада нет
+    """
+    await UploadSessionRepo.create_session(test_user.id, "track", "mp3", 10, db_session)
+    await AudioFileDB.create_audio(
+        yandex_id=test_user.yandex_id, filename="track", file_path="", session=db_session
+    )
+
+    await UserDB.delete_user(test_user.yandex_id, db_session)
+
+    assert await db_session.scalar(select(func.count()).select_from(UploadSessionORM)) == 0
+    assert await db_session.scalar(select(func.count()).select_from(AudioFileORM)) == 0
+
+
+@pytest.mark.asyncio
+async def test_delete_missing_user(db_session):
+    with pytest.raises(HTTPException) as exc:
+        await UserDB.delete_user("missing", db_session)
+    assert exc.value.status_code == 404
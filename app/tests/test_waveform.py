@@ -0,0 +1,82 @@
+import io
+import math
+import wave
+
+import pytest
+from httpx import AsyncClient
+
+from app.audio.waveform import compute_peaks, parse_peaks
+from app.repositories.upload_audio_repo import UARepo
+from app.repositories.waveform_repo import WaveformRepo
+
+np = pytest.importorskip("numpy")
+
+
+def make_sine_wav(seconds: float = 2, sample_rate: int = 8000, amplitude: float = 0.5) -> bytes:
+    frames = int(seconds * sample_rate)
+    samples = (np.sin(np.arange(frames) * 2 * math.pi * 440 / sample_rate) * amplitude * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(np.repeat(samples, 2).tobytes())
+    return buffer.getvalue()
+
+
+def test_compute_peaks_levels(tmp_path):
+    """Сводка содержит уровни детализации, каждый в 4 раза грубее предыдущего"""
+    path = tmp_path / "sine.wav"
+    path.write_bytes(make_sine_wav())
+
+    peaks = compute_peaks(str(path), points=1000, levels=3)
+    sample_rate, levels = parse_peaks(peaks)
+
+    assert sample_rate == 8000
+    assert [len(points) for _, points in levels] == [1000, 250, 63]
+    assert [frames for frames, _ in levels] == [16, 64, 256]
+    for _, points in levels:
+        assert all(-65 <= low <= high <= 65 for low, high in points)
+        assert max(high for _, high in points) >= 62
+    assert len(peaks) < 3 * 1024
+
+
+def test_compute_peaks_unsupported(tmp_path):
+    path = tmp_path / "track.mp3"
+    path.write_bytes(b"\xff\xfb\x90\x00" * 1000)
+    assert compute_peaks(str(path), points=100, levels=2) is None
+
+
+@pytest.mark.asyncio
+async def test_waveform_endpoint(
+    async_client: AsyncClient, valid_test_access_token, test_user, storage_path
+):
+    """После загрузки сводка считается в фоне и отдаётся с долгим кэшированием"""
+    headers = {"Authorization": f"Bearer {valid_test_access_token}"}
+    content = make_sine_wav()
+    try:
+        response = await async_client.post(
+            "/audio/upload/",
+            headers=headers,
+            data={"custom_name": "sine"},
+            files={"file": ("sine.wav", content, "audio/wav")},
+        )
+        assert response.status_code == 200
+        (item,) = (await async_client.get("/users/get_audios_list/", headers=headers)).json()["items"]
+
+        response = await async_client.get(f"/audio/{item['id']}/waveform", headers=headers)
+        assert response.status_code == 200
+        assert "immutable" in response.headers["cache-control"]
+        sample_rate, levels = parse_peaks(response.content)
+        assert sample_rate == 8000 and len(levels) == 3
+
+        response = await async_client.get(
+            f"/audio/{item['id']}/waveform",
+            headers={**headers, "If-None-Match": response.headers["etag"]},
+        )
+        assert response.status_code == 304
+    finally:
+        WaveformRepo.shutdown()
+
+    peaks_path = storage_path / UARepo.get_peaks_key(item["file_path"].rsplit("/", 1)[-1])
+    assert peaks_path.is_file()